@@ -0,0 +1,158 @@
+"""Awaitable versions of the database.py functions.
+
+Every call runs on a small dedicated thread pool so a slow commit never blocks
+the event loop. database.py itself stays the synchronous API for scripts.
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import metrics
+import storage
+
+# === Executor Configuration ===
+DB_THREADS = int(os.getenv("DB_THREADS", "2"))
+# Calls allowed to wait for a DB thread before callers are held back
+DB_MAX_PENDING = int(os.getenv("DB_MAX_PENDING", "256"))
+
+
+class _QueryStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, latency: float):
+        self.calls += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "latency_avg": self.latency_total / self.calls if self.calls else 0.0,
+            "latency_max": self.latency_max,
+            "wait_avg": self.wait_total / self.calls if self.calls else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+class DatabaseExecutor:
+    """Runs blocking database calls off the event loop with a bounded backlog."""
+
+    def __init__(self, threads: int = DB_THREADS, max_pending: int = DB_MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="db")
+        self._slots = None
+        self.pending = 0
+        self._stats = {}
+
+    async def run(self, func, *args, **kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            self.pending += 1
+            submitted = time.perf_counter()
+
+            def call():
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                return result, started - submitted, time.perf_counter() - started
+
+            try:
+                loop = asyncio.get_running_loop()
+                result, wait, latency = await loop.run_in_executor(self._executor, call)
+            finally:
+                self.pending -= 1
+
+        stats = self._stats.get(func.__name__)
+        if stats is None:
+            stats = self._stats[func.__name__] = _QueryStats()
+        stats.record(wait, latency)
+        metrics.db_query_seconds.observe(latency, func.__name__)
+        metrics.db_wait_seconds.observe(wait, func.__name__)
+        return result
+
+    def stats(self):
+        """Return per-query latency and queue wait, plus the current backlog."""
+        return {
+            "pending": self.pending,
+            "queries": {name: s.snapshot() for name, s in sorted(self._stats.items())},
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+db_executor = DatabaseExecutor()
+metrics.registry.gauge("db_pending", "Database calls queued or running.", lambda: db_executor.pending)
+
+
+def _awaitable(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await db_executor.run(func, *args, **kwargs)
+    return wrapper
+
+
+# === Async Database Functions ===
+
+init_db = _awaitable(database.init_db)
+increment_score = _awaitable(database.increment_score)
+decrement_score = _awaitable(database.decrement_score)
+get_user_score = _awaitable(database.get_user_score)
+get_total_score = _awaitable(database.get_total_score)
+get_leaderboard = _awaitable(database.get_leaderboard)
+get_window_leaderboard = _awaitable(database.get_window_leaderboard)
+get_user_rank = _awaitable(database.get_user_rank)
+save_link = _awaitable(database.save_link)
+save_user_like = _awaitable(database.save_user_like)
+has_liked = _awaitable(database.has_liked)
+get_link_by_id = _awaitable(database.get_link_by_id)
+load_links = _awaitable(database.load_links)
+find_link_by_shortcode = _awaitable(database.find_link_by_shortcode)
+set_username = _awaitable(database.set_username)
+get_username = _awaitable(database.get_username)
+
+get_user_profile = _awaitable(database.get_user_profile)
+spend_point_and_save_link = _awaitable(database.spend_point_and_save_link)
+get_done_context = _awaitable(database.get_done_context)
+record_like = _awaitable(database.record_like)
+
+deactivate_links = _awaitable(database.deactivate_links)
+archivable_links = _awaitable(database.archivable_links)
+archive_links = _awaitable(database.archive_links)
+prune_score_events = _awaitable(database.prune_score_events)
+prune_verification_results = _awaitable(database.prune_verification_results)
+storage_stats = _awaitable(database.storage_stats)
+incremental_vacuum = _awaitable(database.incremental_vacuum)
+sample_user_ids = _awaitable(database.sample_user_ids)
+
+# The job queue lives wherever STORAGE_BACKEND says
+enqueue_verification = _awaitable(storage.jobs.enqueue_verification)
+claim_verification_job = _awaitable(storage.jobs.claim_verification_job)
+complete_verification_job = _awaitable(storage.jobs.complete_verification_job)
+take_checked_jobs = _awaitable(storage.jobs.take_checked_jobs)
+finish_verification_job = _awaitable(storage.jobs.finish_verification_job)
+retry_verification_job = _awaitable(storage.jobs.retry_verification_job)
+requeue_running_jobs = _awaitable(storage.jobs.requeue_running_jobs)
+requeue_expired_jobs = _awaitable(storage.jobs.requeue_expired_jobs)
+delete_link_jobs = _awaitable(storage.jobs.delete_link_jobs)
+has_open_verification = _awaitable(storage.jobs.has_open_verification)
+count_recent_verifications = _awaitable(storage.jobs.count_recent_verifications)
+count_pending_verifications = _awaitable(storage.jobs.count_pending_verifications)
+
+record_verification = _awaitable(database.record_verification)
+get_negative_checks = _awaitable(database.get_negative_checks)
+verification_analytics = _awaitable(database.verification_analytics)
+
+sweep_candidates = _awaitable(database.sweep_candidates)
+credit_likers = _awaitable(database.credit_likers)
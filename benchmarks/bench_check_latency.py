@@ -0,0 +1,76 @@
+"""Benchmark /done verification latency against local liked_by fixtures.
+
+Serves the HTML pages in benchmarks/fixtures from disk and times the legacy
+fixed-sleep scrape ("before") against the event-driven one ("after").
+
+    python benchmarks/bench_check_latency.py --runs 5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from browser_pool import BrowserPool  # noqa: E402
+from scrapper import find_liker  # noqa: E402
+from fixture_server import serve_fixtures  # noqa: E402
+
+CASES = ["first_page", "third_page", "absent"]
+USERNAME = "target_user"
+
+
+async def legacy_find_liker(page, username, post_url, sleep_ms):
+    """The original check: load, sleep a fixed time, read every anchor one by one."""
+    await page.goto(f"{post_url}liked_by/")
+    await page.wait_for_load_state("domcontentloaded")
+    await page.wait_for_timeout(sleep_ms)
+    links = await page.query_selector_all("a")
+    link_texts = [await link.text_content() for link in links]
+    link_texts = [text.strip() for text in link_texts if text and text.strip()]
+    return username.lower() in (name.lower() for name in link_texts)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, round(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+async def run(args):
+    server = serve_fixtures()
+    base = f"http://127.0.0.1:{server.server_port}"
+    pool = BrowserPool(size=1, health_check_interval=0)
+    await pool.start()
+
+    strategies = {
+        "before": lambda page, url: legacy_find_liker(page, USERNAME, url, args.legacy_sleep_ms),
+        "after": lambda page, url: find_liker(page, USERNAME, url),
+    }
+    try:
+        for name, check in strategies.items():
+            samples = []
+            for case in CASES:
+                for _ in range(args.runs):
+                    async with pool.page() as page:
+                        started = time.perf_counter()
+                        liked = await check(page, f"{base}/p/{case}/")
+                        samples.append(time.perf_counter() - started)
+                    if liked != (case != "absent"):
+                        print(f"  ! {name} gave the wrong answer for {case}")
+            print(
+                f"{name:>6}: n={len(samples)} "
+                f"p50={percentile(samples, 50):.3f}s p95={percentile(samples, 95):.3f}s"
+            )
+    finally:
+        await pool.stop()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="runs per fixture and strategy")
+    parser.add_argument("--legacy-sleep-ms", type=int, default=10000,
+                        help="fixed sleep of the legacy check")
+    asyncio.run(run(parser.parse_args()))
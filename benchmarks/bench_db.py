@@ -0,0 +1,137 @@
+"""Micro-benchmark of the handler query mix against a scratch database.
+
+Runs the queries behind handle_message, /done, /queue and /status with the
+original connect-per-call helpers ("before") and with database.py ("after").
+
+    python benchmarks/bench_db.py --rounds 2000
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+
+USERS = 200
+
+
+class LegacyDatabase:
+    """The original helpers: a fresh connection and the rollback journal on every call."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _query(self, sql, params, fetch=True):
+        conn = sqlite3.connect(self.path)
+        c = conn.cursor()
+        c.execute(sql, params)
+        result = c.fetchall() if fetch else None
+        conn.commit()
+        conn.close()
+        return result
+
+    def get_user_score(self, user_id):
+        return self._query('SELECT score FROM users WHERE user_id = ?', (user_id,))
+
+    def get_username(self, user_id):
+        return self._query('SELECT username FROM users WHERE user_id = ?', (user_id,))
+
+    def get_total_score(self, user_id):
+        return self._query('SELECT total_score FROM users WHERE user_id = ?', (user_id,))
+
+    def decrement_score(self, user_id):
+        self._query('SELECT score FROM users WHERE user_id = ?', (user_id,))
+        self._query('UPDATE users SET score = MAX(score - 1, 0) WHERE user_id = ?', (user_id,), False)
+
+    def increment_score(self, user_id, username):
+        self._query('SELECT score FROM users WHERE user_id = ?', (user_id,))
+        self._query('UPDATE users SET score = score + 1, total_score = total_score + 1 WHERE user_id = ?',
+                    (user_id,), False)
+
+    def save_link(self, user_id, link):
+        self._query('INSERT INTO instagram_links (user_id, link, timestamp) VALUES (?, ?, ?)',
+                    (user_id, link, datetime.now().isoformat()), False)
+
+    def get_link_by_id(self, link_id):
+        return self._query('SELECT link FROM instagram_links WHERE link_id = ?', (link_id,))
+
+    def has_liked(self, user_id, link_id):
+        return self._query('SELECT 1 FROM user_likes WHERE user_id = ? AND link_id = ?', (user_id, link_id))
+
+    def save_user_like(self, user_id, link_id):
+        self._query('INSERT OR IGNORE INTO user_likes (user_id, link_id) VALUES (?, ?)',
+                    (user_id, link_id), False)
+
+    def load_links(self, user_id):
+        return self._query('''
+            SELECT link_id, link FROM instagram_links
+            WHERE user_id != ? AND link_id NOT IN (SELECT link_id FROM user_likes WHERE user_id = ?)
+            ORDER BY timestamp DESC LIMIT 7
+        ''', (user_id, user_id))
+
+
+def handler_mix(db, rng, round_no):
+    """One round of the per-update queries. Returns the number of DB calls made."""
+    user_id = rng.randrange(USERS)
+    other = rng.randrange(USERS)
+    link_id = rng.randrange(1, round_no + 2)
+
+    # handle_message: a link posted in the group
+    db.get_user_score(user_id)
+    db.get_username(user_id)
+    db.decrement_score(user_id)
+    db.save_link(user_id, f"https://www.instagram.com/p/bench{round_no}/")
+    # /done
+    db.get_username(other)
+    db.get_link_by_id(link_id)
+    db.has_liked(other, link_id)
+    db.save_user_like(other, link_id)
+    db.increment_score(other, f"user{other}")
+    # /queue and /status
+    db.load_links(other)
+    db.get_user_score(other)
+    db.get_total_score(other)
+    db.get_username(other)
+    return 13
+
+
+def seed(path):
+    database.DB_PATH = path
+    database.init_db()
+    for user_id in range(USERS):
+        database.set_username(user_id, f"user{user_id}")
+    database.close_connections()
+
+
+def measure(name, db, rounds):
+    rng = random.Random(42)
+    calls = 0
+    started = time.perf_counter()
+    for round_no in range(rounds):
+        calls += handler_mix(db, rng, round_no)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>6}: {calls} calls in {elapsed:.2f}s = {calls / elapsed:,.0f} ops/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000, help="handler rounds per run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.db"
+        seed(legacy_path)
+        # The legacy helpers ran with SQLite's default rollback journal
+        with sqlite3.connect(legacy_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        measure("before", LegacyDatabase(legacy_path), args.rounds)
+
+        seed(Path(tmp) / "pooled.db")
+        measure("after", database, args.rounds)
+        database.close_connections()
@@ -0,0 +1,388 @@
+"""End-to-end load test of the real bot against local stand-ins.
+
+Seeds a database in a temporary directory, then runs `bot.py` there in
+polling mode against fake_telegram.FakeTelegram and a fixture_server that
+generates likers pages for any post, with --ig-latency-ms added to every
+Instagram response. --users simulated users then post links into the group
+and call /queue, /done, /leaderboard and /status, and one of them re-uploads
+cookies.json every --upload-interval seconds.
+
+Reported, and written to --output as JSON for tracking commit over commit:
+updates/sec, p50/p95/p99 per command (from update to the bot's answer), DB
+calls/sec from the bot's /metrics endpoint, and the memory of the bot and
+its browsers.
+
+    python benchmarks/bench_e2e.py --users 50 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import database  # noqa: E402
+from fake_telegram import FakeTelegram  # noqa: E402
+from fixture_server import serve_fixtures  # noqa: E402
+
+GROUP_ID = -1001234567890
+FIRST_USER_ID = 10_000
+CHECKING = "⏳ Checking…"
+LINK_ID = re.compile(r"<code>(\d+)</code>")
+# No leading 'A': the stand-in maps API media ids back to shortcodes
+SHORTCODE_FIRST = string.ascii_letters.replace("A", "") + string.digits
+SHORTCODE_CHARS = string.ascii_letters + string.digits + "_-"
+
+# Relative frequency of each action
+ACTIONS = {"post": 1, "queue": 3, "done": 3, "leaderboard": 1, "status": 1}
+
+
+def shortcode(rng):
+    return rng.choice(SHORTCODE_FIRST) + "".join(rng.choice(SHORTCODE_CHARS) for _ in range(10))
+
+
+def username_of(index: int):
+    return f"bench_{index:05d}"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cookies_json():
+    expires = time.time() + 365 * 86400
+    return json.dumps([
+        {"name": "sessionid", "value": "bench", "domain": ".instagram.com", "path": "/", "expires": expires},
+        {"name": "csrftoken", "value": "bench", "domain": ".instagram.com", "path": "/", "expires": expires},
+    ]).encode()
+
+
+# === Setup ===
+
+def seed(workdir: Path, args, rng):
+    """Users with points and usernames, plus links from other users to like."""
+    database.DB_PATH = workdir / "engagement.db"
+    database.init_db()
+    for i in range(args.users):
+        database.set_username(FIRST_USER_ID + i, username_of(i))
+    with database._write() as c:
+        c.execute('UPDATE users SET score = ?', (args.points,))
+    for _ in range(args.seed_links):
+        user_id = FIRST_USER_ID + rng.randrange(args.users)
+        database.save_link(user_id, f"https://www.instagram.com/p/{shortcode(rng)}/")
+    database.close_connections()
+    (workdir / "cookies.json").write_bytes(cookies_json())
+
+
+def likes(username: str, code: str, like_pct: int):
+    return zlib.crc32(f"{username}/{code}".encode()) % 100 < like_pct
+
+
+def process_tree_rss(root_pid: int):
+    """RSS in bytes of the bot process and, separately, of its browser descendants (Linux /proc)."""
+    parents = {}
+    names = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            # The command name is parenthesised and may contain spaces
+            names[int(entry.name)] = stat[stat.index("(") + 1:stat.rindex(")")]
+            parents[int(entry.name)] = int(stat[stat.rindex(")") + 2:].split()[1])
+        except (OSError, ValueError):
+            continue
+
+    def rss(pid):
+        try:
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    browsers = 0
+    for pid in parents:
+        ancestor = parents.get(pid)
+        while ancestor and ancestor != root_pid:
+            ancestor = parents.get(ancestor)
+        if ancestor == root_pid and ("chrom" in names[pid].lower() or "headless" in names[pid].lower()):
+            browsers += rss(pid)
+    return rss(root_pid), browsers
+
+
+async def db_calls(metrics_url: str):
+    """Total async DB calls the bot has made, from its Prometheus endpoint."""
+    async with httpx.AsyncClient() as client:
+        response = await client.get(metrics_url, timeout=10)
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in response.text.splitlines()
+        if line.startswith("db_query_seconds_count")
+    )
+
+
+# === Scenario ===
+
+class Driver:
+
+    def __init__(self, telegram: FakeTelegram, args, rng):
+        self.telegram = telegram
+        self.args = args
+        self.rng = rng
+        self.samples = {}
+        self.timeouts = {}
+        self.answered = 0
+        self.upload_id = 0
+
+    def _message(self, chat_id: int, user_id: int, text: str = None, **extra):
+        message = {
+            "message_id": self.telegram.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"} if chat_id > 0
+            else {"id": chat_id, "type": "supergroup", "title": "Bench"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            **extra,
+        }
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                command = text.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return {"message": message}
+
+    async def _request(self, name: str, user_id: int, update: dict, predicate=None):
+        """Push an update and time it until the bot answers in the user's private chat."""
+        reply = self.telegram.wait_for(user_id, predicate)
+        started = time.perf_counter()
+        self.telegram.push(update)
+        try:
+            call = await asyncio.wait_for(reply, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[name] = self.timeouts.get(name, 0) + 1
+            return None
+        self.samples.setdefault(name, []).append(call.at - started)
+        self.answered += 1
+        return call
+
+    async def user(self, index: int, deadline: float):
+        user_id = FIRST_USER_ID + index
+        rng = random.Random(self.rng.random())
+        queue_ids = []
+        actions, weights = zip(*ACTIONS.items())
+        while time.perf_counter() < deadline:
+            action = rng.choices(actions, weights)[0]
+            if action == "post":
+                text = f"new post https://www.instagram.com/p/{shortcode(rng)}/"
+                await self._request("post", user_id, self._message(GROUP_ID, user_id, text))
+            elif action == "queue":
+                call = await self._request("queue", user_id, self._message(user_id, user_id, "/queue"))
+                if call is not None:
+                    queue_ids = [int(i) for i in LINK_ID.findall(call.text)]
+            elif action == "done" and queue_ids:
+                link_id = queue_ids.pop(rng.randrange(len(queue_ids)))
+                await self._request("done", user_id, self._message(user_id, user_id, f"/done {link_id}"),
+                                    lambda call: call.text != CHECKING)
+            elif action == "leaderboard":
+                period = rng.choice(["", " daily", " weekly"])
+                await self._request("leaderboard", user_id, self._message(user_id, user_id, f"/leaderboard{period}"))
+            elif action == "status":
+                await self._request("status", user_id, self._message(user_id, user_id, "/status"))
+            await asyncio.sleep(rng.expovariate(1000 / self.args.think_ms) if self.args.think_ms else 0)
+
+    async def uploader(self, deadline: float):
+        user_id = FIRST_USER_ID
+        while time.perf_counter() + self.args.upload_interval < deadline:
+            await asyncio.sleep(self.args.upload_interval)
+            self.upload_id += 1
+            file_id = f"cookies{self.upload_id}"
+            self.telegram.add_file(file_id, cookies_json())
+            document = {"file_id": file_id, "file_unique_id": file_id, "file_name": "cookies.json",
+                        "mime_type": "application/json"}
+            await self._request("upload", user_id, self._message(user_id, user_id, document=document))
+
+    def report(self):
+        commands = {}
+        for name in sorted(set(self.samples) | set(self.timeouts)):
+            samples = self.samples.get(name, [])
+            stats = {"count": len(samples), "timeouts": self.timeouts.get(name, 0)}
+            if samples:
+                stats.update({
+                    "avg_ms": sum(samples) / len(samples) * 1000,
+                    "p50_ms": percentile(samples, 50) * 1000,
+                    "p95_ms": percentile(samples, 95) * 1000,
+                    "p99_ms": percentile(samples, 99) * 1000,
+                    "max_ms": max(samples) * 1000,
+                })
+            commands[name] = stats
+        return commands
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-e2e-"))
+    seed(workdir, args, rng)
+    usernames = [username_of(i) for i in range(args.users)]
+
+    instagram = serve_fixtures(
+        args.ig_latency_ms,
+        likers_of=lambda code: [name for name in usernames if likes(name, code, args.like_pct)],
+    )
+    telegram = FakeTelegram()
+    await telegram.start()
+    metrics_port = free_port()
+
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123456:BENCH",
+        "GROUP_ID": str(GROUP_ID),
+        "BOT_USERNAME": "bench_bot",
+        "GROUP_LINK": "https://t.me/+bench",
+        "BOT_MODE": "polling",
+        "TELEGRAM_BASE_URL": telegram.url,
+        "INSTAGRAM_BASE_URL": f"http://127.0.0.1:{instagram.server_port}",
+        "METRICS_PORT": str(metrics_port),
+        "RETENTION_INTERVAL": "0",
+        # Measures /done on demand
+        "SWEEP_INTERVAL": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    env.update(item.split("=", 1) for item in args.env)
+    log = open(workdir / "bot.log", "wb")
+    bot = subprocess.Popen([sys.executable, str(ROOT / "bot.py")], cwd=workdir, env=env,
+                           stdout=log, stderr=subprocess.STDOUT)
+    metrics_url = f"http://127.0.0.1:{metrics_port}/metrics"
+    memory = {"bot_peak": 0, "browsers_peak": 0}
+    result = None
+    try:
+        # Ready once it polls and serves metrics (browsers are warm by then)
+        started = time.perf_counter()
+        while not telegram.polls:
+            if bot.poll() is not None or time.perf_counter() - started > args.startup_timeout:
+                raise RuntimeError(f"bot did not start; see {workdir / 'bot.log'}")
+            await asyncio.sleep(0.2)
+        print(f"bot up after {time.perf_counter() - started:.1f}s; running {args.users} users for {args.duration}s")
+
+        db_before = await db_calls(metrics_url)
+        driver = Driver(telegram, args, rng)
+        began = time.perf_counter()
+        deadline = began + args.duration
+
+        async def sample_memory():
+            while True:
+                bot_rss, browsers_rss = process_tree_rss(bot.pid)
+                memory["bot_peak"] = max(memory["bot_peak"], bot_rss)
+                memory["browsers_peak"] = max(memory["browsers_peak"], browsers_rss)
+                memory["bot_last"], memory["browsers_last"] = bot_rss, browsers_rss
+                await asyncio.sleep(1)
+
+        sampler = asyncio.create_task(sample_memory())
+        tasks = [driver.user(i, deadline) for i in range(args.users)]
+        if args.upload_interval > 0:
+            tasks.append(driver.uploader(deadline))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - began
+        sampler.cancel()
+        db_after = await db_calls(metrics_url)
+
+        result = {
+            "commit": _git("rev-parse", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "config": vars(args),
+            "elapsed_s": elapsed,
+            "updates": driver.answered + sum(driver.timeouts.values()),
+            "updates_per_sec": driver.answered / elapsed,
+            "timeouts": sum(driver.timeouts.values()),
+            "commands": driver.report(),
+            "db_calls_per_sec": (db_after - db_before) / elapsed,
+            "memory_mb": {key: value / 2 ** 20 for key, value in memory.items()},
+        }
+    finally:
+        if bot.poll() is None:
+            bot.send_signal(signal.SIGINT)
+            # Keep serving the stand-ins while the bot shuts down
+            try:
+                await asyncio.to_thread(bot.wait, 30)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        log.close()
+        await telegram.stop()
+        instagram.shutdown()
+    if result is not None:
+        result["bot_exit_code"] = bot.returncode
+    return result, workdir
+
+
+def _git(*command):
+    try:
+        return subprocess.run(["git", *command], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    result, workdir = asyncio.run(run(args))
+    if result is None:
+        return 1
+
+    print(f"{result['updates']:,} updates, {result['updates_per_sec']:.1f} answered/sec, "
+          f"{result['timeouts']} timeouts, {result['db_calls_per_sec']:.0f} DB calls/sec")
+    for name, stats in result["commands"].items():
+        if stats["count"]:
+            print(f"  {name:<12} n={stats['count']:<6} p50={stats['p50_ms']:8.1f}ms "
+                  f"p95={stats['p95_ms']:8.1f}ms p99={stats['p99_ms']:8.1f}ms timeouts={stats['timeouts']}")
+        else:
+            print(f"  {name:<12} no answers, timeouts={stats['timeouts']}")
+    memory = result["memory_mb"]
+    print(f"  memory: bot peak {memory['bot_peak']:.0f} MB, browsers peak {memory['browsers_peak']:.0f} MB")
+
+    output = Path(args.output or ROOT / "benchmarks" / "results" /
+                  f"e2e-{datetime.now():%Y%m%d-%H%M%S}-{(result['commit'] or 'nogit')[:8]}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"results: {output} (bot log: {workdir / 'bot.log'})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load after start-up")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between a user's actions")
+    parser.add_argument("--points", type=int, default=1000, help="points every user starts with")
+    parser.add_argument("--seed-links", type=int, default=500)
+    parser.add_argument("--like-pct", type=int, default=50, help="chance a user liked a given post")
+    parser.add_argument("--ig-latency-ms", type=float, default=100, help="added to every Instagram response")
+    parser.add_argument("--upload-interval", type=float, default=20, help="seconds between cookie uploads; 0 disables")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for an answer")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the bot, e.g. --env VERIFY_WORKERS=4")
+    parser.add_argument("--output", help="JSON results path (default benchmarks/results/e2e-<time>-<commit>.json)")
+    sys.exit(main(parser.parse_args()))
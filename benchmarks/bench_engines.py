@@ -0,0 +1,101 @@
+"""Compare the DOM and network likers engines on recorded fixtures.
+
+First replays every recorded likers API response in fixtures/likers_api through
+the parser and checks the verdict, and checks that the other responses a
+likers page sees (fixtures/not_likers: feeds, comments, suggested users,
+another post's likers) are never read as likers. Then measures checks/sec of each engine
+against the local fixture server.
+
+    python benchmarks/bench_engines.py --checks 30 --pool-size 2
+    python benchmarks/bench_engines.py --verify-only
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from browser_pool import BrowserPool  # noqa: E402
+from scrapper import find_liker, find_liker_network, parse_likers_payload, parse_likers_response  # noqa: E402
+from fixture_server import CASES, FIXTURES_DIR, serve_fixtures  # noqa: E402
+
+USERNAME = "target_user"
+# What the recorded API response alone can tell about USERNAME (None = fall back)
+EXPECTED_NETWORK_VERDICTS = {"first_page": True, "third_page": None, "absent": False}
+# Where the not_likers responses are replayed as if the first_page likers page got them
+NOT_LIKERS_URL = "https://www.instagram.com/graphql/query/?query_hash=0&variables=%7B%7D"
+NOT_LIKERS_POST = "https://www.instagram.com/p/first_page/"
+
+
+def verify_fixtures():
+    ok = True
+    for case in CASES:
+        with open(FIXTURES_DIR / "likers_api" / f"{case}.json") as f:
+            names, complete = parse_likers_payload(json.load(f))
+        verdict = True if USERNAME in names else (False if complete else None)
+        expected = EXPECTED_NETWORK_VERDICTS[case]
+        status = "ok" if verdict == expected else "MISMATCH"
+        ok = ok and verdict == expected
+        print(f"  {case:<16} verdict={verdict!s:<5} expected={expected!s:<5} {status}")
+    for path in sorted((FIXTURES_DIR / "not_likers").glob("*.json")):
+        with open(path) as f:
+            payload = json.load(f)
+        parsed = parse_likers_response(NOT_LIKERS_URL, payload, NOT_LIKERS_POST)
+        status = "ok" if parsed is None else "MISMATCH"
+        ok = ok and parsed is None
+        print(f"  {path.stem:<16} not likers   {status}")
+    return ok
+
+
+async def check(engine, page, post_url):
+    liked = None
+    if engine == "network":
+        liked = await find_liker_network(page, USERNAME, post_url)
+    if liked is None:
+        liked = await find_liker(page, USERNAME, post_url)
+    return liked
+
+
+async def measure(engine, pool, base, checks):
+    async def one(i):
+        case = CASES[i % len(CASES)]
+        async with pool.page() as page:
+            liked = await check(engine, page, f"{base}/p/{case}/")
+        if liked != (case != "absent"):
+            print(f"  ! {engine} gave the wrong answer for {case}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(checks)))
+    elapsed = time.perf_counter() - started
+    print(f"{engine:>8}: {checks} checks in {elapsed:.2f}s = {checks / elapsed:.2f} checks/sec")
+
+
+async def run(args):
+    server = serve_fixtures()
+    base = f"http://127.0.0.1:{server.server_port}"
+    pool = BrowserPool(size=args.pool_size, health_check_interval=0)
+    await pool.start()
+    try:
+        for engine in ("dom", "network"):
+            await measure(engine, pool, base, args.checks)
+    finally:
+        await pool.stop()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=30, help="checks per engine")
+    parser.add_argument("--pool-size", type=int, default=2, help="browsers in the pool")
+    parser.add_argument("--verify-only", action="store_true",
+                        help="only replay the recorded responses, no browser needed")
+    args = parser.parse_args()
+
+    print("Recorded likers responses:")
+    if not verify_fixtures():
+        sys.exit(1)
+    if not args.verify_only:
+        asyncio.run(run(args))
@@ -0,0 +1,108 @@
+"""Benchmark Instagram link extraction on a synthetic group-chat corpus.
+
+Compares the original uncompiled re.search ("before") with links.extract_links
+("after") in messages/sec. --fuzz first checks the normalizer against randomly
+mangled variants of known links (case, scheme, host, slashes, query strings).
+
+    python benchmarks/bench_links.py --messages 200000 --fuzz
+"""
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import links  # noqa: E402
+
+LEGACY_PATTERN = r'(https?:\/\/(?:www\.)?instagram\.com\/(?:p|reel|tv)\/[a-zA-Z0-9_\-]+\/?)|(https?:\/\/(?:www\.)?instagr\.am\/(?:p|reel|tv)\/[a-zA-Z0-9_\-]+\/?)'
+
+SHORTCODE_CHARS = string.ascii_letters + string.digits + "_-"
+WORDS = ["hey", "check", "this", "out", "lol", "thanks", "guys", "done", "liked", "yours", "pls", "like", "mine",
+         "https://t.me/somechannel", "https://youtube.com/watch?v=abc", "🔥", "❤️", "good", "morning"]
+
+
+def shortcode(rng):
+    return "".join(rng.choice(SHORTCODE_CHARS) for _ in range(11))
+
+
+def mangle(rng, kind, code):
+    """A random real-world spelling of https://www.instagram.com/<kind>/<code>/."""
+    scheme = rng.choice(["https://", "http://", "", "HTTPS://"])
+    host = rng.choice(["www.instagram.com", "instagram.com", "m.instagram.com", "instagr.am", "www.instagr.am",
+                       "WWW.Instagram.COM"])
+    path_kind = {"reel": rng.choice(["reel", "reels", "REEL"]), "p": rng.choice(["p", "P"]), "tv": "tv"}[kind]
+    tail = rng.choice(["", "/", "/?igsh=" + shortcode(rng), "?utm_source=ig_web_copy_link", "/#comments"])
+    return f"{scheme}{host}/{path_kind}/{code}{tail}"
+
+
+def corpus(rng, count, link_ratio):
+    messages = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 12))]
+        if rng.random() < link_ratio:
+            for _ in range(rng.choice([1, 1, 1, 2, 3])):
+                words.insert(rng.randrange(len(words) + 1), mangle(rng, rng.choice(["p", "reel", "tv"]), shortcode(rng)))
+        messages.append(" ".join(words))
+    return messages
+
+
+def fuzz(rng, rounds):
+    for _ in range(rounds):
+        kind = rng.choice(["p", "reel", "tv"])
+        code = shortcode(rng)
+        canonical = f"https://www.instagram.com/{kind}/{code}/"
+        url = mangle(rng, kind, code)
+        assert links.normalize_link(url) == canonical, (url, links.normalize_link(url))
+        assert links.normalize_link(canonical) == canonical
+        assert links.shortcode_of(url) == code
+
+        # Embedded in text, next to other links and punctuation
+        text = f"{rng.choice(WORDS)} {url} {rng.choice(WORDS)}\n{mangle(rng, kind, code)}"
+        found = links.extract_links(text)
+        assert [link.url for link in found] == [canonical], (text, found)
+
+        # Look-alike hosts and paths are not Instagram posts
+        for fake in (f"https://notinstagram.com/p/{code}/", f"https://instagram.com.evil.io/p/{code}/",
+                     f"https://www.instagram.com/{code}/", f"https://www.instagram.com/stories/{code}/",
+                     f"https://evil.com/instagram.com/p/{code}/", f"evil.com/instagram.com/p/{code}",
+                     f"https://evil.com/?next=instagram.com/p/{code}/", f"https://user@instagram.com/p/{code}/"):
+            assert links.normalize_link(fake) is None, fake
+            assert not links.extract_links(fake), fake
+    print(f"fuzz: {rounds:,} mangled links normalized correctly")
+
+
+def timed(label, func, messages, baseline=None):
+    started = time.perf_counter()
+    found = sum(len(func(message)) for message in messages)
+    rate = len(messages) / (time.perf_counter() - started)
+    speedup = f" ({rate / baseline:.1f}x)" if baseline else ""
+    print(f"  {label:<8} {rate:12,.0f} messages/sec, {found:,} links{speedup}")
+    return rate
+
+
+def legacy(message):
+    match = re.search(LEGACY_PATTERN, message, re.IGNORECASE)
+    return [match.group(0)] if match else []
+
+
+def main(args):
+    rng = random.Random(11)
+    if args.fuzz:
+        fuzz(rng, args.fuzz_rounds)
+    messages = corpus(rng, args.messages, args.link_ratio)
+    print(f"{args.messages:,} messages, {args.link_ratio:.0%} with links:")
+    before = timed("before", legacy, messages)
+    timed("after", links.extract_links, messages, before)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--link-ratio", type=float, default=0.2, help="share of messages containing links")
+    parser.add_argument("--fuzz", action="store_true", help="check the normalizer before benchmarking")
+    parser.add_argument("--fuzz-rounds", type=int, default=20_000)
+    main(parser.parse_args())
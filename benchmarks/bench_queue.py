@@ -0,0 +1,119 @@
+"""Benchmark the /queue query on a synthetic database.
+
+Builds a database with --links links and --likes likes, then times the
+original NOT IN / ORDER BY timestamp query ("before") against the anti-join
+with keyset pagination ("after"). Deep pages compare OFFSET with the cursor.
+
+    python benchmarks/bench_queue.py --links 1000000 --likes 10000000
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+
+CHUNK = 100_000
+PAGE = 7
+
+LEGACY_QUERY = '''
+    SELECT link_id, link FROM instagram_links
+    WHERE user_id != ? AND link_id NOT IN (
+        SELECT link_id FROM user_likes WHERE user_id = ?
+    )
+    ORDER BY timestamp DESC LIMIT ? OFFSET ?
+'''
+
+
+def build(path, links, likes, users, rng):
+    database.DB_PATH = path
+    database.init_db()
+    database.close_connections()
+
+    conn = sqlite3.connect(path)
+    start = datetime(2024, 1, 1)
+    conn.executemany('INSERT INTO users (user_id, username) VALUES (?, ?)',
+                     ((u, f"user{u}") for u in range(users)))
+    for offset in range(0, links, CHUNK):
+        conn.executemany(
+            'INSERT INTO instagram_links (link_id, user_id, link, timestamp) VALUES (?, ?, ?, ?)',
+            ((i + 1, rng.randrange(users), f"https://www.instagram.com/p/L{i}/",
+              (start + timedelta(seconds=30 * i)).isoformat())
+             for i in range(offset, min(offset + CHUNK, links))),
+        )
+        conn.commit()
+    for offset in range(0, likes, CHUNK):
+        conn.executemany(
+            'INSERT OR IGNORE INTO user_likes (user_id, link_id) VALUES (?, ?)',
+            ((rng.randrange(users), rng.randrange(1, links + 1))
+             for _ in range(min(CHUNK, likes - offset))),
+        )
+        conn.commit()
+    return conn
+
+
+def timed(label, func, samples):
+    durations = []
+    for args in samples:
+        started = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    p50 = durations[len(durations) // 2] * 1000
+    p95 = durations[max(0, int(len(durations) * 0.95) - 1)] * 1000
+    print(f"  {label:<28} p50={p50:8.2f}ms p95={p95:8.2f}ms")
+
+
+def main(args):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "queue.db"
+        print(f"Building {args.links:,} links / {args.likes:,} likes ...")
+        conn = build(path, args.links, args.likes, args.users, rng)
+        user_ids = [(rng.randrange(args.users),) for _ in range(args.queries)]
+
+        # The schema as it was before the migration
+        conn.execute('DROP INDEX IF EXISTS idx_user_likes_link')
+        conn.execute('DROP INDEX IF EXISTS idx_instagram_links_timestamp')
+        conn.execute('PRAGMA user_version = 0')
+        conn.commit()
+
+        def legacy(user_id, pages=1):
+            for page in range(pages):
+                conn.execute(LEGACY_QUERY, (user_id, user_id, PAGE, page * PAGE)).fetchall()
+
+        print("before:")
+        timed("first page", legacy, user_ids)
+        timed(f"{args.pages} pages (OFFSET)", lambda u: legacy(u, args.pages), user_ids[:10])
+        conn.close()
+
+        database.init_db()
+
+        def keyset(user_id, pages=1):
+            before_id = None
+            for _ in range(pages):
+                links = database.load_links(user_id, before_id, PAGE)
+                if not links:
+                    break
+                before_id = links[-1]["id"]
+
+        print("after:")
+        timed("first page", keyset, user_ids)
+        timed(f"{args.pages} pages (keyset)", lambda u: keyset(u, args.pages), user_ids[:10])
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=1_000_000)
+    parser.add_argument("--likes", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=50, help="users sampled per measurement")
+    parser.add_argument("--pages", type=int, default=20, help="pages walked in the deep-page run")
+    main(parser.parse_args())
@@ -0,0 +1,224 @@
+"""Multi-process scaling test: one bot (ingress) and N verification workers.
+
+For each worker count in --workers, seeds a fresh database, starts `bot.py`
+with VERIFY_MODE=remote against fake_telegram.FakeTelegram and N `worker.py`
+processes, then fires --jobs /done commands at once, one per user, and
+times them until every user has their answer. Throughput should grow with
+the worker count until the bot or the job store becomes the bottleneck.
+
+Workers use benchmarks/simulated_scrape.py by default, a browser pool of
+--slots pages per process, each busy --scrape-ms per check; with --real
+they run the actual scraper against fixture_server (needs Chromium).
+Afterwards the credited likes are checked against what the stand-in
+Instagram says, so lost or doubly applied results show up as errors.
+
+    python benchmarks/bench_scaleout.py --workers 1,2,4 --jobs 100
+    python benchmarks/bench_scaleout.py --env STORAGE_BACKEND=postgres --env STORAGE_URL=postgresql://...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_e2e import (  # noqa: E402
+    CHECKING, FIRST_USER_ID, GROUP_ID, _git, free_port, percentile, seed, username_of,
+)
+from fake_telegram import FakeTelegram  # noqa: E402
+from fixture_server import serve_fixtures  # noqa: E402
+from simulated_scrape import likes  # noqa: E402
+
+
+def pick_jobs(db_path: Path, jobs: int, rng):
+    """One (user_id, link_id, shortcode) per user, for a link the user didn't post."""
+    conn = sqlite3.connect(db_path)
+    links = conn.execute('SELECT link_id, user_id, shortcode FROM instagram_links').fetchall()
+    conn.close()
+    picked = []
+    for i in range(jobs):
+        user_id = FIRST_USER_ID + i
+        link_id, _, code = rng.choice([link for link in links if link[1] != user_id])
+        picked.append((user_id, link_id, code))
+    return picked
+
+
+def stop_process(process, timeout: float = 30):
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return process.returncode
+
+
+async def wait_for_log(path: Path, text: str, process, timeout: float):
+    started = time.perf_counter()
+    while text not in path.read_text(errors="replace"):
+        if process.poll() is not None or time.perf_counter() - started > timeout:
+            raise RuntimeError(f"{path.name}: never logged {text!r}; see {path}")
+        await asyncio.sleep(0.2)
+
+
+async def run_round(workers: int, args, env: dict):
+    rng = random.Random(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-scaleout-{workers}-"))
+    seed(workdir, argparse.Namespace(users=args.jobs, points=10, seed_links=args.seed_links), rng)
+    jobs = pick_jobs(workdir / "engagement.db", args.jobs, rng)
+
+    telegram = FakeTelegram()
+    await telegram.start()
+    env = {**env, "TELEGRAM_BASE_URL": telegram.url, "METRICS_PORT": str(free_port())}
+    bot_log = workdir / "bot.log"
+    with open(bot_log, "wb") as log:
+        bot = subprocess.Popen([sys.executable, str(ROOT / "bot.py")], cwd=workdir, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    processes = []
+    try:
+        for i in range(workers):
+            with open(workdir / f"worker{i}.log", "wb") as log:
+                processes.append(subprocess.Popen([sys.executable, str(ROOT / "worker.py")], cwd=workdir, env=env,
+                                                  stdout=log, stderr=subprocess.STDOUT))
+        started = time.perf_counter()
+        while not telegram.polls:
+            if bot.poll() is not None or time.perf_counter() - started > args.startup_timeout:
+                raise RuntimeError(f"bot did not start; see {bot_log}")
+            await asyncio.sleep(0.2)
+        for i, process in enumerate(processes):
+            await wait_for_log(workdir / f"worker{i}.log", "running", process, args.startup_timeout)
+
+        answers = []
+        began = time.perf_counter()
+        for user_id, link_id, _ in jobs:
+            answers.append(telegram.wait_for(user_id, lambda call: call.text != CHECKING))
+            text = f"/done {link_id}"
+            telegram.push({"message": {
+                "message_id": telegram.next_message_id(),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len("/done")}],
+            }})
+        done, pending = await asyncio.wait(answers, timeout=args.timeout)
+        elapsed = time.perf_counter() - began
+        latencies = [task.result().at - began for task in done]
+        texts = [task.result().text for task in done]
+    finally:
+        await asyncio.to_thread(lambda: [stop_process(p) for p in processes])
+        await asyncio.to_thread(stop_process, bot)
+        await telegram.stop()
+
+    expected = sum(likes(username_of(user_id - FIRST_USER_ID), code, args.like_pct) for user_id, _, code in jobs)
+    conn = sqlite3.connect(workdir / "engagement.db")
+    credited = conn.execute('SELECT COUNT(*) FROM user_likes WHERE user_id >= ?', (FIRST_USER_ID,)).fetchone()[0]
+    conn.close()
+    return {
+        "workers": workers,
+        "answered": len(done),
+        "timeouts": len(pending),
+        "elapsed_s": elapsed,
+        "jobs_per_sec": len(done) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "credited": credited,
+        "expected_credits": expected,
+        "errors": sum(text.startswith("⚠️") for text in texts),
+        "workdir": str(workdir),
+    }
+
+
+async def run(args):
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123456:BENCH",
+        "GROUP_ID": str(GROUP_ID),
+        "BOT_USERNAME": "bench_bot",
+        "GROUP_LINK": "https://t.me/+bench",
+        "BOT_MODE": "polling",
+        "VERIFY_MODE": "remote",
+        "VERIFY_RATE_LIMIT": "1000000",
+        # The stand-in Telegram has no flood limits to respect
+        "OUTBOX_GLOBAL_RATE": "100000",
+        "RETENTION_INTERVAL": "0",
+        "LOG_LEVEL": "INFO",
+        "WORKER_CONCURRENCY": str(args.slots),
+        "BROWSER_POOL_SIZE": str(args.slots),
+        "SIM_SLOTS": str(args.slots),
+        "SIM_SCRAPE_MS": str(args.scrape_ms),
+        "SIM_LIKE_PCT": str(args.like_pct),
+    }
+    instagram = None
+    if args.real:
+        usernames = [username_of(i) for i in range(args.jobs)]
+        instagram = serve_fixtures(likers_of=lambda code: [n for n in usernames if likes(n, code, args.like_pct)])
+        env["INSTAGRAM_BASE_URL"] = f"http://127.0.0.1:{instagram.server_port}"
+    else:
+        env["WORKER_CHECK"] = "benchmarks.simulated_scrape:check"
+    env.update(item.split("=", 1) for item in args.env)
+
+    rounds = []
+    try:
+        for workers in args.workers:
+            result = await run_round(workers, args, env)
+            rounds.append(result)
+            print(f"{workers} worker(s): {result['answered']}/{args.jobs} answered in {result['elapsed_s']:.1f}s, "
+                  f"{result['jobs_per_sec']:.1f} jobs/s, p50 {result['p50_ms'] or 0:.0f}ms, "
+                  f"credited {result['credited']}/{result['expected_credits']}, {result['errors']} errors")
+    finally:
+        if instagram is not None:
+            instagram.shutdown()
+    base = rounds[0]["jobs_per_sec"] / rounds[0]["workers"] if rounds and rounds[0]["jobs_per_sec"] else None
+    for result in rounds:
+        result["scaling_efficiency"] = result["jobs_per_sec"] / (base * result["workers"]) if base else None
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "rounds": rounds,
+    }
+
+
+def main(args):
+    result = asyncio.run(run(args))
+    for r in result["rounds"]:
+        print(f"  {r['workers']:>2} worker(s): {r['jobs_per_sec']:7.2f} jobs/s, "
+              f"scaling efficiency {r['scaling_efficiency'] or 0:.0%}")
+    output = Path(args.output or ROOT / "benchmarks" / "results" /
+                  f"scaleout-{datetime.now():%Y%m%d-%H%M%S}-{(result['commit'] or 'nogit')[:8]}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"results: {output}")
+    ok = all(r["timeouts"] == 0 and r["credited"] == r["expected_credits"] for r in result["rounds"])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=lambda s: [int(n) for n in s.split(",")], default=[1, 2, 4],
+                        help="comma-separated worker counts, one round each")
+    parser.add_argument("--jobs", type=int, default=100, help="/done commands per round, one per user")
+    parser.add_argument("--slots", type=int, default=2, help="browser pages per worker")
+    parser.add_argument("--scrape-ms", type=float, default=500, help="time a simulated check holds a page")
+    parser.add_argument("--like-pct", type=int, default=50, help="chance a user liked a given post")
+    parser.add_argument("--seed-links", type=int, default=200)
+    parser.add_argument("--real", action="store_true", help="scrape fixture_server with Chromium instead")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for all answers")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the bot and the workers")
+    parser.add_argument("--output", help="JSON results path (default benchmarks/results/scaleout-<time>-<commit>.json)")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,151 @@
+"""Benchmark liker sweeps against on-demand /done verification.
+
+Builds a database with --users users and --links recent links, then runs
+one sweeper pass with a stand-in for the likers API: every post is liked by
+--like-pct percent of the users (decided as in simulated_scrape) plus
+--outsiders Instagram accounts the bot doesn't know. Reports the scrapes the pass took,
+the likes it credited (checked against the expected set) and how long the
+bulk matching took. On demand, each of those likes would have been one
+/done and one scrape.
+
+Then prints the per-link sweep schedule for the configured decay: how often
+a link is swept over its life, against the /done scrapes it would get.
+
+    python benchmarks/bench_sweep.py --users 50000 --links 200 --like-pct 5
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import database  # noqa: E402
+import sweeper  # noqa: E402
+from async_database import db_executor  # noqa: E402
+from liker_cache import LikerCoalescer  # noqa: E402
+from simulated_scrape import likes  # noqa: E402
+
+CHUNK = 100_000
+
+
+def username_of(index: int):
+    # Mixed case, as users type them; the scraper reports lowercase
+    return f"Sweep_{index:06d}"
+
+
+def build(path: Path, args, rng):
+    database.DB_PATH = path
+    database.init_db()
+    database.close_connections()
+
+    conn = sqlite3.connect(path)
+    for offset in range(0, args.users, CHUNK):
+        conn.executemany('INSERT INTO users (user_id, username, score, total_score) VALUES (?, ?, 0, 0)',
+                         ((i, username_of(i)) for i in range(offset, min(offset + CHUNK, args.users))))
+    now = datetime.now()
+    links = []
+    for i in range(args.links):
+        code = f"S{i:08d}"
+        owner = rng.randrange(args.users)
+        posted = now - timedelta(hours=args.hours * (args.links - i) / args.links)
+        links.append((i + 1, owner, f"https://www.instagram.com/p/{code}/", posted.isoformat(), code))
+    conn.executemany('INSERT INTO instagram_links (link_id, user_id, link, timestamp, shortcode) VALUES (?, ?, ?, ?, ?)',
+                     links)
+    conn.commit()
+    conn.close()
+    return links
+
+
+def expected_credits(links, args):
+    return {
+        (user, link_id)
+        for link_id, owner, _, _, code in links
+        for user in range(args.users)
+        if user != owner and likes(username_of(user).lower(), code, args.like_pct)
+    }
+
+
+def stand_in_scrape(args, calls):
+    names = [username_of(i).lower() for i in range(args.users)]
+    outsiders = [f"outsider_{i}" for i in range(args.outsiders)]
+
+    async def scrape(post_url):
+        calls.append(post_url)
+        await asyncio.sleep(args.scrape_ms / 1000)
+        code = post_url.rstrip("/").rsplit("/", 1)[-1]
+        return {name for name in names if likes(name, code, args.like_pct)} | set(outsiders), True
+
+    return scrape
+
+
+def schedule(max_age_hours: float):
+    """Sweeps a link gets between posting and max_age_hours."""
+    count, age = 0, 0.0
+    while age < max_age_hours:
+        count += 1
+        age += sweeper.link_interval(age) / 3600
+    return count
+
+
+async def run(args, links):
+    calls = []
+    sweep = sweeper.LikerSweeper(concurrency=args.concurrency, links=args.links, max_age_hours=args.hours + 1,
+                                 scrape=stand_in_scrape(args, calls), cache=LikerCoalescer())
+    first = await sweep.run_once()
+    again = await sweep.run_once()
+    return first, again, len(calls)
+
+
+def main(args):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sweep.db"
+        print(f"Building {args.users:,} users / {args.links:,} links ...")
+        links = build(path, args, rng)
+        expected = expected_credits(links, args)
+
+        started = time.perf_counter()
+        first, again, scrapes = asyncio.run(run(args, links))
+        elapsed = time.perf_counter() - started
+
+        conn = sqlite3.connect(path)
+        credited = set(conn.execute('SELECT user_id, link_id FROM user_likes').fetchall())
+        scores = conn.execute('SELECT SUM(total_score) FROM users').fetchone()[0]
+        conn.close()
+        db_executor.shutdown()
+        database.close_connections()
+
+    scrape_time = first["swept"] * args.scrape_ms / 1000 / args.concurrency
+    print(f"first pass: {first['swept']} links swept with {scrapes} scrapes in {elapsed:.2f}s "
+          f"({max(elapsed - scrape_time, 0):.2f}s outside the stand-in scrapes)")
+    print(f"  likers seen {first['likers_seen']:,}, credited {first['credited']:,} "
+          f"(expected {len(expected):,}, {'match' if credited == expected and scores == len(expected) else 'MISMATCH'})")
+    print(f"  on demand: {first['credited']:,} /done scrapes; swept: {scrapes}; saved {first['scrapes_saved']:,}")
+    print(f"second pass right after: {again['due']} due, {again['swept']} swept")
+
+    per_link = len(expected) / args.links if args.links else 0
+    print(f"schedule (SWEEP_LINK_INTERVAL={sweeper.SWEEP_LINK_INTERVAL:g}s, "
+          f"SWEEP_DECAY_HOURS={sweeper.SWEEP_DECAY_HOURS:g}):")
+    for hours in (1, 6, 12, 24, 48):
+        print(f"  {hours:>3}h old: swept every {sweeper.link_interval(hours) / 60:6.1f} min, "
+              f"{schedule(hours):3d} sweeps so far vs ~{per_link:.0f} /done scrapes per link")
+    return 0 if credited == expected else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--links", type=int, default=200)
+    parser.add_argument("--hours", type=float, default=24, help="links are spread over this many hours")
+    parser.add_argument("--like-pct", type=int, default=5, help="chance a user liked a given post")
+    parser.add_argument("--outsiders", type=int, default=2000, help="likers per post the bot doesn't know")
+    parser.add_argument("--scrape-ms", type=float, default=50, help="time a stand-in scrape takes")
+    parser.add_argument("--concurrency", type=int, default=sweeper.SWEEP_CONCURRENCY)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+"""Load-test the webhook endpoint with synthetic Telegram updates.
+
+Posts Update JSON to a running bot in webhook mode and reports updates/sec
+and latency percentiles of the HTTP round trip:
+
+    python benchmarks/bench_webhook.py --url http://127.0.0.1:8443/telegram --secret $WEBHOOK_SECRET
+
+With --self-serve a WebhookServer is started in a child process in front of a
+stub Application that only drains its update_queue, which measures the server
+on its own, without handlers or Telegram.
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import webhook  # noqa: E402
+
+TEXTS = ["/status", "/queue", "/leaderboard", "/done 1", "hello", "https://www.instagram.com/p/Cabc123/"]
+
+
+def synthetic_update(update_id: int, user_id: int, text: str):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"load{user_id}"},
+            "text": text,
+        },
+    }
+
+
+class _StubApplication:
+    """Just enough of an Application for WebhookServer."""
+
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+        self.processed = 0
+
+    async def drain(self):
+        while True:
+            await self.update_queue.get()
+            self.processed += 1
+
+
+async def _load(url, secret, updates, concurrency, users, seed):
+    """Post `updates` updates over `concurrency` connections; return (latencies, statuses)."""
+    rng = random.Random(seed)
+    ids = itertools.count(seed * updates + 1)
+    latencies = []
+    statuses = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def worker(count):
+            for _ in range(count):
+                update_id = next(ids)
+                payload = synthetic_update(update_id, rng.randrange(1, users + 1), rng.choice(TEXTS))
+                started = time.perf_counter()
+                response = await client.post(url, json=payload, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        per_worker, extra = divmod(updates, concurrency)
+        await asyncio.gather(*(worker(per_worker + (i < extra)) for i in range(concurrency)))
+    return latencies, statuses
+
+
+def _load_process(job):
+    return asyncio.run(_load(*job))
+
+
+def run(args, url, secret):
+    # httpx costs more CPU per request than the server, so spread the client
+    # over several processes to keep it from being the bottleneck
+    jobs = []
+    for i in range(args.processes):
+        updates = args.updates // args.processes + (i < args.updates % args.processes)
+        concurrency = max(1, args.concurrency // args.processes)
+        jobs.append((url, secret, updates, concurrency, args.users, i))
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(_load_process, jobs)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for part, _ in results for latency in part)
+    statuses = {}
+    for _, part in results:
+        for status, count in part.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{len(latencies):,} updates in {elapsed:.2f}s -> {len(latencies) / elapsed:,.0f} updates/sec")
+    print(f"latency p50={pct(0.50):.2f}ms p95={pct(0.95):.2f}ms p99={pct(0.99):.2f}ms max={latencies[-1] * 1000:.2f}ms")
+    print(f"status codes: {dict(sorted(statuses.items()))}")
+
+
+async def _self_serve(conn):
+    application = _StubApplication()
+    server = webhook.WebhookServer(application, listen="127.0.0.1", port=0, max_pending=10**9)
+    await server.start()
+    drainer = asyncio.create_task(application.drain())
+    conn.send((server.port, server.path, server.secret_token))
+    # Any message from the parent means the run is over
+    await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+    await server.stop()
+    drainer.cancel()
+    conn.send(server.stats())
+
+
+def _serve_process(conn):
+    asyncio.run(_self_serve(conn))
+
+
+def main(args):
+    if not args.self_serve:
+        run(args, args.url, args.secret)
+        return
+
+    # A separate process keeps the client's CPU time out of the server's numbers
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve_process, args=(child,), daemon=True)
+    process.start()
+    port, path, secret = parent.recv()
+    try:
+        run(args, f"http://127.0.0.1:{port}{path}", secret)
+    finally:
+        parent.send("stop")
+        print(f"server: {parent.recv()}")
+        process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=f"http://127.0.0.1:{webhook.WEBHOOK_PORT}{webhook.WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=webhook.WEBHOOK_SECRET)
+    parser.add_argument("--self-serve", action="store_true", help="benchmark a local server with a stub bot")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=40, help="parallel connections, like max_connections")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=4, help="client processes sharing the load")
+    main(parser.parse_args())
@@ -0,0 +1,199 @@
+"""Local stand-in for the Telegram Bot API, for load tests.
+
+Point the bot at it with TELEGRAM_BASE_URL=http://127.0.0.1:<port>. The
+driver queues updates with `push()`; the bot picks them up via getUpdates.
+Every sendMessage, editMessageText and deleteMessage call is recorded as a
+`BotCall`, and `wait_for()` lets the driver await the bot's answer in a chat.
+
+Only the methods the bot uses are implemented; anything else answers `true`.
+"""
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass, field
+from urllib.parse import parse_qsl
+
+BOT_ID = 1
+BOT_USERNAME = "bench_bot"
+
+
+@dataclass
+class BotCall:
+    method: str
+    chat_id: int
+    text: str
+    at: float = field(default_factory=time.perf_counter)
+
+
+class FakeTelegram:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._files = {}
+        # chat_id -> [(predicate, future)] waiting for a bot call
+        self._waiters = {}
+        self.calls = 0
+        self.polls = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        for waiters in self._waiters.values():
+            for _, future in waiters:
+                future.cancel()
+        await self._server.wait_closed()
+
+    # === Driver side ===
+
+    def next_message_id(self):
+        return next(self._message_ids)
+
+    def add_file(self, file_id: str, content: bytes):
+        self._files[file_id] = content
+
+    def push(self, update: dict):
+        """Queue an update for the bot's next getUpdates; returns its update_id."""
+        update["update_id"] = next(self._update_ids)
+        self._updates.append(update)
+        self._new_update.set()
+        return update["update_id"]
+
+    def wait_for(self, chat_id: int, predicate=None):
+        """A future for the next bot call in `chat_id` that satisfies `predicate`."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((predicate, future))
+        return future
+
+    def _record(self, method: str, chat_id, text: str = ""):
+        self.calls += 1
+        call = BotCall(method, chat_id, text or "")
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for entry in list(waiters):
+            predicate, future = entry
+            if future.done():
+                waiters.remove(entry)
+            elif predicate is None or predicate(call):
+                future.set_result(call)
+                waiters.remove(entry)
+                break
+
+    # === Bot API ===
+
+    async def _get_updates(self, params):
+        self.polls += 1
+        offset = int(params.get("offset") or 0)
+        # Confirmed updates are gone for good
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return self._updates[:limit]
+
+    def _message(self, chat_id, text=None, message_id=None):
+        chat_id = int(chat_id)
+        return {
+            "message_id": message_id or self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": BOT_USERNAME},
+            "text": text or "",
+        }
+
+    async def _call(self, method: str, params: dict):
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": BOT_USERNAME}
+        if method == "sendMessage":
+            self._record(method, int(params["chat_id"]), params.get("text"))
+            return self._message(params["chat_id"], params.get("text"))
+        if method == "editMessageText":
+            self._record(method, int(params["chat_id"]), params.get("text"))
+            return self._message(params["chat_id"], params.get("text"), int(params["message_id"]))
+        if method == "deleteMessage":
+            self._record(method, int(params["chat_id"]))
+            return True
+        if method == "getFile":
+            file_id = params["file_id"]
+            content = self._files.get(file_id, b"")
+            return {"file_id": file_id, "file_unique_id": file_id, "file_size": len(content),
+                    "file_path": f"documents/{file_id}"}
+        return True
+
+    # === HTTP ===
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, content_type, payload = await self._route(method, target, headers, body)
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Shutting down with a long poll still open
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, target: str, headers: dict, body: bytes):
+        parts = target.split("?", 1)[0].strip("/").split("/")
+        if len(parts) >= 3 and parts[0] == "file":
+            # /file/bot<token>/documents/<file_id>
+            content = self._files.get(parts[-1])
+            if content is None:
+                return "404 Not Found", "text/plain", b"not found"
+            return "200 OK", "application/octet-stream", content
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return "404 Not Found", "text/plain", b"not found"
+
+        params = _parse_body(headers.get("content-type", ""), body)
+        result = await self._call(parts[1], params)
+        payload = json.dumps({"ok": True, "result": result}).encode()
+        return "200 OK", "application/json", payload
+
+
+def _parse_body(content_type: str, body: bytes):
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return dict(parse_qsl(body.decode()))
+    # multipart: the bot never uploads files
+    return {}
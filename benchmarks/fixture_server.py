@@ -0,0 +1,117 @@
+"""Local stand-in for Instagram that serves recorded fixtures from disk.
+
+    /p/<case>/liked_by/              -> fixtures/liked_by/<case>.html
+    /api/v1/media/<media_id>/likers/ -> fixtures/likers_api/<case>.json
+
+Given `likers_of`, posts without a fixture are generated on the fly: their
+likers pages render likers_of(shortcode) with the same paging script, and
+their API answers list the same names. `latency_ms` delays every response.
+"""
+import functools
+import json
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scrapper import SHORTCODE_ALPHABET, shortcode_to_media_id  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+CASES = sorted(p.stem for p in (FIXTURES_DIR / "liked_by").glob("*.html"))
+MEDIA_IDS = {str(shortcode_to_media_id(case)): case for case in CASES}
+
+# Likers per rendered page, as in the recorded fixtures
+PAGE_SIZE = 12
+GENERATED_PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Likes</title>
+<style>
+  #likers {{ height: 400px; overflow-y: auto; }}
+  .liker {{ height: 60px; }}
+</style>
+<script>window.LIKERS_FIXTURE = {fixture};</script>
+<script src="/static/likers.js"></script>
+</head>
+<body>
+<div id="likers"></div>
+</body>
+</html>
+"""
+
+
+def media_id_to_shortcode(media_id: int) -> str:
+    """Inverse of shortcode_to_media_id, for shortcodes not starting with 'A'."""
+    chars = []
+    while media_id:
+        media_id, digit = divmod(media_id, 64)
+        chars.append(SHORTCODE_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+    likers_of = None
+    first_delay_ms = 400
+    page_delay_ms = 300
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        generated = self.likers_of is not None and self._generated(parts)
+        if generated is None:
+            return super().do_GET()
+        body, content_type = generated
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _generated(self, parts):
+        if len(parts) == 3 and parts[0] in ("p", "reel", "tv") and parts[2] == "liked_by" \
+                and parts[1] not in CASES:
+            names = self.likers_of(parts[1])
+            fixture = {
+                "firstDelayMs": self.first_delay_ms,
+                "pageDelayMs": self.page_delay_ms,
+                "pages": [names[i:i + PAGE_SIZE] for i in range(0, len(names), PAGE_SIZE)],
+            }
+            return GENERATED_PAGE.format(fixture=json.dumps(fixture)).encode(), "text/html; charset=utf-8"
+        if len(parts) == 5 and parts[:3] == ["api", "v1", "media"] and parts[4] == "likers" \
+                and parts[3] not in MEDIA_IDS and parts[3].isdigit():
+            names = self.likers_of(media_id_to_shortcode(int(parts[3])))
+            payload = {"users": [{"username": name} for name in names], "user_count": len(names)}
+            return json.dumps(payload).encode(), "application/json"
+        return None
+
+    def translate_path(self, path):
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "p" and parts[2] == "liked_by":
+            return str(FIXTURES_DIR / "liked_by" / f"{parts[1]}.html")
+        if len(parts) == 5 and parts[:3] == ["api", "v1", "media"] and parts[4] == "likers":
+            case = MEDIA_IDS.get(parts[3], "missing")
+            return str(FIXTURES_DIR / "likers_api" / f"{case}.json")
+        return super().translate_path(path)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(latency_ms: float = 0, likers_of=None, first_delay_ms: int = 400, page_delay_ms: int = 300):
+    """Start the fixture server on a free port in a background thread."""
+    handler_class = type("Handler", (FixtureHandler,), {
+        "latency": latency_ms / 1000,
+        "likers_of": staticmethod(likers_of) if likers_of else None,
+        "first_delay_ms": first_delay_ms,
+        "page_delay_ms": page_delay_ms,
+    })
+    handler = functools.partial(handler_class, directory=str(FIXTURES_DIR))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
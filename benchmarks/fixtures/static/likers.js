@@ -0,0 +1,29 @@
+// Renders window.LIKERS_FIXTURE one page at a time, like the real likers dialog:
+// the first page arrives after a short delay, the rest only when the list is scrolled.
+(function () {
+  var cfg = window.LIKERS_FIXTURE;
+  var next = 0;
+  var loading = false;
+
+  function loadPage(delay) {
+    if (loading || next >= cfg.pages.length) return;
+    loading = true;
+    setTimeout(function () {
+      var list = document.getElementById("likers");
+      cfg.pages[next].forEach(function (name) {
+        var row = document.createElement("div");
+        row.className = "liker";
+        var a = document.createElement("a");
+        a.href = "/" + name + "/";
+        a.textContent = name;
+        row.appendChild(a);
+        list.appendChild(row);
+      });
+      next += 1;
+      loading = false;
+    }, delay);
+  }
+
+  document.addEventListener("DOMContentLoaded", function () { loadPage(cfg.firstDelayMs); });
+  document.addEventListener("scroll", function () { loadPage(cfg.pageDelayMs); }, true);
+})();
@@ -0,0 +1,39 @@
+"""A stand-in for the scraper, for scaling tests on machines without Chromium.
+
+worker.py runs it with WORKER_CHECK=benchmarks.simulated_scrape:check. Each
+process has SIM_SLOTS browser slots (its Chromium budget); a check holds one
+for SIM_SCRAPE_MS, the time a real page load and likers scroll take, and
+spends SIM_CPU_MS of CPU on the page meanwhile. Whether a user liked a post
+is decided the way bench_e2e's fixture server decides it.
+"""
+import asyncio
+import os
+import time
+import zlib
+
+SIM_SLOTS = int(os.getenv("SIM_SLOTS", os.getenv("BROWSER_POOL_SIZE", "2")))
+SIM_SCRAPE_MS = float(os.getenv("SIM_SCRAPE_MS", "500"))
+SIM_CPU_MS = float(os.getenv("SIM_CPU_MS", "5"))
+SIM_LIKE_PCT = int(os.getenv("SIM_LIKE_PCT", "50"))
+
+_slots = None
+
+
+def likes(username: str, code: str, like_pct: int = SIM_LIKE_PCT):
+    return zlib.crc32(f"{username}/{code}".encode()) % 100 < like_pct
+
+
+def _burn(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def check(username: str, post_url: str) -> bool:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(SIM_SLOTS)
+    async with _slots:
+        _burn(SIM_CPU_MS / 1000)
+        await asyncio.sleep(SIM_SCRAPE_MS / 1000)
+    return likes(username, post_url.rstrip("/").rsplit("/", 1)[-1])
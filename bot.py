@@ -1,6 +1,17 @@
-import logging, re, os
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from scrapper import check_if_liked
+import logging, os, time
+import leaderboard as leaderboard_board
+from links import extract_links
+import render
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyParameters
+from scrapper import browser_pool, reload_sessions
+from sessions import sessions, account_for_upload
+from verification_queue import verification_queue
+from webhook import run_webhook
+from dispatcher import update_processor
+from outbox import outbox
+from retention import retention
+from sweeper import sweeper
+from metrics import metrics_server, perf_report, timed_handler
 from dotenv import load_dotenv
 from telegram.error import Conflict
 
@@ -8,24 +19,25 @@ from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
     CommandHandler,
+    CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters
 )
 
-from database import (
-    init_db, 
-    increment_score,
-    decrement_score,
-    get_user_score, 
+import storage
+from database import init_db, backfill_shortcodes, DuplicateLink
+from async_database import (
+    db_executor,
     get_leaderboard, 
-    save_link, 
+    get_window_leaderboard,
+    get_user_rank,
     load_links, 
     set_username, 
-    get_username, 
-    has_liked, 
-    save_user_like, 
-    get_link_by_id, 
-    get_total_score
+    get_user_profile,
+    get_done_context,
+    spend_point_and_save_link,
+    has_open_verification
 )
 
 
@@ -47,18 +59,30 @@ TARGET_GROUP_ID = int(os.getenv("GROUP_ID"))
 
 GROUP_LINK = os.getenv("GROUP_LINK")
 
-INSTAGRAM_PATTERN = r'(https?:\/\/(?:www\.)?instagram\.com\/(?:p|reel|tv)\/[a-zA-Z0-9_\-]+\/?)|(https?:\/\/(?:www\.)?instagr\.am\/(?:p|reel|tv)\/[a-zA-Z0-9_\-]+\/?)'
-
-# logging.basicConfig(format='%(message)s', level=logging.INFO)
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+                    level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-COOKIES_FILE_PATH = "cookies.json"
+# Telegram user ids allowed to use /perf, comma-separated
+ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if i}
+
+# Bot API server; point at a local stand-in for load tests (see benchmarks/bench_e2e.py)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "").rstrip("/")
+
+# "polling" or "webhook" (see webhook.py for its settings)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Links shown per /queue page
+QUEUE_PAGE_SIZE = 7
+# /leaderboard <period> -> window in days
+LEADERBOARD_WINDOWS = {"daily": 1, "weekly": 7}
 
 # === Command Handlers ===
 
+@timed_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
 
     param = context.args[0] if context.args else None
@@ -72,7 +96,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_welcome(update: Update):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     msg = (
         "🌟 Welcome to the Instagram Link Bot! 🌟\n\n"
@@ -82,7 +106,7 @@ async def show_welcome(update: Update):
         "• /rules - Show rules\n"
         "• /queue - Show last 7 shared links\n"
         "• /status - Show your score and username\n"
-        "• /leaderboard - See the top sharers\n"
+        "• /leaderboard [daily|weekly] - See the top sharers\n"
         "• /username <your_IG_username> - Set your Instagram username\n"
         "• /done <link_number> - Mark a post as liked\n\n"
         "💡 Tip: Share links, engage with others, and climb the leaderboard!"
@@ -93,64 +117,80 @@ async def show_welcome(update: Update):
     ]]
     markup = InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_text(msg, reply_markup=markup)
+    outbox.send(update.effective_chat.id, msg, reply_markup=markup)
 
+@timed_handler
 async def set_instagram_username(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     user = update.message.from_user
     if len(context.args) == 1:
         username = context.args[0]
-        set_username(user.id, username)
-        await update.message.reply_text(f"✅ Your Instagram username ({username}) has been saved!")
+        await set_username(user.id, username)
+        outbox.send(update.effective_chat.id, f"✅ Your Instagram username ({username}) has been saved!")
     else:
-        await update.message.reply_text("❌ Please provide your Instagram username (e.g., /username ironman).")
+        outbox.send(update.effective_chat.id, "❌ Please provide your Instagram username (e.g., /username ironman).")
 
+@timed_handler
 async def done(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     if len(context.args) == 1 and context.args[0].isdigit():
         link_id = int(context.args[0])
         user = update.message.from_user
         user_id = user.id
-        username = get_username(user_id)
+        # Username, link and like state in a single query
+        done_context = await get_done_context(user_id, link_id)
 
-        if not username:
-            await update.message.reply_text(
+        if not done_context["username"]:
+            outbox.send(
+                update.effective_chat.id,
                 "❌ You need to set your Instagram username first using /username <your_instagram_username>."
             )
             return
 
-        # Get link by ID
-        link_data = get_link_by_id(link_id)
-        if not link_data:
-            await update.message.reply_text("❌ Invalid link ID.")
+        if not done_context["link"]:
+            outbox.send(update.effective_chat.id, "❌ Invalid link ID.")
             return
 
-        link = link_data["link"]
-
         # Check if already marked as liked
-        if has_liked(user_id, link_id):
-            await update.message.reply_text("✅ You've already marked this link as liked.")
+        if done_context["liked"]:
+            outbox.send(update.effective_chat.id, "✅ You've already marked this link as liked.")
             return
 
-        # Call your async scraper to check if they actually liked it
-        liked = await check_if_liked(username, link)
+        if await has_open_verification(user_id, link_id):
+            outbox.send(update.effective_chat.id, "⏳ This link is already being checked.")
+            return
 
-        if liked:
-            save_user_like(user_id, link_id)
-            increment_score(user_id, username)
-            await update.message.reply_text("✅ You liked this post! Score +1.")
-        else:
-            await update.message.reply_text("❌ You have not liked this post.")
+        # Recently checked and not liked: answer without another scrape
+        cooldown = await verification_queue.cooldown(user_id, link_id)
+        if cooldown:
+            ago, wait = cooldown
+            outbox.send(
+                update.effective_chat.id,
+                f"❌ Not liked when checked {ago} seconds ago. You can check again in {wait} seconds."
+            )
+            return
+
+        if await verification_queue.is_rate_limited(user_id):
+            outbox.send(update.effective_chat.id, "⏳ Too many checks at once. Please wait a minute and try again.")
+            return
+
+        # The scrape runs in a background worker, which edits this message with the result
+        reply = await outbox.send(update.effective_chat.id, "⏳ Checking…")
+        if reply is None:
+            return
+        await verification_queue.enqueue(user_id, link_id, reply.chat_id, reply.message_id,
+                                         done_context["username"], done_context["link"])
     else:
-        await update.message.reply_text("❌ Please provide a valid link ID (e.g., /done 12).")
+        outbox.send(update.effective_chat.id, "❌ Please provide a valid link ID (e.g., /done 12).")
 
+@timed_handler
 async def show_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     msg = (
         "📜 Rules:\n\n"
@@ -158,107 +198,152 @@ async def show_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "2. Be respectful to others.\n"
         "3. Follow the group guidelines."
     )
-    await update.message.reply_text(msg)
+    outbox.send(update.effective_chat.id, msg)
 
+@timed_handler
 async def queue(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.message.chat.type != "private":
-        await update.message.delete()
-        return
-    if update.message:
+    before_id = None
+    if update.callback_query:
+        # "Older links" button: the callback data carries the keyset cursor
+        query = update.callback_query
+        user_id = query.from_user.id
+        chat_id = query.message.chat_id
+        outbox.answer(chat_id, query.id)
+        before_id = int(query.data.split(":", 1)[1])
+    elif update.message:
+        if update.message.chat.type != "private":
+            outbox.delete(update.effective_chat.id, update.message.message_id)
+            return
         user_id = update.message.from_user.id
         chat_id = update.message.chat_id
-    elif update.callback_query:
-        user_id = update.callback_query.from_user.id
-        chat_id = user_id
-        await context.bot.answer_callback_query(update.callback_query.id)
     else:
         return
 
-    all_links = load_links(user_id)
-    links = [item for item in all_links if item.get('user_id') != user_id]
+    # One extra row tells whether an older page exists
+    page = await load_links(user_id, before_id, QUEUE_PAGE_SIZE + 1)
+    links = page[:QUEUE_PAGE_SIZE]
+    markup = None
+    if len(page) > QUEUE_PAGE_SIZE:
+        markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("⏭ Older links", callback_data=f"queue:{links[-1]['id']}")
+        ]])
     
-    if not links:
-        text = "📭 <b>No unliked Instagram links available.</b>"
-    else:
-        text = "📋 <b>Recent Instagram Links</b>\nYou need to /done as soon as possible after engaging (within 5 min). Only love react will count as engage.\n\n"
-        for item in links:
-            text += (
-                f"🔗 <b>ID:</b> <code>{item['id']}</code>\n"
-                f"📎 <a href=\"{item['link']}\">{item['link']}</a>\n\n"
-            )
+    text = render.queue_text(links)
 
-    await context.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+    if update.callback_query:
+        outbox.edit(chat_id, update.callback_query.message.message_id, text, parse_mode="HTML", reply_markup=markup)
+    else:
+        outbox.send(chat_id, text, parse_mode="HTML", reply_markup=markup)
 
+@timed_handler
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     """Command to display the leaderboard of top 5 users based on total_score."""
-    leaderboard_data = get_leaderboard()
-
-    if leaderboard_data:
-        text = "🏆 <b>Top 5 Users</b> (Total Score)\n\n"
-        for idx, (username, total_score) in enumerate(leaderboard_data, start=1):
-            text += f"{idx}. <b>{username}</b> - <b>{total_score}</b> points\n"
+    # /leaderboard daily|weekly ranks points earned in that window instead
+    period = context.args[0].lower() if context.args else ""
+    if period in LEADERBOARD_WINDOWS:
+        title = f"🏆 <b>Top 5 Users</b> ({period.capitalize()})\n\n"
     else:
-        text = "❌ No users found in the leaderboard."
+        # Anything else is the total board; one cache entry serves every spelling
+        period = ""
+        title = "🏆 <b>Top 5 Users</b> (Total Score)\n\n"
+
+    # Read before the query: a text built from newer data is merely filed under
+    # an older version. Windowed boards also roll over at midnight.
+    version = (leaderboard_board.board.version, leaderboard_board.day_of(time.time()))
+    text = render.leaderboards.get(period, version)
+    if text is None:
+        if period in LEADERBOARD_WINDOWS:
+            leaderboard_data = await get_window_leaderboard(LEADERBOARD_WINDOWS[period])
+        else:
+            leaderboard_data = await get_leaderboard()
+        text = render.leaderboard_text(title, leaderboard_data)
+        render.leaderboards.set(period, version, text)
 
     # Send the leaderboard message
-    await update.message.reply_text(text, parse_mode="HTML")
+    outbox.send(update.effective_chat.id, text, parse_mode="HTML")
     
+@timed_handler
 async def mystats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     user = update.message.from_user
-    score = get_user_score(user.id)
-    total_score = get_total_score(user.id)
-    username = get_username(user.id)
+    profile = await get_user_profile(user.id) or {"score": 0, "total_score": 0, "username": None}
+    score = profile["score"]
+    total_score = profile["total_score"]
+    username = profile["username"]
+    rank = await get_user_rank(user.id)
 
     msg = f"📊 Your current score is: {score} point{'s' if score != 1 else ''}.\n"
-    msg += f"🏆 Your total score is: {total_score} point{'s' if total_score != 1 else ''}.\n\n"
+    msg += f"🏆 Your total score is: {total_score} point{'s' if total_score != 1 else ''}.\n"
+    if rank:
+        msg += f"🏅 Your rank: #{rank[0]} of {rank[1]}\n"
+    msg += "\n"
     if username:
         msg += f"\n👤 Your Instagram username: {username}"
     else:
         msg += "\n⚠️ You haven't set your Instagram username yet. Use /username <your_username> to set it."
 
-    await update.message.reply_text(msg)
+    outbox.send(update.effective_chat.id, msg)
 
+@timed_handler
+async def perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message.chat.type != "private":
+        outbox.delete(update.effective_chat.id, update.message.message_id)
+        return
+    if update.effective_user.id not in ADMIN_IDS:
+        # Stay silent for everyone else
+        return
+    report = await perf_report()
+    # Telegram caps messages at 4096 characters
+    outbox.send(update.effective_chat.id, report[:4000])
+
+@timed_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
     await show_welcome(update)
 
+@timed_handler
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.chat.type != "private":
-        await update.message.delete()
+        outbox.delete(update.effective_chat.id, update.message.message_id)
         return
-    """Handle file uploads and save cookies.json, replacing the old one."""
+    """Handle cookies.json / cookies-<account>.json uploads, replacing that account's session."""
     if update.message and update.message.document:
         file = update.message.document
     
-        # Check if the file name is 'cookies.json'
-        if file.file_name == "cookies.json":
-            # Download the file
+        account = account_for_upload(file.file_name)
+        if account is not None:
             new_file = await context.bot.get_file(file.file_id)
-            
-            # Save the file to the server, replacing the old one
-            new_file.download(COOKIES_FILE_PATH)
-            
-            await update.message.reply_text("✅ File 'cookies.json' has been successfully saved.")
+            data = await new_file.download_as_bytearray()
+            try:
+                sessions.replace_from_json(account, bytes(data))
+            except ValueError as e:
+                outbox.send(update.effective_chat.id, f"❌ '{file.file_name}' was not saved: {e}")
+                return
+
+            # Live browsers switch to the new cookies without a restart
+            reload_sessions()
+            outbox.send(update.effective_chat.id, f"✅ File '{file.file_name}' has been successfully saved.")
         else:
-            await update.message.reply_text("Group Link: " + GROUP_LINK)
+            outbox.send(update.effective_chat.id, "Group Link: " + GROUP_LINK)
     else:
-        await update.message.reply_text("Group Link: " + GROUP_LINK)
+        outbox.send(update.effective_chat.id, "Group Link: " + GROUP_LINK)
 
+@timed_handler
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # await update.message.reply_text("Sorry, I didn't understand that. Please use one of the available commands.")
-    await update.message.delete()
+    outbox.delete(update.effective_chat.id, update.message.message_id)
 
         
 # === Message Handler ===
 
+@timed_handler
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     if update.message and update.effective_chat.id == TARGET_GROUP_ID:
@@ -267,85 +352,150 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.message.from_user
         text = update.message.text
                
-        match = re.search(INSTAGRAM_PATTERN, text, re.IGNORECASE)
-        if match:
-            link = match.group(0)
-
-            # Check if the user has a score greater than 0
-            current_score = get_user_score(user.id)
-            
-            username = get_username(user.id)  
+        links = extract_links(text)
+        if links:
+            profile = await get_user_profile(user.id)
+            username = profile["username"] if profile else None
             if not username:
                 # User hasn't set their Instagram username
-                await update.message.delete()  # Delete the message
+                outbox.delete(update.effective_chat.id, update.message.message_id)  # Delete the message
 
-                try:
-                    # Send a message to the user indicating they need to set an Instagram username
-                    await context.bot.send_message(
-                        chat_id=user.id,
-                        text="❌ You need to set an Instagram username to use this bot. Use /username <your_username>."
-                    )
-                except:
-                    logger.warning(f"Couldn’t message user {user.id}")
+                # Send a message to the user indicating they need to set an Instagram username
+                outbox.notify(user.id, "❌ You need to set an Instagram username to use this bot. Use /username <your_username>.")
                 return  # Stop further execution for this message
             
-            if current_score > 0:
-                # Decrement the score for the user
-                decrement_score(user.id)
-                
-                # Save the Instagram link to the database
-                save_link(user.id, link)
+            # Spend a point and save each link in one transaction; None means no points left
+            saved = []
+            duplicates = []
+            expired = []
+            out_of_points = False
+            for link in links:
+                try:
+                    link_id = await spend_point_and_save_link(user.id, link.url)
+                except DuplicateLink as e:
+                    # Already shared; no point spent
+                    (duplicates if e.active else expired).append(e.link_id)
+                    continue
+                if link_id is None:
+                    out_of_points = True
+                    break
+                saved.append(link.url)
+
+            if duplicates:
+                ids = ", ".join(str(link_id) for link_id in duplicates)
+                outbox.notify(
+                    user.id,
+                    f"♻️ Already shared (link ID {ids}), so no point was spent. Use /queue to find it."
+                )
+            if expired:
+                # Its likes still count, so sharing it again would pay them twice
+                ids = ", ".join(str(link_id) for link_id in expired)
+                outbox.notify(
+                    user.id,
+                    f"⌛ Already shared and since expired (link ID {ids}), so no point was spent. "
+                    "Expired posts can't be shared again."
+                )
 
+            if saved:
                 keyboard = [[
                     InlineKeyboardButton("📋 View List", url=f"https://t.me/{BOT_USERNAME}?start=queue"),
                     InlineKeyboardButton("📜 View Rules", url=f"https://t.me/{BOT_USERNAME}?start=rules")
                 ]]
                 markup = InlineKeyboardMarkup(keyboard)
 
-                try:
-                    await context.bot.send_message(
-                        chat_id=user.id,
-                        text="✅ Your Instagram link has been added successfully!\n\nUse the buttons below to view the list or rules.",
-                        reply_markup=markup
-                    )
-                except:
-                    logger.warning(f"Couldn’t message user {user.id}")
+                outbox.notify(
+                    user.id,
+                    "✅ Your Instagram link has been added successfully!\n\nUse the buttons below to view the list or rules.",
+                    reply_markup=markup,
+                )
 
-                await update.message.reply_text(text="✅ Link saved. Check your DMs!", reply_markup=markup)
+                outbox.send(
+                    update.effective_chat.id,
+                    "✅ Link saved. Check your DMs!",
+                    reply_markup=markup,
+                    reply_parameters=ReplyParameters(update.message.message_id, allow_sending_without_reply=True),
+                )
 
-                logger.info(f"New link saved: {link}")
-            else:
-                await update.message.delete()
-                try:
-                    await context.bot.send_message(
-                        chat_id=user.id,
-                        text="❌ You can't add a link yet! Go engage with others' posts, earn points, and then post here."
+                if out_of_points:
+                    outbox.notify(
+                        user.id,
+                        f"⚠️ Only {len(saved)} of your {len(links)} links were added. Engage with others' posts to earn points for the rest."
                     )
-                except:
-                    logger.warning(f"Couldn’t message user {user.id}")
+
+                logger.info(f"New link(s) saved: {', '.join(saved)}")
+            elif out_of_points:
+                outbox.delete(update.effective_chat.id, update.message.message_id)
+                outbox.notify(user.id, "❌ You can't add a link yet! Go engage with others' posts, earn points, and then post here.")
 
                 logger.info(f"User {user.id} tried to post with a score of 0.")
+            else:
+                # Nothing new in it
+                outbox.delete(update.effective_chat.id, update.message.message_id)
         else: 
-            await update.message.delete()
-            try:
-                await context.bot.send_message(
-                    chat_id=user.id,
-                    text="⚠️ Only Instagram links are allowed!\n❌ Your message has been deleted."
-                )
-            except:
-                logger.warning(f"Couldn’t message user {user.id}")
+            outbox.delete(update.effective_chat.id, update.message.message_id)
+            outbox.notify(user.id, "⚠️ Only Instagram links are allowed!\n❌ Your message has been deleted.")
             logger.info("Non-approved message deleted")
             
         # await update.message.reply_text("Test", text)
 
 
 
+@timed_handler
+async def note_private_sender(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Whoever writes to the bot hasn't blocked it (anymore)
+    if update.effective_chat and update.effective_chat.type == "private":
+        outbox.unblock(update.effective_chat.id)
+
+
+# === Lifecycle ===
+
+async def post_init(application):
+    await outbox.start(application.bot)
+    sessions.load()
+    if verification_queue.mode == "local":
+        # Warm up the shared browsers before the first /done arrives
+        await browser_pool.start()
+    await verification_queue.start()
+    await retention.start()
+    if verification_queue.mode == "local":
+        # Sweeps scrape with this process's browsers
+        await sweeper.start()
+    await metrics_server.start()
+
+async def post_shutdown(application):
+    await metrics_server.stop()
+    await sweeper.stop()
+    await retention.stop()
+    await verification_queue.stop()
+    # After the queue, so its last replies still go out
+    await outbox.stop()
+    await browser_pool.stop()
+    await sessions.close()
+    db_executor.shutdown()
+
+
 # === Main ===
 
 if __name__ == '__main__':
     init_db()
+    # Links saved before shortcodes existed; a no-op once done
+    filled, merged = backfill_shortcodes(move_jobs=storage.jobs.relink_jobs)
+    if merged:
+        logger.info(f"Merged {merged} duplicate link(s)")
+
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(update_processor)
+    )
+    if TELEGRAM_BASE_URL:
+        builder = builder.base_url(f"{TELEGRAM_BASE_URL}/bot").base_file_url(f"{TELEGRAM_BASE_URL}/file/bot")
+    app = builder.build()
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # Runs before every other handler group
+    app.add_handler(TypeHandler(Update, note_private_sender), group=-1)
 
     # Add specific handlers first
     app.add_handler(CommandHandler("start", start))
@@ -354,8 +504,10 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("status", mystats))
     app.add_handler(CommandHandler("queue", queue))
+    app.add_handler(CallbackQueryHandler(queue, pattern=r"^queue:\d+$"))
     app.add_handler(CommandHandler("rules", show_rules))
     app.add_handler(CommandHandler("leaderboard", leaderboard))
+    app.add_handler(CommandHandler("perf", perf))
 
     # Add handlers for documents and regular text messages
     app.add_handler(MessageHandler(filters.Document.ALL, handle_file))
@@ -365,11 +517,13 @@ if __name__ == '__main__':
     app.add_handler(MessageHandler(filters.TEXT, unknown))
     
 
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
-    try:
-        app.run_polling(allowed_updates=Update.ALL_TYPES)
-    except Conflict as e:
-        print("Bot polling conflict: another instance may be running. Exiting.")
+    if BOT_MODE == "webhook":
+        run_webhook(app)
+    else:
+        try:
+            app.run_polling(allowed_updates=Update.ALL_TYPES)
+        except Conflict as e:
+            print("Bot polling conflict: another instance may be running. Exiting.")
     
 
 
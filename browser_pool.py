@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from metrics import scraper_phase_seconds
+from playwright.async_api import (
+    async_playwright,
+    Error as PlaywrightError,
+    TimeoutError as PlaywrightTimeoutError,
+)
+
+logger = logging.getLogger(__name__)
+
+# === Pool Configuration ===
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("BROWSER_HEALTH_CHECK_INTERVAL", "60"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("BROWSER_HEALTH_CHECK_TIMEOUT", "5"))
+HEADLESS = os.getenv("BROWSER_HEADLESS", "1") != "0"
+
+
+class _Slot:
+    """One warm browser with its reusable context and page."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.uses = 0
+        self.broken = False
+        # Awaited with the context before its next checkout; see apply_to_contexts()
+        self.refresh = None
+
+
+class BrowserPool:
+    """A bounded pool of long-lived Chromium browsers shared by all verifications."""
+
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, headless=HEADLESS,
+                 on_new_context=None):
+        self.size = size
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+        self.headless = headless
+        # Awaited with every freshly created context and its slot index (e.g. to load cookies)
+        self.on_new_context = on_new_context
+
+        self._playwright = None
+        self._slots = []
+        self._idle = None
+        self._health_task = None
+        # Background relaunches, kept so they aren't garbage-collected mid-run
+        self._relaunches = set()
+        self._start_lock = asyncio.Lock()
+        self._started = False
+
+        # Metrics
+        self.checkouts = 0
+        self.recycles = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # === Lifecycle ===
+
+    async def start(self):
+        """Launch the playwright driver and warm up every browser slot."""
+        async with self._start_lock:
+            if self._started:
+                return
+            self._playwright = await async_playwright().start()
+            self._idle = asyncio.Queue()
+            self._slots = [_Slot(i) for i in range(self.size)]
+            try:
+                for slot in self._slots:
+                    await self._launch(slot)
+                    self._idle.put_nowait(slot)
+            except BaseException:
+                # Don't leave the browsers launched so far, or the driver, running
+                for slot in self._slots:
+                    await self._close(slot)
+                await self._playwright.stop()
+                self._playwright = None
+                raise
+            if self.health_check_interval > 0:
+                self._health_task = asyncio.create_task(self._health_loop())
+            self._started = True
+            logger.info(f"Browser pool started with {self.size} browser(s)")
+
+    async def stop(self):
+        """Close every browser and the playwright driver."""
+        async with self._start_lock:
+            if not self._started:
+                return
+            self._started = False
+            if self._health_task:
+                self._health_task.cancel()
+                self._health_task = None
+            for task in list(self._relaunches):
+                task.cancel()
+            await asyncio.gather(*self._relaunches, return_exceptions=True)
+            for slot in self._slots:
+                await self._close(slot)
+            await self._playwright.stop()
+            self._playwright = None
+            logger.info("Browser pool stopped")
+
+    # === Checkout ===
+
+    @asynccontextmanager
+    async def page(self):
+        """Check out a warm page for the duration of one verification."""
+        if not self._started:
+            await self.start()
+
+        requested = time.monotonic()
+        slot = await self._idle.get()
+        waited = time.monotonic() - requested
+        scraper_phase_seconds.observe(waited, "checkout")
+        self.checkouts += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+        try:
+            if slot.refresh is not None and not slot.broken and slot.browser is not None:
+                refresh, slot.refresh = slot.refresh, None
+                try:
+                    await refresh(slot.context, slot.index)
+                except PlaywrightError as e:
+                    # A fresh context gets the same treatment from on_new_context
+                    logger.warning(f"Updating browser slot {slot.index} failed: {e}")
+                    slot.broken = True
+            if slot.broken or slot.browser is None or not slot.browser.is_connected():
+                try:
+                    await self._recycle(slot)
+                except BaseException:
+                    slot.broken = True
+                    raise
+            slot.uses += 1
+            yield slot.page
+        except PlaywrightTimeoutError:
+            # A slow page is not a broken browser
+            raise
+        except PlaywrightError:
+            # The browser may have crashed mid-check; don't hand it out again
+            slot.broken = True
+            raise
+        finally:
+            if slot.broken or slot.uses >= self.max_uses:
+                self._relaunch(slot)
+            else:
+                self._idle.put_nowait(slot)
+
+    def apply_to_contexts(self, func):
+        """Have `func(context, slot_index)` awaited on every context before its next checkout.
+
+        A context in use is left alone until its page comes back to the pool.
+        Slots launched later get the same treatment from `on_new_context`.
+        """
+        for slot in self._slots:
+            slot.refresh = func
+
+    def stats(self):
+        """Return a snapshot of pool metrics."""
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "checkouts": self.checkouts,
+            "recycles": self.recycles,
+            "checkout_wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+            "checkout_wait_max": self.wait_max,
+        }
+
+    # === Slot management ===
+
+    async def _launch(self, slot: _Slot):
+        with scraper_phase_seconds.time("launch"):
+            slot.browser = await self._playwright.chromium.launch(headless=self.headless)
+            slot.context = await slot.browser.new_context()
+            if self.on_new_context:
+                await self.on_new_context(slot.context, slot.index)
+            slot.page = await slot.context.new_page()
+        slot.uses = 0
+        slot.broken = False
+        slot.refresh = None
+
+    async def _close(self, slot: _Slot):
+        try:
+            if slot.browser:
+                await slot.browser.close()
+        except PlaywrightError:
+            pass
+        slot.browser = slot.context = slot.page = None
+
+    async def _recycle(self, slot: _Slot):
+        await self._close(slot)
+        await self._launch(slot)
+        self.recycles += 1
+        logger.info(f"Browser slot {slot.index} recycled")
+
+    def _relaunch(self, slot: _Slot):
+        task = asyncio.create_task(self._recycle_and_release(slot))
+        self._relaunches.add(task)
+        task.add_done_callback(self._relaunches.discard)
+
+    async def _recycle_and_release(self, slot: _Slot):
+        delay = 1
+        try:
+            while self._started:
+                try:
+                    await self._recycle(slot)
+                    break
+                except Exception as e:
+                    # Whatever failed (launch, cookies, I/O), the slot must come back
+                    slot.broken = True
+                    logger.warning(f"Relaunching browser slot {slot.index} failed: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60)
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def _healthy(self, slot: _Slot):
+        if slot.broken or slot.browser is None or not slot.browser.is_connected():
+            return False
+        try:
+            await asyncio.wait_for(slot.page.evaluate("1"), HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            # Only inspect slots that are idle right now; busy ones are checked on return
+            for _ in range(self._idle.qsize()):
+                try:
+                    slot = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if await self._healthy(slot):
+                    self._idle.put_nowait(slot)
+                else:
+                    logger.warning(f"Browser slot {slot.index} failed health check")
+                    self._relaunch(slot)
@@ -0,0 +1,264 @@
+import hashlib
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# === Cache Configuration ===
+CACHE_ENABLED = os.getenv("DB_CACHE_ENABLED", "1") != "0"
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+LINK_CACHE_SIZE = int(os.getenv("LINK_CACHE_SIZE", "5000"))
+RECENT_LINKS_SIZE = int(os.getenv("RECENT_LINKS_SIZE", "200"))
+# Shortcodes the duplicate-link filter is sized for before it's rebuilt bigger
+LINK_BLOOM_CAPACITY = int(os.getenv("LINK_BLOOM_CAPACITY", "100000"))
+LINK_BLOOM_ERROR_RATE = float(os.getenv("LINK_BLOOM_ERROR_RATE", "0.01"))
+NEGATIVE_CACHE_SIZE = int(os.getenv("NEGATIVE_CACHE_SIZE", "10000"))
+
+MISSING = object()
+
+
+def _deep_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return size
+
+
+class LRUCache:
+    """A thread-safe LRU map with an optional per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a read that raced a write isn't cached
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation: int = None):
+        """Store `value`, unless an invalidation happened since `generation` was read."""
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "memory_bytes": sys.getsizeof(self._data)
+                + sum(sys.getsizeof(k) + _deep_size(v[0]) for k, v in self._data.items()),
+            }
+
+
+class RecentLinks:
+    """Ring buffer of the newest links, newest first, filled lazily from the database."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._links = deque(maxlen=size)
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def load(self, rows, generation: int):
+        """Fill the buffer with `rows` of (link_id, user_id, link), newest first.
+
+        Skipped when a link was added after `generation` was read, since `rows`
+        would be missing it; the next caller simply loads again.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._links = deque(rows[:self.size], maxlen=self.size)
+            self._loaded = True
+
+    def add(self, link_id: int, user_id: int, link: str):
+        with self._lock:
+            self.generation += 1
+            if self._loaded:
+                self._links.appendleft((link_id, user_id, link))
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._links), len(self._links) == self.size
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._links.clear()
+            self._loaded = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._links),
+                "memory_bytes": sys.getsizeof(self._links) + sum(_deep_size(row) for row in self._links),
+            }
+
+
+class BloomFilter:
+    """Set membership in a fixed bit array: false positives, never false negatives.
+
+    Filled lazily from the database like RecentLinks. Once more keys than
+    `capacity` were added the error rate climbs, so `saturated` asks the
+    owner to load it again with a larger capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._size(capacity)
+        self._loaded = False
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _size(self, capacity: int):
+        self.capacity = capacity
+        self._bits_count = max(8, math.ceil(-capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._bits_count / capacity * math.log(2)))
+        self._bits = bytearray((self._bits_count + 7) // 8)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def saturated(self):
+        return self.count > self.capacity
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self._bits_count for i in range(self._hashes)]
+
+    def load(self, keys, capacity: int):
+        with self._lock:
+            self._size(capacity)
+            self.count = 0
+            for key in keys:
+                self._add(key)
+            self._loaded = True
+
+    def _add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def add(self, key: str):
+        with self._lock:
+            if self._loaded:
+                self._add(key)
+
+    def __contains__(self, key: str):
+        positions = self._positions(key)
+        with self._lock:
+            found = all(self._bits[p >> 3] & (1 << (p & 7)) for p in positions)
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found
+
+    def clear(self):
+        with self._lock:
+            self._bits = bytearray(len(self._bits))
+            self.count = 0
+            self._loaded = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": self.count,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_bytes": sys.getsizeof(self._bits),
+            }
+
+
+# user_id -> (score, total_score, username), or None for unknown users
+user_profiles = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+# link_id -> link; links never change once saved
+links = LRUCache(LINK_CACHE_SIZE)
+recent_links = RecentLinks(RECENT_LINKS_SIZE)
+# Shortcodes of every saved link, in front of the unique index
+shortcodes = BloomFilter(LINK_BLOOM_CAPACITY, LINK_BLOOM_ERROR_RATE)
+# (user_id, link_id) -> times of the latest 'not_liked' verifications
+negative_checks = LRUCache(NEGATIVE_CACHE_SIZE)
+
+_enabled = CACHE_ENABLED
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value: bool):
+    """Turn caching on or off, dropping anything cached so far."""
+    global _enabled
+    _enabled = value
+    clear()
+
+
+def clear():
+    user_profiles.clear()
+    links.clear()
+    recent_links.clear()
+    shortcodes.clear()
+    negative_checks.clear()
+
+
+def stats():
+    """Return hit ratio and memory usage of every cache."""
+    return {
+        "enabled": _enabled,
+        "user_profiles": user_profiles.stats(),
+        "links": links.stats(),
+        "recent_links": recent_links.stats(),
+        "shortcodes": shortcodes.stats(),
+        "negative_checks": negative_checks.stats(),
+    }
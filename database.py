@@ -1,140 +1,425 @@
+import bisect
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
+import cache
+import leaderboard
+import links
+import render
+
 # === Database Configuration ===
 DB_PATH = Path("engagement.db")
 
+# Read-only connections kept open next to the single writer
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+# Page cache per connection in KiB and memory-mapped I/O size in bytes
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Compiled statements each connection keeps for reuse
+DB_STATEMENT_CACHE = 128
+
+_MAX_ROWID = 2 ** 63 - 1
+
+# === Connection Management ===
+
+class _ConnectionManager:
+    """One long-lived writer connection plus a small pool of reader connections.
+
+    SQLite allows a single writer at a time, so writes are serialized on one
+    connection behind a lock while WAL mode lets readers run alongside it.
+    """
+
+    def __init__(self, path, readers: int):
+        self.path = path
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.Semaphore(readers)
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE
+        )
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            # A new file; auto_vacuum only takes effect before the first table
+            # exists, outside a transaction and before the switch to WAL.
+            # Existing files switch with enable_incremental_vacuum()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across application crashes in WAL mode
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA busy_timeout=5000")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def write(self, immediate: bool = True):
+        """Yield a cursor on the writer connection inside one transaction.
+
+        The transaction takes the file's write lock up front: with verification
+        workers in other processes, a transaction that reads before it writes
+        would otherwise fail if another process committed in between.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            try:
+                if immediate:
+                    self._writer.execute('BEGIN IMMEDIATE')
+                yield self._writer.cursor()
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def read(self):
+        """Yield a cursor on a pooled reader connection."""
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn.cursor()
+            finally:
+                # Don't hold a read snapshot open between checkouts
+                conn.rollback()
+                self._readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    def close(self):
+        with self._write_lock, self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._writer = None
+            self._readers = queue.LifoQueue()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def _connections():
+    global _manager
+    with _manager_lock:
+        # DB_PATH may be repointed (e.g. by scripts); connections follow it
+        if _manager is None or _manager.path != DB_PATH:
+            if _manager is not None:
+                _manager.close()
+            _manager = _ConnectionManager(DB_PATH, DB_READERS)
+            _forget_memory()
+        return _manager
+
+
+def _write(immediate: bool = True):
+    return _connections().write(immediate)
+
+
+def _read():
+    return _connections().read()
+
+
+def close_connections():
+    """Close every pooled connection, e.g. before copying the database file."""
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+            _manager = None
+    _forget_memory()
+
+
+def _forget_memory():
+    # In-memory state mirrors one database file
+    cache.clear()
+    leaderboard.board.reset()
+    render.clear()
+
+
 # === Database Functions ===
 
 def init_db():
     """Initialize the database and create necessary tables."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Users table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            score INTEGER DEFAULT 5,
-            total_score INTEGER DEFAULT 5
+    with _write() as c:
+        # Users table
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                score INTEGER DEFAULT 5,
+                total_score INTEGER DEFAULT 5
+            )
+        ''')
+
+        # Instagram links table with auto-incrementing link_id
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS instagram_links (
+                link_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                link TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        ''')
+
+        # User likes table
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS user_likes (
+            user_id INTEGER,
+            link_id INTEGER,
+            PRIMARY KEY (user_id, link_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (link_id) REFERENCES instagram_links (id)
         )
-    ''')
-    
-    # Instagram links table with auto-incrementing link_id
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS instagram_links (
-            link_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ''')
+
+        # Pending /done verifications, processed by verification_queue workers
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS verification_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                link_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                next_run_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_verification_jobs_status
+            ON verification_jobs (status, next_run_at)
+        ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_verification_jobs_user
+            ON verification_jobs (user_id, created_at)
+        ''')
+
+        _migrate(c)
+
+
+# === Schema Migrations ===
+
+# Applied in order by init_db; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    # 1: indexes for /queue and per-link like lookups. The (user_id, link_id)
+    # primary key of user_likes already covers the /queue anti-join probe,
+    # and link_id is the rowid, so newest-first scans need no extra index.
+    [
+        'CREATE INDEX IF NOT EXISTS idx_user_likes_link ON user_likes (link_id)',
+        'CREATE INDEX IF NOT EXISTS idx_instagram_links_timestamp ON instagram_links (timestamp)',
+    ],
+    # 2: log of total_score credits for the daily and weekly leaderboards
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS score_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_score_events_created ON score_events (created_at)',
+    ],
+    # 3: canonical post shortcode, one row per post. Rows saved before this
+    # stay NULL (which the unique index allows) until backfill_shortcodes().
+    [
+        'ALTER TABLE instagram_links ADD COLUMN shortcode TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_instagram_links_shortcode ON instagram_links (shortcode)',
+    ],
+    # 4: retention. Inactive links leave the /queue working set (the partial
+    # index only covers active ones) and are later moved to the archive tables.
+    [
+        'ALTER TABLE instagram_links ADD COLUMN active INTEGER NOT NULL DEFAULT 1',
+        'CREATE INDEX IF NOT EXISTS idx_instagram_links_active ON instagram_links (link_id) WHERE active = 1',
+        '''
+        CREATE TABLE IF NOT EXISTS instagram_links_archive (
+            link_id INTEGER PRIMARY KEY,
             user_id INTEGER NOT NULL,
             link TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+            timestamp TEXT,
+            shortcode TEXT,
+            archived_at REAL NOT NULL
         )
-    ''')
-    
-    
-    # User likes table
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS user_likes (
-        user_id INTEGER,
-        link_id INTEGER,
-        PRIMARY KEY (user_id, link_id),
-        FOREIGN KEY (user_id) REFERENCES users (user_id),
-        FOREIGN KEY (link_id) REFERENCES instagram_links (id)
-    )
-    ''')
-
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_likes_archive (
+            user_id INTEGER NOT NULL,
+            link_id INTEGER NOT NULL,
+            archived_at REAL NOT NULL,
+            PRIMARY KEY (user_id, link_id)
+        )
+        ''',
+    ],
+    # 5: every /done outcome ('liked', 'not_liked' or 'error'), for the
+    # negative cache, per (user, link) re-check backoff and scraper analytics
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS verification_results (
+            result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            link_id INTEGER NOT NULL,
+            result TEXT NOT NULL,
+            latency REAL,
+            engine TEXT,
+            error TEXT,
+            checked_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_verification_results_user_link ON verification_results (user_id, link_id, checked_at)',
+        'CREATE INDEX IF NOT EXISTS idx_verification_results_checked ON verification_results (checked_at)',
+    ],
+    # 6: score ledger. Every score change becomes an event, and pruned events
+    # are folded into a per-user checkpoint, so checkpoint + events replays to
+    # the live counters. Events logged so far were all +1 like credits; the
+    # first checkpoints hold whatever the log doesn't explain.
+    [
+        "ALTER TABLE score_events ADD COLUMN kind TEXT NOT NULL DEFAULT 'like'",
+        'ALTER TABLE score_events ADD COLUMN score_delta INTEGER NOT NULL DEFAULT 1',
+        '''
+        CREATE TABLE IF NOT EXISTS score_checkpoints (
+            user_id INTEGER PRIMARY KEY,
+            score INTEGER NOT NULL,
+            total_score INTEGER NOT NULL
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO score_checkpoints (user_id, score, total_score)
+        SELECT u.user_id, COALESCE(u.score, 0) - COALESCE(e.score_delta, 0), COALESCE(u.total_score, 0) - COALESCE(e.delta, 0)
+        FROM users AS u LEFT JOIN (
+            SELECT user_id, SUM(score_delta) AS score_delta, SUM(delta) AS delta FROM score_events GROUP BY user_id
+        ) AS e USING (user_id)
+        ''',
+        # Rows of each table dbtool has imported per export, for resuming
+        '''
+        CREATE TABLE IF NOT EXISTS bulk_import_progress (
+            source TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            PRIMARY KEY (source, table_name)
+        )
+        ''',
+    ],
+    # 7: jobs for verification workers in other processes. A job carries the
+    # username and link to check, workers hold it under a lease and write the
+    # result back as status 'checked' for the bot to apply.
+    [
+        'ALTER TABLE verification_jobs ADD COLUMN username TEXT',
+        'ALTER TABLE verification_jobs ADD COLUMN link TEXT',
+        'ALTER TABLE verification_jobs ADD COLUMN result TEXT',
+        'ALTER TABLE verification_jobs ADD COLUMN latency REAL',
+        'ALTER TABLE verification_jobs ADD COLUMN engine TEXT',
+        'ALTER TABLE verification_jobs ADD COLUMN lease_until REAL',
+        '''
+        UPDATE verification_jobs SET
+            username = (SELECT username FROM users WHERE users.user_id = verification_jobs.user_id),
+            link = (SELECT link FROM instagram_links AS l WHERE l.link_id = verification_jobs.link_id)
+        WHERE status IN ('pending', 'running')
+        ''',
+    ],
+    # 8: liker sweeps match scraped (lowercase) usernames against users in bulk
+    [
+        'CREATE INDEX IF NOT EXISTS idx_users_username_lower ON users (lower(username))',
+    ],
+]
 
-    conn.commit()
-    conn.close()
+def _migrate(c):
+    c.execute('PRAGMA user_version')
+    version = c.fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for sql in statements:
+            c.execute(sql)
+        c.execute(f'PRAGMA user_version = {number}')
 
 
 
 def increment_score(user_id: int, username: str):
     """Increment the score for a user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    with _write() as c:
+        # Check if the user exists
+        c.execute('SELECT score FROM users WHERE user_id = ?', (user_id,))
+        result = c.fetchone()
 
-    # Check if the user exists
-    c.execute('SELECT score FROM users WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-
-    if result:
-        # User exists, increment score and total_score
-        c.execute('UPDATE users SET score = score + 1, total_score = total_score + 1 WHERE user_id = ?', (user_id,))
-    else:
-        # User doesn't exist, insert a new user with score and total_score
-        c.execute('''
-            INSERT INTO users (user_id, username, score, total_score)
-            VALUES (?, ?, 1, 1)
-        ''', (user_id, username))
-    
-    conn.commit()
-    conn.close()
+        if result:
+            # User exists, increment score and total_score
+            c.execute('''
+                UPDATE users SET score = score + 1, total_score = total_score + 1 WHERE user_id = ?
+                RETURNING username, total_score
+            ''', (user_id,))
+        else:
+            # User doesn't exist, insert a new user with score and total_score
+            c.execute('''
+                INSERT INTO users (user_id, username, score, total_score)
+                VALUES (?, ?, 1, 1)
+                RETURNING username, total_score
+            ''', (user_id, username))
+        _credit_score(c, user_id, *c.fetchone())
+    cache.user_profiles.invalidate(user_id)
 
 def decrement_score(user_id: int):
     """Decrement the score for a user (only decreases score, not total_score)."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Check if the user exists
-    c.execute('SELECT score FROM users WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-
-    if result:
-        # User exists, decrement score
-        new_score = result[0] - 1
-        # Ensure the score doesn't go below 0
-        new_score = max(new_score, 0)
-        c.execute('UPDATE users SET score = ? WHERE user_id = ?', (new_score, user_id))
-    else:
-        # User doesn't exist
-        print("User not found.")
-    
-    conn.commit()
-    conn.close()
+    with _write() as c:
+        # Check if the user exists
+        c.execute('SELECT score FROM users WHERE user_id = ?', (user_id,))
+        result = c.fetchone()
 
-def get_user_score(user_id: int):
-    """Get the score of a user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT score FROM users WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else 0
+        if result:
+            # User exists, decrement score
+            new_score = result[0] - 1
+            # Ensure the score doesn't go below 0
+            new_score = max(new_score, 0)
+            c.execute('UPDATE users SET score = ? WHERE user_id = ?', (new_score, user_id))
+            if new_score != result[0]:
+                _log_score(c, user_id, 'decrement', new_score - result[0], 0)
+        else:
+            # User doesn't exist
+            print("User not found.")
+    cache.user_profiles.invalidate(user_id)
 
-def get_username(user_id: int):
+def get_user_score(user_id: int):
     """Get the score of a user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT get_username FROM users WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
+    result = _load_profile(user_id)
     return result[0] if result else 0
 
 
 
-
 def get_total_score(user_id: int):
     """Get the score of a user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT total_score FROM users WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else 0
+    result = _load_profile(user_id)
+    return result[1] if result else 0
 
 
 
 def get_leaderboard(limit=5):
     """Get the leaderboard (top users based on total_score)."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT username, total_score FROM users ORDER BY total_score DESC LIMIT ?', (limit,))
-    results = c.fetchall()
-    conn.close()
-    return results
+    return _leaderboard().top(limit)
+
+def get_window_leaderboard(days: int, limit=5):
+    """Get the users who earned the most points in the last `days` days."""
+    return _leaderboard().top_window(days, limit)
+
+def get_user_rank(user_id: int):
+    """Get (rank, number_of_users) of a user by total_score, or None."""
+    return _leaderboard().rank(user_id)
 
 
 
@@ -142,81 +427,901 @@ def get_leaderboard(limit=5):
 def save_link(user_id: int, link: str):
     """Save Instagram link to the database."""
     timestamp = datetime.now().isoformat()
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO instagram_links (user_id, link, timestamp)
-        VALUES (?, ?, ?)
-    ''', (user_id, link, timestamp))
-    conn.commit()
-    conn.close()
+    shortcode = links.shortcode_of(link)
+    with _write() as c:
+        _check_duplicate(c, shortcode)
+        link_id = _insert_link(c, user_id, link, shortcode, timestamp)
+    _remember_link(link_id, user_id, link)
+    return link_id
 
 def save_user_like(user_id: int, link_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT OR IGNORE INTO user_likes (user_id, link_id) VALUES (?, ?)', (user_id, link_id))
-    conn.commit()
-    conn.close()
+    with _write() as c:
+        c.execute('INSERT OR IGNORE INTO user_likes (user_id, link_id) VALUES (?, ?)', (user_id, link_id))
 
 def has_liked(user_id: int, link_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT 1 FROM user_likes WHERE user_id = ? AND link_id = ?', (user_id, link_id))
-    result = c.fetchone()
-    conn.close()
+    with _read() as c:
+        c.execute('SELECT 1 FROM user_likes WHERE user_id = ? AND link_id = ?', (user_id, link_id))
+        result = c.fetchone()
     return bool(result)
 
 def get_link_by_id(link_id: int):
     """Retrieve a link by its ID."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT link FROM instagram_links WHERE link_id = ?', (link_id,))  # Change id to link_id
-    result = c.fetchone()
-    conn.close()
-    return {"link": result[0]} if result else None
-
-def load_links(user_id: int):
-    """Load the last 7 Instagram links the user hasn't liked yet, excluding their own links."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        SELECT link_id, link FROM instagram_links
-        WHERE user_id != ? AND link_id NOT IN (
-            SELECT link_id FROM user_likes WHERE user_id = ?
-        )
-        ORDER BY timestamp DESC LIMIT 7
-    ''', (user_id, user_id))
-    rows = c.fetchall()
-    conn.close()
+    if cache.enabled():
+        link = cache.links.get(link_id)
+        if link is not cache.MISSING:
+            return {"link": link}
+    with _read() as c:
+        c.execute('SELECT link FROM instagram_links WHERE link_id = ?', (link_id,))  # Change id to link_id
+        result = c.fetchone()
+    if not result:
+        return None
+    if cache.enabled():
+        cache.links.set(link_id, result[0])
+    return {"link": result[0]}
+
+def load_links(user_id: int, before_id: int = None, limit: int = 7):
+    """Load the newest Instagram links the user hasn't liked yet, excluding their own links.
+
+    Pass the smallest id of the previous page as `before_id` to get the next
+    (older) page. link_id grows with insertion time, so walking it backwards
+    through the rowid replaces ORDER BY timestamp and OFFSET scans.
+    """
+    if before_id is None and cache.enabled():
+        links = _load_recent_links(user_id, limit)
+        if links is not None:
+            return links
+
+    with _read() as c:
+        c.execute('''
+            SELECT l.link_id, l.link FROM instagram_links AS l
+            LEFT JOIN user_likes AS ul ON ul.user_id = ? AND ul.link_id = l.link_id
+            WHERE ul.link_id IS NULL AND l.user_id != ? AND l.link_id < ? AND l.active = 1
+            ORDER BY l.link_id DESC LIMIT ?
+        ''', (user_id, user_id, before_id or _MAX_ROWID, limit))
+        rows = c.fetchall()
     return [{"id": row[0], "link": row[1]} for row in rows]
 
 
 
 def set_username(user_id: int, username: str):
     """Save the Instagram username of the user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Only insert user_id and username. score and total_score will use their default values
-    c.execute('''
-        INSERT OR REPLACE INTO users (user_id, username)
-        VALUES (?, ?)
-    ''', (user_id, username))
-    
-    conn.commit()
-    conn.close()
+    with _write() as c:
+        # Only insert user_id and username. score and total_score will use their default values
+        c.execute('''
+            INSERT OR IGNORE INTO users (user_id, username)
+            VALUES (?, ?)
+            RETURNING score, total_score
+        ''', (user_id, username))
+        joined = c.fetchone()
+        if joined:
+            _log_score(c, user_id, 'join', *joined)
+            total_score = joined[1]
+        else:
+            # Existing users keep their points
+            c.execute('UPDATE users SET username = ? WHERE user_id = ? RETURNING total_score', (username, user_id))
+            total_score = c.fetchone()[0]
+        if leaderboard.board.loaded:
+            leaderboard.board.update(user_id, username, total_score)
+    cache.user_profiles.invalidate(user_id)
 
 def get_username(user_id: int):
     """Get the Instagram username of the user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT username FROM users WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
+    result = _load_profile(user_id)
+    return result[2] if result else None
+
+
+# === Composite Operations ===
+
+def get_user_profile(user_id: int):
+    """Get score, total_score and username of a user in one lookup, or None."""
+    result = _load_profile(user_id)
+    if not result:
+        return None
+    return {"score": result[0], "total_score": result[1], "username": result[2]}
+
+def spend_point_and_save_link(user_id: int, link: str):
+    """Spend one point and save the link atomically.
+
+    Returns the new link_id, or None when the user has no points left. The
+    conditional UPDATE makes concurrent posts unable to overspend. Raises
+    DuplicateLink, without spending, when the post was already shared.
+    """
+    timestamp = datetime.now().isoformat()
+    shortcode = links.shortcode_of(link)
+    with _write() as c:
+        _check_duplicate(c, shortcode)
+        c.execute('UPDATE users SET score = score - 1 WHERE user_id = ? AND score > 0 RETURNING score', (user_id,))
+        spent = c.fetchone() is not None
+        if spent:
+            _log_score(c, user_id, 'spend', -1, 0)
+            link_id = _insert_link(c, user_id, link, shortcode, timestamp)
+    if not spent:
+        return None
+    cache.user_profiles.invalidate(user_id)
+    _remember_link(link_id, user_id, link)
+    return link_id
+
+def get_done_context(user_id: int, link_id: int):
+    """Get everything /done needs in one query: username, link and whether it's already liked."""
+    with _read() as c:
+        c.execute('''
+            SELECT
+                (SELECT username FROM users WHERE user_id = ?),
+                (SELECT link FROM instagram_links WHERE link_id = ?),
+                EXISTS (SELECT 1 FROM user_likes WHERE user_id = ? AND link_id = ?)
+        ''', (user_id, link_id, user_id, link_id))
+        result = c.fetchone()
+    return {"username": result[0], "link": result[1], "liked": bool(result[2])}
+
+def record_like(user_id: int, link_id: int, username: str):
+    """Save a like and credit the point in one transaction.
+
+    Returns False without touching the score when the like was already recorded.
+    """
+    with _write() as c:
+        c.execute('INSERT OR IGNORE INTO user_likes (user_id, link_id) VALUES (?, ?)', (user_id, link_id))
+        recorded = c.rowcount > 0
+        if recorded:
+            c.execute('''
+                INSERT INTO users (user_id, username, score, total_score) VALUES (?, ?, 1, 1)
+                ON CONFLICT (user_id) DO UPDATE SET score = score + 1, total_score = total_score + 1
+                RETURNING username, total_score
+            ''', (user_id, username))
+            _credit_score(c, user_id, *c.fetchone())
+    if recorded:
+        cache.user_profiles.invalidate(user_id)
+    return recorded
+
+
+# === Leaderboard ===
+
+def _credit_score(c, user_id: int, username: str, total_score: int):
+    """Log a +1 total_score credit and move the user on the in-memory leaderboard.
+
+    Runs inside the write transaction, so it can't interleave with a reload.
+    """
+    now = _log_score(c, user_id, 'like', 1, 1)
+    if leaderboard.board.loaded:
+        leaderboard.board.update(user_id, username, total_score)
+        leaderboard.board.record(user_id, 1, now)
+
+def _log_score(c, user_id: int, kind: str, score_delta: int, delta: int):
+    """Append a score change to the ledger; returns its timestamp.
+
+    Every change to users.score or users.total_score goes through here, in the
+    same transaction, so dbtool's replay can rebuild both from the log.
+    """
+    now = time.time()
+    c.execute('''
+        INSERT INTO score_events (user_id, kind, delta, score_delta, created_at) VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, kind, delta, score_delta, now))
+    return now
+
+def _leaderboard():
+    """Return the in-memory leaderboard, loading it from the database on first use."""
+    board = leaderboard.board
+    if not board.loaded:
+        since = time.time() - board.window_days * leaderboard.DAY
+        # Under the write lock so no score change slips between the two reads
+        with _write() as c:
+            if not board.loaded:
+                c.execute('SELECT user_id, username, total_score FROM users')
+                users = c.fetchall()
+                c.execute('''
+                    SELECT user_id, delta, created_at FROM score_events WHERE created_at >= ? AND kind = 'like'
+                ''', (since,))
+                board.load(users, c.fetchall())
+    return board
+
+
+# === Duplicate Links ===
+
+class DuplicateLink(Exception):
+    """The post behind a link was already shared, as `link_id`.
+
+    `active` is False when that link has expired: it's off /queue but, until
+    it is archived, still holds the post's likes.
+    """
+
+    def __init__(self, link_id: int, active: bool = True):
+        super().__init__(f"Post already shared as link {link_id}")
+        self.link_id = link_id
+        self.active = active
+
+def _check_duplicate(c, shortcode: str):
+    """Raise DuplicateLink if a link with this shortcode exists. Runs under the write lock."""
+    if shortcode is None:
+        return
+    # Most posts are new: a bloom filter miss skips the index lookup
+    if cache.enabled() and shortcode not in _shortcode_filter(c):
+        return
+    c.execute('SELECT link_id, active FROM instagram_links WHERE shortcode = ?', (shortcode,))
+    row = c.fetchone()
+    if row:
+        raise DuplicateLink(row[0], bool(row[1]))
 
+def _insert_link(c, user_id: int, link: str, shortcode: str, timestamp: str):
+    c.execute('''
+        INSERT INTO instagram_links (user_id, link, timestamp, shortcode)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, link, timestamp, shortcode))
+    if shortcode is not None:
+        # Before commit, so no writer can miss it; a failed commit only costs a false positive
+        cache.shortcodes.add(shortcode)
+    return c.lastrowid
+
+def _shortcode_filter(c):
+    bloom = cache.shortcodes
+    if not bloom.loaded or bloom.saturated:
+        c.execute('SELECT COUNT(*) FROM instagram_links WHERE shortcode IS NOT NULL')
+        capacity = max(cache.LINK_BLOOM_CAPACITY, 2 * c.fetchone()[0])
+        c.execute('SELECT shortcode FROM instagram_links WHERE shortcode IS NOT NULL')
+        bloom.load((row[0] for row in c), capacity)
+    return bloom
+
+def find_link_by_shortcode(shortcode: str):
+    """Return the link_id of the post with this shortcode, or None."""
+    with _read() as c:
+        c.execute('SELECT link_id FROM instagram_links WHERE shortcode = ?', (shortcode,))
+        row = c.fetchone()
+    return row[0] if row else None
+
+def backfill_shortcodes(batch_size: int = 500, move_jobs=None):
+    """Fill in shortcodes of links saved before migration 3 and merge duplicates.
+
+    Works through the NULL rows in link_id order, one short write transaction
+    per batch. A row whose post already has a link is merged into that link:
+    its likes and verification jobs move over, the poster gets the spent
+    point back, and the row is deleted. Links that aren't Instagram posts
+    keep a NULL shortcode. Returns (filled, merged).
+
+    `move_jobs(old_link_id, new_link_id)` is the job store's relink_jobs
+    (storage.jobs). Jobs kept in this file move inside the merge's
+    transaction; a store elsewhere is updated after each batch commits.
+    """
+    external = move_jobs is not None and move_jobs is not relink_jobs
+    filled = merged = 0
+    last_id = 0
+    while True:
+        moved = []
+        with _write() as c:
+            c.execute('''
+                SELECT link_id, user_id, link FROM instagram_links
+                WHERE shortcode IS NULL AND link_id > ?
+                ORDER BY link_id LIMIT ?
+            ''', (last_id, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                break
+            for link_id, user_id, link in rows:
+                shortcode = links.shortcode_of(link)
+                if shortcode is None:
+                    continue
+                c.execute('SELECT link_id FROM instagram_links WHERE shortcode = ?', (shortcode,))
+                keeper = c.fetchone()
+                if keeper:
+                    _merge_link(c, link_id, user_id, keeper[0], move_jobs=not external)
+                    moved.append((link_id, keeper[0]))
+                    merged += 1
+                else:
+                    c.execute('UPDATE instagram_links SET shortcode = ?, link = ? WHERE link_id = ?',
+                              (shortcode, links.normalize_link(link), link_id))
+                    filled += 1
+            last_id = rows[-1][0]
+        if external:
+            for link_id, keeper_id in moved:
+                move_jobs(link_id, keeper_id)
+    if filled or merged:
+        # Cached links, /queue pages and the filter may all mention removed rows
+        _forget_memory()
+    return filled, merged
+
+def _merge_link(c, link_id: int, user_id: int, keeper_id: int, move_jobs: bool = True):
+    c.execute('''
+        INSERT OR IGNORE INTO user_likes (user_id, link_id)
+        SELECT user_id, ? FROM user_likes WHERE link_id = ?
+    ''', (keeper_id, link_id))
+    c.execute('DELETE FROM user_likes WHERE link_id = ?', (link_id,))
+    if move_jobs:
+        _relink_jobs(c, link_id, keeper_id)
+    c.execute('UPDATE verification_results SET link_id = ? WHERE link_id = ?', (keeper_id, link_id))
+    c.execute('UPDATE users SET score = score + 1 WHERE user_id = ?', (user_id,))
+    if c.rowcount:
+        _log_score(c, user_id, 'refund', 1, 0)
+    c.execute('DELETE FROM instagram_links WHERE link_id = ?', (link_id,))
+
+
+# === Cached Lookups ===
+
+def _load_profile(user_id: int):
+    """Return (score, total_score, username) of a user, or None, through the profile cache."""
+    if not cache.enabled():
+        with _read() as c:
+            c.execute('SELECT score, total_score, username FROM users WHERE user_id = ?', (user_id,))
+            return c.fetchone()
+
+    profile = cache.user_profiles.get(user_id)
+    if profile is not cache.MISSING:
+        return profile
+    generation = cache.user_profiles.generation
+    with _read() as c:
+        c.execute('SELECT score, total_score, username FROM users WHERE user_id = ?', (user_id,))
+        profile = c.fetchone()
+    cache.user_profiles.set(user_id, profile, generation)
+    return profile
+
+def _remember_link(link_id: int, user_id: int, link: str):
+    if cache.enabled():
+        cache.links.set(link_id, link)
+        cache.recent_links.add(link_id, user_id, link)
+        render.remember_link(link_id, link)
+
+def _load_recent_links(user_id: int, limit: int):
+    """Answer the first /queue page from the recent-links ring buffer.
+
+    Returns None when the buffer can't fill the page and older links may qualify.
+    """
+    if not cache.recent_links.loaded:
+        generation = cache.recent_links.generation
+        with _read() as c:
+            c.execute(
+                'SELECT link_id, user_id, link FROM instagram_links WHERE active = 1 ORDER BY link_id DESC LIMIT ?',
+                (cache.recent_links.size,),
+            )
+            cache.recent_links.load(c.fetchall(), generation)
+
+    rows, full = cache.recent_links.snapshot()
+    candidates = [row for row in rows if row[1] != user_id]
+    if not candidates:
+        return None if full else []
+
+    # Only the user's likes within the buffered id range matter
+    with _read() as c:
+        c.execute(
+            'SELECT link_id FROM user_likes WHERE user_id = ? AND link_id >= ?',
+            (user_id, candidates[-1][0]),
+        )
+        liked = {row[0] for row in c.fetchall()}
+
+    links = [{"id": row[0], "link": row[2]} for row in candidates if row[0] not in liked][:limit]
+    if len(links) < limit and full:
+        return None
+    return links
+
+
+# === Retention ===
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+def deactivate_links(cutoff: str, max_likes: int, after_id: int = 0, limit: int = 500):
+    """Mark active links older than `cutoff` or with `max_likes` likes inactive.
+
+    Looks at `limit` active links after `after_id` per call, so each call is a
+    short write. Returns (deactivated, next_after_id), the latter None at the end.
+    """
+    with _write() as c:
+        c.execute('SELECT link_id FROM instagram_links WHERE active = 1 AND link_id > ? ORDER BY link_id LIMIT ?',
+                  (after_id, limit))
+        ids = [row[0] for row in c.fetchall()]
+        if not ids:
+            return 0, None
+        c.execute(f'''
+            UPDATE instagram_links SET active = 0
+            WHERE link_id IN ({_placeholders(ids)})
+              AND (timestamp < ? OR (SELECT COUNT(*) FROM user_likes AS ul WHERE ul.link_id = instagram_links.link_id) >= ?)
+        ''', (*ids, cutoff, max_likes))
+        deactivated = c.rowcount
+    if deactivated:
+        # The first /queue page may be served from links that just left the working set
+        cache.recent_links.clear()
+    return deactivated, ids[-1] if len(ids) == limit else None
+
+def archivable_links(cutoff: str, limit: int = 500):
+    """Return up to `limit` inactive links older than `cutoff`, each with the user_ids that liked it."""
+    with _read() as c:
+        c.execute('''
+            SELECT link_id, user_id, link, timestamp, shortcode FROM instagram_links
+            WHERE active = 0 AND timestamp < ? ORDER BY link_id LIMIT ?
+        ''', (cutoff, limit))
+        rows = c.fetchall()
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        c.execute(f'SELECT link_id, user_id FROM user_likes WHERE link_id IN ({_placeholders(ids)})', ids)
+        likes = {}
+        for link_id, user_id in c.fetchall():
+            likes.setdefault(link_id, []).append(user_id)
+    return [
+        {"link_id": link_id, "user_id": user_id, "link": link, "timestamp": timestamp,
+         "shortcode": shortcode, "likes": likes.get(link_id, [])}
+        for link_id, user_id, link, timestamp, shortcode in rows
+    ]
+
+def archive_links(link_ids, copy: bool = True):
+    """Move inactive links, their likes and their verification history out of the live tables.
+
+    With `copy` links and likes go to the *_archive tables; without, they are
+    only deleted (the caller exported them). Links among `link_ids` that are
+    active again are left alone. Returns (link ids removed, likes removed).
+    """
+    if not link_ids:
+        return [], 0
+    now = time.time()
+    with _write() as c:
+        # Decided once, so the links, their likes and their jobs go together
+        c.execute(f'SELECT link_id FROM instagram_links WHERE link_id IN ({_placeholders(link_ids)}) AND active = 0',
+                  list(link_ids))
+        ids = [row[0] for row in c.fetchall()]
+        if not ids:
+            return [], 0
+        marks = _placeholders(ids)
+        if copy:
+            c.execute(f'''
+                INSERT OR IGNORE INTO instagram_links_archive (link_id, user_id, link, timestamp, shortcode, archived_at)
+                SELECT link_id, user_id, link, timestamp, shortcode, ? FROM instagram_links WHERE link_id IN ({marks})
+            ''', (now, *ids))
+            c.execute(f'''
+                INSERT OR IGNORE INTO user_likes_archive (user_id, link_id, archived_at)
+                SELECT user_id, link_id, ? FROM user_likes WHERE link_id IN ({marks})
+            ''', (now, *ids))
+        c.execute(f'DELETE FROM user_likes WHERE link_id IN ({marks})', ids)
+        likes = c.rowcount
+        c.execute(f'DELETE FROM verification_results WHERE link_id IN ({marks})', ids)
+        _delete_link_jobs(c, ids)
+        c.execute(f'DELETE FROM instagram_links WHERE link_id IN ({marks})', ids)
+    for link_id in ids:
+        cache.links.invalidate(link_id)
+        render.link_fragments.invalidate(link_id)
+    return ids, likes
+
+def prune_score_events(before: float, limit: int = 5000):
+    """Delete up to `limit` score events older than `before`; returns how many.
+
+    Their deltas are added to score_checkpoints in the same transaction, so
+    checkpoint + remaining events still add up to the live scores.
+    """
+    with _write() as c:
+        c.execute('''
+            SELECT MAX(event_id) FROM (
+                SELECT event_id FROM score_events WHERE created_at < ? ORDER BY event_id LIMIT ?
+            )
+        ''', (before, limit))
+        last_id = c.fetchone()[0]
+        if last_id is None:
+            return 0
+        c.execute('''
+            INSERT INTO score_checkpoints (user_id, score, total_score)
+            SELECT user_id, SUM(score_delta), SUM(delta) FROM score_events
+            WHERE event_id <= ? AND created_at < ? GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                score = score + excluded.score, total_score = total_score + excluded.total_score
+        ''', (last_id, before))
+        c.execute('DELETE FROM score_events WHERE event_id <= ? AND created_at < ?', (last_id, before))
+        return c.rowcount
+
+def prune_verification_results(before: float, limit: int = 5000):
+    """Delete up to `limit` verification results older than `before`; returns how many."""
+    with _write() as c:
+        c.execute('''
+            DELETE FROM verification_results WHERE result_id IN (
+                SELECT result_id FROM verification_results WHERE checked_at < ? ORDER BY result_id LIMIT ?
+            )
+        ''', (before, limit))
+        return c.rowcount
+
+def storage_stats():
+    """Return page counts, free pages and the size in bytes of the database file."""
+    with _read() as c:
+        stats = {}
+        for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum"):
+            c.execute(f'PRAGMA {pragma}')
+            stats[pragma] = c.fetchone()[0]
+    stats["bytes"] = stats["page_size"] * stats["page_count"]
+    stats["free_bytes"] = stats["page_size"] * stats["freelist_count"]
+    return stats
+
+def incremental_vacuum(pages: int = 1000):
+    """Return up to `pages` free pages to the filesystem; returns how many were freed.
+
+    Needs auto_vacuum = INCREMENTAL, otherwise it does nothing.
+    """
+    with _write() as c:
+        c.execute('PRAGMA freelist_count')
+        before = c.fetchone()[0]
+        # execute() steps this pragma only once, freeing one page per call.
+        # executescript would run it to completion, but commits first and so
+        # would drop the write lock.
+        for _ in range(min(int(pages), before)):
+            c.execute('PRAGMA incremental_vacuum(1)')
+        c.execute('PRAGMA freelist_count')
+        return before - c.fetchone()[0]
+
+def enable_incremental_vacuum():
+    """Switch an existing database to auto_vacuum = INCREMENTAL.
+
+    Rewrites the whole file with VACUUM and holds the write lock meanwhile,
+    so run it in a maintenance window. Returns False if it already was.
+    """
+    # VACUUM can't run inside a transaction
+    with _write(immediate=False) as c:
+        c.execute('PRAGMA auto_vacuum')
+        if c.fetchone()[0] == 2:
+            return False
+        c.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        c.execute('VACUUM')
+    return True
+
+def sample_user_ids(count: int):
+    """Return up to `count` random user ids, e.g. for timing /queue."""
+    with _read() as c:
+        c.execute('SELECT user_id FROM users ORDER BY RANDOM() LIMIT ?', (count,))
+        return [row[0] for row in c.fetchall()]
+
+
+# === Verification Jobs ===
+# The job queue verification workers share; storage.py can move it to a server database.
+
+# Columns of a claimed or checked job, in the order claim/take return them
+JOB_COLUMNS = ("job_id", "user_id", "link_id", "chat_id", "message_id", "username", "link",
+                "attempts", "created_at", "result", "latency", "engine", "error")
+
+def enqueue_verification(user_id: int, link_id: int, chat_id: int, message_id: int = None,
+                         username: str = None, link: str = None):
+    """Queue a /done verification of `username` liking `link` and return its job id."""
+    now = time.time()
+    with _write() as c:
+        c.execute('''
+            INSERT INTO verification_jobs (user_id, link_id, chat_id, message_id, username, link, created_at, next_run_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, link_id, chat_id, message_id, username, link, now, now))
+        return c.lastrowid
+
+def claim_verification_job(lease: float = None):
+    """Atomically mark the oldest due job as running and return it, or None.
+
+    With a `lease` (seconds) the job returns to the queue if it isn't
+    finished by then; see requeue_expired_jobs().
+    """
+    now = time.time()
+    with _write() as c:
+        c.execute(f'''
+            UPDATE verification_jobs SET status = 'running', attempts = attempts + 1, lease_until = ?
+            WHERE job_id = (
+                SELECT job_id FROM verification_jobs
+                WHERE status = 'pending' AND next_run_at <= ?
+                ORDER BY next_run_at, job_id LIMIT 1
+            )
+            RETURNING {", ".join(JOB_COLUMNS)}
+        ''', (now + lease if lease else None, now))
+        row = c.fetchone()
+    if not row:
+        return None
+    return dict(zip(JOB_COLUMNS, row))
+
+def complete_verification_job(job_id: int, result: str, latency: float = None, engine: str = None,
+                              error: str = None):
+    """Store a worker's result ('liked', 'not_liked' or 'error') for the bot to apply."""
+    with _write() as c:
+        c.execute('''
+            UPDATE verification_jobs SET status = 'checked', result = ?, latency = ?, engine = ?, error = ?
+            WHERE job_id = ? AND status = 'running'
+        ''', (result, latency, engine, error, job_id))
+
+def take_checked_jobs(limit: int = 100):
+    """Return up to `limit` checked jobs, oldest first, whose results haven't been applied."""
+    with _read() as c:
+        c.execute(f'''
+            SELECT {", ".join(JOB_COLUMNS)} FROM verification_jobs
+            WHERE status = 'checked' ORDER BY job_id LIMIT ?
+        ''', (limit,))
+        rows = c.fetchall()
+    return [dict(zip(JOB_COLUMNS, row)) for row in rows]
+
+def finish_verification_job(job_id: int, status: str = 'done', error: str = None):
+    """Mark a job as finished ('done' or 'failed')."""
+    with _write() as c:
+        c.execute('''
+            UPDATE verification_jobs SET status = ?, error = COALESCE(?, error), finished_at = ? WHERE job_id = ?
+        ''', (status, error, time.time(), job_id))
+
+def retry_verification_job(job_id: int, delay: float, error: str = None):
+    """Put a running job back in the queue after `delay` seconds."""
+    with _write() as c:
+        c.execute('''
+            UPDATE verification_jobs SET status = 'pending', error = ?, next_run_at = ? WHERE job_id = ?
+        ''', (error, time.time() + delay, job_id))
+
+def requeue_running_jobs():
+    """Return jobs left running by a previous process to the queue. Returns how many."""
+    with _write() as c:
+        c.execute("UPDATE verification_jobs SET status = 'pending' WHERE status = 'running'")
+        return c.rowcount
+
+def requeue_expired_jobs():
+    """Return running jobs whose lease ran out, e.g. of a crashed worker, to the queue. Returns how many."""
+    with _write() as c:
+        c.execute('''
+            UPDATE verification_jobs SET status = 'pending'
+            WHERE status = 'running' AND lease_until < ?
+        ''', (time.time(),))
+        return c.rowcount
+
+def relink_jobs(old_link_id: int, new_link_id: int):
+    """Point the jobs of a merged link at the link it was merged into. Returns how many."""
+    with _write() as c:
+        return _relink_jobs(c, old_link_id, new_link_id)
+
+def _relink_jobs(c, old_link_id: int, new_link_id: int):
+    c.execute('UPDATE verification_jobs SET link_id = ? WHERE link_id = ?', (new_link_id, old_link_id))
+    return c.rowcount
+
+def delete_link_jobs(link_ids):
+    """Drop every job of the given links, e.g. archived ones. Returns how many."""
+    if not link_ids:
+        return 0
+    with _write() as c:
+        return _delete_link_jobs(c, list(link_ids))
+
+def _delete_link_jobs(c, ids):
+    c.execute(f'DELETE FROM verification_jobs WHERE link_id IN ({_placeholders(ids)})', ids)
+    return c.rowcount
+
+def has_open_verification(user_id: int, link_id: int):
+    """Check whether a verification for this user and link is still queued, running or unanswered."""
+    with _read() as c:
+        c.execute('''
+            SELECT 1 FROM verification_jobs
+            WHERE user_id = ? AND link_id = ? AND status IN ('pending', 'running', 'checked')
+        ''', (user_id, link_id))
+        result = c.fetchone()
+    return bool(result)
+
+def count_recent_verifications(user_id: int, since: float):
+    """Count the jobs a user queued since the given epoch time."""
+    with _read() as c:
+        c.execute('''
+            SELECT COUNT(*) FROM verification_jobs WHERE user_id = ? AND created_at >= ?
+        ''', (user_id, since))
+        result = c.fetchone()
+    return result[0]
+
+def count_pending_verifications():
+    """Count the jobs waiting to be processed or applied."""
+    with _read() as c:
+        c.execute("SELECT COUNT(*) FROM verification_jobs WHERE status IN ('pending', 'running', 'checked')")
+        result = c.fetchone()
+    return result[0]
+
+
+# === Verification Results ===
+
+# Histogram bucket upper bounds for verification latency, in seconds
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30)
+# Recent negative results kept per (user, link); enough for any backoff step
+_NEGATIVES_KEPT = 16
+
+def record_verification(user_id: int, link_id: int, result: str, latency: float = None,
+                        engine: str = None, error: str = None):
+    """Log a /done outcome: 'liked', 'not_liked' or 'error'."""
+    now = time.time()
+    with _write() as c:
+        c.execute('''
+            INSERT INTO verification_results (user_id, link_id, result, latency, engine, error, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, link_id, result, latency, engine, error, now))
+        if result == 'not_liked':
+            negatives = _select_negative_checks(c, user_id, link_id)
+    if result == 'error':
+        # Says nothing about the like; cached negatives stay valid
+        return
+    key = (user_id, link_id)
+    cache.negative_checks.invalidate(key)
+    if result == 'not_liked' and cache.enabled():
+        cache.negative_checks.set(key, negatives)
+
+def get_negative_checks(user_id: int, link_id: int, since: float = 0):
+    """Times of the latest 'not_liked' results for this user and link since `since`, newest first."""
+    key = (user_id, link_id)
+    if cache.enabled():
+        negatives = cache.negative_checks.get(key)
+        if negatives is not cache.MISSING:
+            return [t for t in negatives if t >= since]
+    generation = cache.negative_checks.generation
+    with _read() as c:
+        negatives = _select_negative_checks(c, user_id, link_id)
+    if cache.enabled():
+        cache.negative_checks.set(key, negatives, generation)
+    return [t for t in negatives if t >= since]
+
+def _select_negative_checks(c, user_id: int, link_id: int):
+    c.execute('''
+        SELECT checked_at FROM verification_results
+        WHERE user_id = ? AND link_id = ? AND result = 'not_liked'
+        ORDER BY checked_at DESC LIMIT ?
+    ''', (user_id, link_id, _NEGATIVES_KEPT))
+    return tuple(row[0] for row in c.fetchall())
+
+def verification_analytics(since: float = 0):
+    """Scraper success rate and latency distribution per engine since `since`.
+
+    A check succeeds when it gives an answer at all, liked or not.
+    """
+    with _read() as c:
+        c.execute('''
+            SELECT COALESCE(engine, '?'), result, latency FROM verification_results
+            WHERE checked_at >= ? ORDER BY latency
+        ''', (since,))
+        rows = c.fetchall()
+
+    engines = {}
+    for engine, result, latency in rows:
+        stats = engines.setdefault(engine, {"checks": 0, "liked": 0, "not_liked": 0, "error": 0, "latencies": []})
+        stats["checks"] += 1
+        stats[result] = stats.get(result, 0) + 1
+        if latency is not None and result != 'error':
+            stats["latencies"].append(latency)
+
+    for stats in engines.values():
+        latencies = stats.pop("latencies")
+        stats["success_rate"] = 1 - stats["error"] / stats["checks"]
+        stats["latency"] = _distribution(latencies)
+    return engines
+
+def _distribution(latencies):
+    """Percentiles and a bucketed histogram of sorted latencies."""
+    if not latencies:
+        return {"count": 0}
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+    labels = [f"<={bound:g}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]:g}s"]
+    last = len(latencies) - 1
+    return {
+        "count": len(latencies),
+        "avg": sum(latencies) / len(latencies),
+        "p50": latencies[int(0.5 * last)],
+        "p90": latencies[int(0.9 * last)],
+        "p99": latencies[int(0.99 * last)],
+        "max": latencies[last],
+        "histogram": dict(zip(labels, counts)),
+    }
+
+
+# === Liker Sweeps ===
+
+# Usernames per IN (...) lookup, well under SQLite's variable limit
+_SWEEP_MATCH_CHUNK = 500
+
+def sweep_candidates(since: str, limit: int):
+    """Newest active links posted at or after `since`: [(link_id, link, timestamp)], newest first."""
+    with _read() as c:
+        c.execute('''
+            SELECT link_id, link, timestamp FROM instagram_links
+            WHERE active = 1 AND timestamp >= ? ORDER BY link_id DESC LIMIT ?
+        ''', (since, limit))
+        return c.fetchall()
+
+def credit_likers(link_id: int, likers):
+    """Credit a like on `link_id` to every user whose username is in `likers`.
+
+    `likers` holds lowercase usernames, as the scraper returns them. The
+    link's owner and users already credited are skipped. One transaction for
+    the whole list; returns the user_ids credited.
+    """
+    likers = list(likers)
+    credited = []
+    with _write() as c:
+        c.execute('SELECT user_id FROM instagram_links WHERE link_id = ?', (link_id,))
+        owner = c.fetchone()
+        if owner is None:
+            # Merged or archived since the scrape
+            return credited
+        for start in range(0, len(likers), _SWEEP_MATCH_CHUNK):
+            chunk = likers[start:start + _SWEEP_MATCH_CHUNK]
+            c.execute(f'''
+                SELECT u.user_id FROM users AS u
+                WHERE lower(u.username) IN ({_placeholders(chunk)}) AND u.user_id != ?
+                  AND NOT EXISTS (SELECT 1 FROM user_likes AS ul WHERE ul.user_id = u.user_id AND ul.link_id = ?)
+            ''', (*chunk, owner[0], link_id))
+            for (user_id,) in c.fetchall():
+                c.execute('INSERT OR IGNORE INTO user_likes (user_id, link_id) VALUES (?, ?)', (user_id, link_id))
+                if not c.rowcount:
+                    continue
+                c.execute('''
+                    UPDATE users SET score = score + 1, total_score = total_score + 1 WHERE user_id = ?
+                    RETURNING username, total_score
+                ''', (user_id,))
+                _credit_score(c, user_id, *c.fetchone())
+                credited.append(user_id)
+    for user_id in credited:
+        cache.user_profiles.invalidate(user_id)
+    return credited
+
+
+# === Bulk Export / Import ===
+
+# Tables dbtool moves in and out: name -> (table, key column, columns).
+# Rows stream in key order; user_likes has no single-column key, so its rowid is used.
+BULK_TABLES = {
+    "users": ("users", "user_id", ("user_id", "username", "score", "total_score")),
+    "links": ("instagram_links", "link_id", ("link_id", "user_id", "link", "timestamp", "shortcode", "active")),
+    "likes": ("user_likes", "rowid", ("user_id", "link_id")),
+    "checkpoints": ("score_checkpoints", "user_id", ("user_id", "score", "total_score")),
+    "events": ("score_events", "event_id", ("event_id", "user_id", "kind", "delta", "score_delta", "created_at")),
+}
+
+@contextmanager
+def snapshot():
+    """Yield a reader cursor inside one read transaction.
+
+    Every query on it sees the same database state, however long the caller
+    takes, while the bot keeps writing.
+    """
+    with _read() as c:
+        c.execute('BEGIN')
+        yield c
+
+def iter_rows(c, name: str, batch_size: int = 10000):
+    """Yield every row of a BULK_TABLES table in key order, fetching `batch_size` at a time."""
+    table, key, columns = BULK_TABLES[name]
+    c.execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY {key}')
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def count_rows(name: str):
+    table = BULK_TABLES[name][0]
+    with _read() as c:
+        c.execute(f'SELECT COUNT(*) FROM {table}')
+        return c.fetchone()[0]
+
+def bulk_insert(source: str, name: str, rows, imported: int):
+    """Insert a chunk of exported rows and record `imported` rows of `name` done, in one transaction.
+
+    A crash either keeps the whole chunk and its progress mark or neither,
+    so an import resumes exactly after the last committed chunk.
+    """
+    table, _, columns = BULK_TABLES[name]
+    with _write() as c:
+        c.executemany(
+            f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) VALUES ({_placeholders(columns)})', rows
+        )
+        c.execute('''
+            INSERT INTO bulk_import_progress (source, table_name, rows) VALUES (?, ?, ?)
+            ON CONFLICT (source, table_name) DO UPDATE SET rows = excluded.rows
+        ''', (source, name, imported))
 
+def import_progress(source: str):
+    """Return {table name: rows imported} of an import from `source`."""
+    with _read() as c:
+        c.execute('SELECT table_name, rows FROM bulk_import_progress WHERE source = ?', (source,))
+        return dict(c.fetchall())
 
+def reset_import_progress(source: str):
+    with _write() as c:
+        c.execute('DELETE FROM bulk_import_progress WHERE source = ?', (source,))
 
+def rebuild_scores(scores, batch_size: int = 10000):
+    """Overwrite users' score and total_score from (user_id, score, total_score) rows.
 
+    Returns how many users were updated; users missing from the table are skipped.
+    """
+    updated = 0
+    batch = []
+    for user_id, score, total_score in scores:
+        batch.append((score, total_score, user_id))
+        if len(batch) == batch_size:
+            updated += _update_scores(batch)
+            batch = []
+    if batch:
+        updated += _update_scores(batch)
+    _forget_memory()
+    return updated
 
+def _update_scores(batch):
+    with _write() as c:
+        c.executemany('UPDATE users SET score = ?, total_score = ? WHERE user_id = ?', batch)
+        return c.rowcount
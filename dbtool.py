@@ -0,0 +1,264 @@
+"""Bulk export, import and score replay for the bot's database.
+
+    python dbtool.py export --out backup/ [--format jsonl|csv]
+    python dbtool.py import --in backup/ [--restart]
+    python dbtool.py replay [--from backup/] [--apply]
+
+export streams users, links, likes, score checkpoints and score events out of
+one read snapshot into a gzipped file per table, and writes manifest.json
+last, so a directory without one is an unfinished export. It can run next to
+the bot.
+
+import loads an export with executemany, one transaction per --batch rows,
+and records its progress in the same transaction. After a crash, run the same
+command again and it carries on after the last committed chunk.
+
+replay adds each user's score events to their checkpoint and compares the
+result with users.score and users.total_score, from the live database or
+from an export. It exits with status 1 on any mismatch; --apply writes the
+rebuilt values instead.
+
+Export and import hold one chunk in memory whatever the database size;
+replay keeps two integers per user. Stop the bot before import or --apply.
+"""
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import database
+
+FORMATS = ("jsonl", "csv")
+MANIFEST = "manifest.json"
+# CSV has no types; everything not listed here is TEXT
+INTEGER_COLUMNS = {"user_id", "score", "total_score", "link_id", "active", "event_id", "delta", "score_delta"}
+REAL_COLUMNS = {"created_at"}
+FETCH_SIZE = 10000
+# Mismatches printed by replay
+SHOWN_MISMATCHES = 20
+
+
+# === Files ===
+
+def _file_name(name: str, fmt: str):
+    return f"{name}.{fmt}.gz"
+
+
+def _write_rows(path: Path, fmt: str, columns, rows):
+    """Write rows to a gzipped JSONL or CSV file; returns how many."""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            encode = json.JSONEncoder(ensure_ascii=False).encode
+            for row in rows:
+                f.write(encode(dict(zip(columns, row))) + "\n")
+                count += 1
+    return count
+
+
+def _read_rows(path: Path, fmt: str, columns):
+    """Yield the rows of an exported file as tuples in `columns` order."""
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            header = next(reader)
+            if tuple(header) != tuple(columns):
+                raise SystemExit(f"{path}: expected columns {columns}, found {header}")
+            converters = [_converter(column) for column in columns]
+            for row in reader:
+                yield tuple(convert(value) for convert, value in zip(converters, row))
+        else:
+            for line in f:
+                record = json.loads(line)
+                yield tuple(record.get(column) for column in columns)
+
+
+def _converter(column: str):
+    kind = int if column in INTEGER_COLUMNS else float if column in REAL_COLUMNS else str
+    # An empty cell is NULL, for TEXT columns too
+    return lambda value: kind(value) if value != "" else None
+
+
+def _chunks(rows, size: int):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def _load_manifest(directory: Path):
+    path = directory / MANIFEST
+    if not path.exists():
+        raise SystemExit(f"{directory} has no {MANIFEST}; the export is missing or didn't finish")
+    manifest = json.loads(path.read_text())
+    for name, entry in manifest["tables"].items():
+        expected = database.BULK_TABLES[name][2]
+        if tuple(entry["columns"]) != expected:
+            raise SystemExit(f"{name}: export has columns {entry['columns']}, this version expects {list(expected)}")
+    return manifest
+
+
+# === Commands ===
+
+def export(out: Path, fmt: str):
+    out.mkdir(parents=True, exist_ok=True)
+    (out / MANIFEST).unlink(missing_ok=True)
+    tables = {}
+    with database.snapshot() as c:
+        c.execute('PRAGMA user_version')
+        schema_version = c.fetchone()[0]
+        for name, (_, _, columns) in database.BULK_TABLES.items():
+            file_name = _file_name(name, fmt)
+            rows = _write_rows(out / file_name, fmt, columns, database.iter_rows(c, name, FETCH_SIZE))
+            tables[name] = {"file": file_name, "columns": list(columns), "rows": rows}
+            print(f"{name}: {rows:,} rows", file=sys.stderr)
+    manifest = {
+        "export_id": uuid.uuid4().hex,
+        "format": fmt,
+        "schema_version": schema_version,
+        "exported_at": datetime.now().isoformat(),
+        "tables": tables,
+    }
+    tmp = out / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, out / MANIFEST)
+    return manifest
+
+
+def import_(source_dir: Path, batch: int, restart: bool = False, force: bool = False):
+    manifest = _load_manifest(source_dir)
+    source = manifest["export_id"]
+    if restart:
+        database.reset_import_progress(source)
+    progress = database.import_progress(source)
+    if not progress and not force and any(database.count_rows(name) for name in manifest["tables"]):
+        raise SystemExit("The target database already has rows; import into a new file or pass --force")
+
+    report = {}
+    for name, entry in manifest["tables"].items():
+        done = progress.get(name, 0)
+        if done >= entry["rows"]:
+            report[name] = {"rows": entry["rows"], "imported": 0}
+            continue
+        if done:
+            print(f"{name}: resuming after {done:,} rows", file=sys.stderr)
+        rows = _read_rows(source_dir / entry["file"], manifest["format"], entry["columns"])
+        imported = done
+        for chunk in _chunks(itertools.islice(rows, done, None), batch):
+            imported += len(chunk)
+            database.bulk_insert(source, name, chunk, imported)
+        print(f"{name}: {imported:,} rows", file=sys.stderr)
+        report[name] = {"rows": imported, "imported": imported - done}
+    return report
+
+
+def replay(source_dir: Path = None, apply: bool = False):
+    """Rebuild every user's score and total_score from checkpoints plus events."""
+    if source_dir is None:
+        with database.snapshot() as c:
+            rebuilt, events = _replay(database.iter_rows(c, "checkpoints", FETCH_SIZE),
+                                      database.iter_rows(c, "events", FETCH_SIZE))
+            checked, mismatches = _compare(rebuilt, database.iter_rows(c, "users", FETCH_SIZE))
+    else:
+        manifest = _load_manifest(source_dir)
+
+        def rows(name):
+            entry = manifest["tables"][name]
+            return _read_rows(source_dir / entry["file"], manifest["format"], entry["columns"])
+
+        rebuilt, events = _replay(rows("checkpoints"), rows("events"))
+        checked, mismatches = _compare(rebuilt, rows("users"))
+
+    report = {
+        "users": checked,
+        "events": events,
+        "mismatches": len(mismatches),
+        "examples": mismatches[:SHOWN_MISMATCHES],
+    }
+    if apply and mismatches:
+        report["applied"] = database.rebuild_scores(
+            (m["user_id"], m["replayed_score"], m["replayed_total_score"]) for m in mismatches
+        )
+    return report
+
+
+def _replay(checkpoints, events):
+    rebuilt = {}
+    for user_id, score, total_score in checkpoints:
+        rebuilt[user_id] = [score, total_score]
+    count = 0
+    for _, user_id, _, delta, score_delta, _ in events:
+        totals = rebuilt.setdefault(user_id, [0, 0])
+        totals[0] += score_delta
+        totals[1] += delta
+        count += 1
+    return rebuilt, count
+
+
+def _compare(rebuilt, users):
+    """Return (users checked, users whose counters differ from the replay). Consumes `rebuilt`."""
+    checked = 0
+    mismatches = []
+    for user_id, _, score, total_score in users:
+        checked += 1
+        live = (score or 0, total_score or 0)
+        replayed = tuple(rebuilt.pop(user_id, (0, 0)))
+        if live != replayed:
+            mismatches.append({
+                "user_id": user_id, "score": live[0], "total_score": live[1],
+                "replayed_score": replayed[0], "replayed_total_score": replayed[1],
+            })
+    # Events of users that have no row at all
+    for user_id, (score, total_score) in rebuilt.items():
+        if score or total_score:
+            mismatches.append({
+                "user_id": user_id, "score": None, "total_score": None,
+                "replayed_score": score, "replayed_total_score": total_score,
+            })
+    return checked, mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", type=Path, default=database.DB_PATH, help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write every table to gzipped files")
+    export_parser.add_argument("--out", type=Path, required=True, help="directory for the files and manifest")
+    export_parser.add_argument("--format", choices=FORMATS, default="jsonl")
+
+    import_parser = commands.add_parser("import", help="load an export, resuming an interrupted run")
+    import_parser.add_argument("--in", dest="source", type=Path, required=True, help="export directory")
+    import_parser.add_argument("--batch", type=int, default=50000, help="rows per transaction")
+    import_parser.add_argument("--restart", action="store_true", help="ignore the progress of earlier runs")
+    import_parser.add_argument("--force", action="store_true", help="import into a database that has rows")
+
+    replay_parser = commands.add_parser("replay", help="rebuild scores from the event log and compare")
+    replay_parser.add_argument("--from", dest="source", type=Path, help="replay an export instead of the live tables")
+    replay_parser.add_argument("--apply", action="store_true", help="write the replayed scores to --db")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    database.init_db()
+    status = 0
+    if args.command == "export":
+        result = export(args.out, args.format)
+    elif args.command == "import":
+        result = import_(args.source, args.batch, args.restart, args.force)
+    else:
+        result = replay(args.source, args.apply)
+        status = 1 if result["mismatches"] and not args.apply else 0
+    print(json.dumps(result, indent=2))
+    database.close_connections()
+    sys.exit(status)
@@ -0,0 +1,160 @@
+"""Concurrent update processing that keeps each user's updates in order.
+
+Updates run concurrently across users, but two updates from the same user in
+the same lane never overlap and finish in arrival order. Group chats get their
+own lane with reserved capacity, so deleting spam stays fast while private
+chats are busy with /done and /queue.
+"""
+import asyncio
+import os
+import time
+
+from telegram import Chat
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import registry
+
+# === Dispatcher Configuration ===
+# Private-chat updates handled at the same time
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+# Group updates (moderation) handled at the same time, on top of the above
+GROUP_LANE_CONCURRENCY = int(os.getenv("GROUP_LANE_CONCURRENCY", "8"))
+# Updates allowed to wait for a lane before python-telegram-bot holds them back
+DISPATCH_MAX_IN_FLIGHT = int(os.getenv("DISPATCH_MAX_IN_FLIGHT", "4096"))
+
+GROUP_LANE = "group"
+DEFAULT_LANE = "default"
+_GROUP_TYPES = (Chat.GROUP, Chat.SUPERGROUP)
+
+
+class _Lane:
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.slots = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, wait: float, latency: float):
+        self.processed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def snapshot(self):
+        return {
+            "concurrency": self.concurrency,
+            "depth": self.waiting,
+            "active": self.active,
+            "processed": self.processed,
+            "wait_avg": self.wait_total / self.processed if self.processed else 0.0,
+            "wait_max": self.wait_max,
+            "latency_avg": self.latency_total / self.processed if self.processed else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """Per-user ordered, per-lane bounded update processing.
+
+    The base class semaphore only caps how many updates may be waiting at
+    once; the real concurrency limits are the lanes'. Each (lane, user) pair
+    has a FIFO lock, taken before a lane slot so a user's queued updates
+    don't hold slots other users could run in.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = UPDATE_CONCURRENCY,
+        group_concurrency: int = GROUP_LANE_CONCURRENCY,
+        max_in_flight: int = DISPATCH_MAX_IN_FLIGHT,
+    ):
+        super().__init__(max_in_flight)
+        self._concurrency = {DEFAULT_LANE: concurrency, GROUP_LANE: group_concurrency}
+        self._lanes = {}
+        # (lane, user_id) -> [lock, updates holding or waiting for it]
+        self._chains = {}
+        # Updates taken off the update_queue and not finished yet, including
+        # those held back by the base class semaphore
+        self.pending = 0
+
+    async def initialize(self):
+        # Semaphores bind to the running loop, so lanes are built here
+        self._lanes = {name: _Lane(limit) for name, limit in self._concurrency.items()}
+        self._chains = {}
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update, coroutine):
+        self.pending += 1
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.pending -= 1
+
+    async def do_process_update(self, update, coroutine):
+        lane_name = lane_of(update)
+        lane = self._lanes[lane_name]
+        key = (lane_name, _sender_of(update))
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = self._chains[key] = [asyncio.Lock(), 0]
+        chain[1] += 1
+
+        queued = time.perf_counter()
+        lane.waiting += 1
+        waiting = True
+        try:
+            async with chain[0], lane.slots:
+                lane.waiting -= 1
+                waiting = False
+                lane.active += 1
+                started = time.perf_counter()
+                try:
+                    await coroutine
+                finally:
+                    lane.active -= 1
+                    lane.record(started - queued, time.perf_counter() - started)
+        finally:
+            if waiting:
+                # Cancelled before its turn came
+                lane.waiting -= 1
+            chain[1] -= 1
+            if not chain[1]:
+                del self._chains[key]
+
+    def stats(self):
+        """Return queue depth, concurrency and latency of every lane."""
+        return {name: lane.snapshot() for name, lane in self._lanes.items()}
+
+
+def lane_of(update) -> str:
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None and chat.type in _GROUP_TYPES:
+        return GROUP_LANE
+    return DEFAULT_LANE
+
+
+def _sender_of(update):
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+
+
+update_processor = OrderedUpdateProcessor()
+registry.gauge("dispatch_lane_depth", "Updates waiting for a lane slot.",
+               lambda: {(name,): lane["depth"] for name, lane in update_processor.stats().items()}, ("lane",))
+registry.gauge("dispatch_lane_active", "Updates being handled.",
+               lambda: {(name,): lane["active"] for name, lane in update_processor.stats().items()}, ("lane",))
+registry.gauge("dispatch_pending", "Updates taken from the update queue and not finished yet.",
+               lambda: update_processor.pending)
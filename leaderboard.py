@@ -0,0 +1,120 @@
+import bisect
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+
+# === Leaderboard Configuration ===
+# Longest time window (in days) kept in memory for windowed boards
+LEADERBOARD_WINDOW_DAYS = int(os.getenv("LEADERBOARD_WINDOW_DAYS", "7"))
+
+DAY = 86400
+
+
+def day_of(timestamp: float) -> int:
+    """Day bucket (UTC) of an epoch timestamp."""
+    return int(timestamp // DAY)
+
+
+class Leaderboard:
+    """Ranking of users by total_score, kept current on every score change.
+
+    Users are held in a list sorted by (-total_score, user_id), so top-N is a
+    slice and a user's rank is a binary search. Score credits from the event
+    log are bucketed per day for the daily and weekly boards.
+    """
+
+    def __init__(self, window_days: int = LEADERBOARD_WINDOW_DAYS):
+        self.window_days = window_days
+        self._lock = threading.Lock()
+        self._ranking = []
+        # user_id -> (total_score, username)
+        self._users = {}
+        # day -> Counter(user_id -> points credited that day)
+        self._days = {}
+        self._window_cache = {}
+        self.loaded = False
+        # Bumped on every change so renderers know when to rebuild
+        self.version = 0
+
+    def load(self, users, events):
+        """Rebuild from (user_id, username, total_score) rows and (user_id, delta, created_at) events."""
+        with self._lock:
+            self._users = {user_id: (total or 0, username) for user_id, username, total in users}
+            self._ranking = sorted((-total, user_id) for user_id, (total, _) in self._users.items())
+            self._days = {}
+            for user_id, delta, created_at in events:
+                self._days.setdefault(day_of(created_at), Counter())[user_id] += delta
+            self._prune(day_of(time.time()))
+            self._window_cache = {}
+            self.loaded = True
+            self.version += 1
+
+    def reset(self):
+        """Forget everything; the next lookup reloads from the database."""
+        with self._lock:
+            self._ranking = []
+            self._users = {}
+            self._days = {}
+            self._window_cache = {}
+            self.loaded = False
+            self.version += 1
+
+    def update(self, user_id: int, username: str, total_score: int):
+        """Move a user to their new total_score."""
+        with self._lock:
+            old = self._users.get(user_id)
+            if old is not None:
+                index = bisect.bisect_left(self._ranking, (-old[0], user_id))
+                del self._ranking[index]
+            self._users[user_id] = (total_score, username)
+            bisect.insort(self._ranking, (-total_score, user_id))
+            self.version += 1
+
+    def record(self, user_id: int, delta: int, timestamp: float):
+        """Add a score credit to the windowed boards."""
+        with self._lock:
+            today = day_of(timestamp)
+            self._days.setdefault(today, Counter())[user_id] += delta
+            self._prune(today)
+            self._window_cache = {}
+            self.version += 1
+
+    def top(self, limit: int = 5):
+        """Return [(username, total_score)] of the best `limit` users."""
+        with self._lock:
+            return [(self._users[user_id][1], -neg_total) for neg_total, user_id in self._ranking[:limit]]
+
+    def rank(self, user_id: int):
+        """Return (rank, number_of_users) for a user, or None if unranked."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            # Users tied on score share the rank of the first of them
+            index = bisect.bisect_left(self._ranking, (-entry[0], -1))
+            return index + 1, len(self._ranking)
+
+    def top_window(self, days: int, limit: int = 5):
+        """Return [(username, points)] of the users who earned most in the last `days` days."""
+        days = min(days, self.window_days)
+        with self._lock:
+            today = day_of(time.time())
+            cached = self._window_cache.get((today, days, limit))
+            if cached is not None:
+                return cached
+            totals = Counter()
+            for day in range(today - days + 1, today + 1):
+                totals.update(self._days.get(day, {}))
+            best = heapq.nlargest(limit, totals.items(), key=lambda item: (item[1], -item[0]))
+            result = [(self._users.get(user_id, (0, None))[1], points) for user_id, points in best if points > 0]
+            self._window_cache[(today, days, limit)] = result
+            return result
+
+    def _prune(self, today: int):
+        for day in [d for d in self._days if d <= today - self.window_days]:
+            del self._days[day]
+
+
+board = Leaderboard()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+
+from scrapper import scrape_likers
+
+# === Cache Configuration ===
+# Seconds a scraped likers list keeps answering /done from memory
+LIKER_CACHE_TTL = float(os.getenv("LIKER_CACHE_TTL", "60"))
+
+
+class _Scrape:
+    """An in-flight scrape and the usernames waiting on it."""
+
+    def __init__(self, targets: set):
+        self.targets = targets
+        self.task = None
+
+
+class LikerCoalescer:
+    """Shares one likers scrape between every /done waiting on the same post.
+
+    Concurrent checks for a post join the in-flight scrape by adding their
+    username to its targets, and the resulting likers set is cached for a short
+    TTL so later checks are answered from memory. Liker sweeps hand their
+    lists in through remember().
+    """
+
+    def __init__(self, scrape=scrape_likers, ttl: float = LIKER_CACHE_TTL):
+        self.scrape = scrape
+        self.ttl = ttl
+        # post_url -> (expires_at, likers, complete)
+        self._cache = {}
+        self._inflight = {}
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def check_if_liked(self, username: str, post_url: str) -> bool:
+        target = username.lower()
+        entry = self._cache.get(post_url)
+        if entry and entry[0] > time.monotonic():
+            _, likers, complete = entry
+            # A partial list can only confirm a like; a complete one also rules it out
+            if target in likers or complete:
+                self.hits += 1
+                return target in likers
+
+        scrape = self._inflight.get(post_url)
+        if scrape is not None:
+            # Ride along with the running scrape; it looks for our username too
+            likers, complete = await self._join(scrape, target)
+            if target in likers or complete:
+                self.coalesced += 1
+                return target in likers
+            # It ran out of time before settling our username
+
+        self.misses += 1
+        scrape = self._inflight.get(post_url)
+        if scrape is not None:
+            likers, _ = await self._join(scrape, target)
+        else:
+            likers, _ = await self._start_scrape(post_url, target)
+        return target in likers
+
+    async def _join(self, scrape: _Scrape, target: str):
+        scrape.targets.add(target)
+        return await asyncio.shield(scrape.task)
+
+    async def _start_scrape(self, post_url: str, target: str):
+        scrape = _Scrape({target})
+        scrape.task = asyncio.create_task(self._run(post_url, scrape))
+        self._inflight[post_url] = scrape
+        return await asyncio.shield(scrape.task)
+
+    async def _run(self, post_url: str, scrape: _Scrape):
+        try:
+            likers, complete = await self.scrape(post_url, scrape.targets)
+        finally:
+            self._inflight.pop(post_url, None)
+        return self.remember(post_url, likers, complete)
+
+    def remember(self, post_url: str, likers: set, complete: bool):
+        """Cache a likers list scraped elsewhere; returns (likers, complete) as cached."""
+        now = time.monotonic()
+        entry = self._cache.get(post_url)
+        if entry and entry[0] > now and not complete:
+            # Keep what an earlier partial scrape already confirmed
+            likers = likers | entry[1]
+        self._cache[post_url] = (now + self.ttl, likers, complete)
+        self._evict_expired(now)
+        return likers, complete
+
+    def _evict_expired(self, now: float):
+        expired = [url for url, entry in self._cache.items() if entry[0] <= now]
+        for url in expired:
+            del self._cache[url]
+
+    def stats(self):
+        """Return a snapshot of cache metrics."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "cached_posts": len(self._cache),
+            "inflight": len(self._inflight),
+        }
+
+
+liker_cache = LikerCoalescer()
@@ -0,0 +1,70 @@
+"""Instagram link extraction for group messages.
+
+Most group messages contain no link at all, so a substring check runs before
+the regex. Every link found is normalized to one canonical form per post:
+
+    https://www.instagram.com/<kind>/<shortcode>/
+
+with query strings and fragments dropped, instagr.am, m. and missing www
+unified, and reels/ folded into reel/.
+"""
+import re
+from typing import NamedTuple
+
+_PREFILTER = "instagr"
+
+_LINK_PATTERN = re.compile(
+    # Not part of a longer host, or of another URL's path, query or userinfo
+    r"(?<![\w.@/=-])"
+    r"(?:https?://)?"
+    r"(?:(?:www\.|m\.)?instagram\.com|(?:www\.)?instagr\.am)"
+    r"/(p|reels?|tv)/([A-Za-z0-9_-]+)"
+    # The rest of the URL: trailing slash, query string, fragment
+    r"/?(?:[?#]\S*)?",
+    re.IGNORECASE,
+)
+
+_KINDS = {"p": "p", "reel": "reel", "reels": "reel", "tv": "tv"}
+
+
+class InstagramLink(NamedTuple):
+    kind: str
+    shortcode: str
+    url: str
+
+
+def _link(match) -> InstagramLink:
+    kind = _KINDS[match.group(1).lower()]
+    shortcode = match.group(2)
+    return InstagramLink(kind, shortcode, f"https://www.instagram.com/{kind}/{shortcode}/")
+
+
+def might_contain_link(text: str) -> bool:
+    """Cheap check that rules out most messages before the regex runs."""
+    return _PREFILTER in text or _PREFILTER in text.lower()
+
+
+def extract_links(text: str):
+    """Return every distinct Instagram post link in `text`, in order of appearance."""
+    if not text or not might_contain_link(text):
+        return []
+    links = []
+    seen = set()
+    for match in _LINK_PATTERN.finditer(text):
+        link = _link(match)
+        if link.shortcode not in seen:
+            seen.add(link.shortcode)
+            links.append(link)
+    return links
+
+
+def normalize_link(url: str):
+    """Return the canonical URL of an Instagram post link, or None if it isn't one."""
+    match = _LINK_PATTERN.fullmatch(url.strip())
+    return _link(match).url if match else None
+
+
+def shortcode_of(url: str):
+    """Return the post shortcode of an Instagram link, or None."""
+    match = _LINK_PATTERN.fullmatch(url.strip())
+    return match.group(2) if match else None
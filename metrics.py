@@ -0,0 +1,396 @@
+"""In-process metrics: histograms, counters and gauges.
+
+Handlers, database calls and scraper phases record into module-level metrics
+defined here. Everything is recorded from the event loop thread, so updates
+are plain list and dict writes with no locking; one observation costs about
+a microsecond (see benchmarks/bench_metrics.py).
+
+The registry is exposed two ways:
+- Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics;
+- `perf_report()`, a short summary behind the admin-only /perf command.
+"""
+import asyncio
+import bisect
+import functools
+import inspect
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# === Metrics Configuration ===
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Local only by default; 0 turns the HTTP endpoint off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Seconds; covers sub-millisecond cache hits up to full browser scrapes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def values(self):
+        return dict(self._values)
+
+    def expose(self):
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class _Series:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, buckets: int):
+        # One count per bucket plus the +Inf overflow, not cumulative
+        self.counts = [0] * (buckets + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class _Timer:
+    # A plain class: @contextmanager costs several times more per block
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram(_Metric):
+    """Observations sorted into fixed buckets per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(len(self.buckets))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def time(self, *labels):
+        """Context manager observing how long the block took, exceptions included."""
+        return _Timer(self, labels)
+
+    def timed(self, *labels):
+        """Decorator form of `time` for sync and async functions."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    with self.time(*labels):
+                        return await func(*args, **kwargs)
+            else:
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    with self.time(*labels):
+                        return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self, *labels):
+        """Count, mean and estimated percentiles of one label set, or None."""
+        series = self._series.get(labels)
+        if series is None or not series.count:
+            return None
+        return {
+            "count": series.count,
+            "avg": series.total / series.count,
+            "p50": self._quantile(series, 0.5),
+            "p90": self._quantile(series, 0.9),
+            "p99": self._quantile(series, 0.99),
+        }
+
+    def label_sets(self):
+        return list(self._series)
+
+    def _quantile(self, series, q: float):
+        """Linear interpolation inside the bucket the quantile falls in."""
+        rank = q * series.count
+        seen = 0
+        for index, count in enumerate(series.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    # Beyond the last bound there is nothing to interpolate to
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def expose(self):
+        lines = self.header()
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                le = _format_labels(self.labels, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(series.total)}")
+            lines.append(f"{self.name}_count{label_text} {series.count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read at scrape time from `collect`.
+
+    `collect` returns a number, or a {label values tuple: number} dict, and
+    may be a coroutine function.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, collect, labels=()):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    async def read(self):
+        value = self.collect()
+        if inspect.isawaitable(value):
+            value = await value
+        return value if isinstance(value, dict) else {(): value}
+
+    async def expose(self):
+        lines = self.header()
+        for labels, value in sorted((await self.read()).items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, collect, labels=()):
+        return self._add(Gauge(name, help, collect, labels))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def gauges(self):
+        return [metric for metric in self._metrics.values() if isinstance(metric, Gauge)]
+
+    async def expose(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                if isinstance(metric, Gauge):
+                    lines.extend(await metric.expose())
+                else:
+                    lines.extend(metric.expose())
+            except Exception:
+                # One broken gauge shouldn't take the whole endpoint down
+                logger.exception(f"Collecting {metric.name} failed")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# === Hot-path Metrics ===
+
+handler_seconds = registry.histogram(
+    "bot_handler_seconds", "Time spent in each update handler.", ("handler",))
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Update handlers that raised.", ("handler",))
+db_query_seconds = registry.histogram(
+    "db_query_seconds", "Database call time on a DB thread.", ("query",))
+db_wait_seconds = registry.histogram(
+    "db_wait_seconds", "Time database calls waited for a DB thread.", ("query",))
+scraper_phase_seconds = registry.histogram(
+    "scraper_phase_seconds", "Time of each scraper phase (checkout, launch, goto, wait, extract, cookie_save).",
+    ("phase",))
+verifications = registry.counter(
+    "verifications_total", "/done verification outcomes.", ("result",))
+verification_seconds = registry.histogram(
+    "verification_seconds", "Time to answer one /done check, liker cache hits included.", ("engine",))
+
+
+def timed_handler(func):
+    """Time an update handler and count the ones that raise."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+# === Reporting ===
+
+def _summary_lines(histogram, limit: int = None):
+    rows = []
+    for labels in histogram.label_sets():
+        summary = histogram.summary(*labels)
+        if summary:
+            rows.append((labels, summary))
+    # Where the time goes: largest total first
+    rows.sort(key=lambda row: row[1]["count"] * row[1]["avg"], reverse=True)
+    return [
+        f"{'/'.join(map(str, labels)) or histogram.name}: {s['count']}× "
+        f"avg {s['avg'] * 1000:.1f} p50 {s['p50'] * 1000:.1f} p99 {s['p99'] * 1000:.1f} ms"
+        for labels, s in rows[:limit]
+    ]
+
+
+async def perf_report(limit: int = 8):
+    """A compact plain-text summary of the hot paths and gauges."""
+    sections = [
+        ("Handlers", _summary_lines(handler_seconds, limit)),
+        ("Database", _summary_lines(db_query_seconds, limit)),
+        ("Scraper", _summary_lines(scraper_phase_seconds, limit)),
+        ("Verifications", _summary_lines(verification_seconds, limit)),
+    ]
+    gauges = []
+    for metric in registry.gauges():
+        try:
+            values = await metric.read()
+        except Exception as e:
+            gauges.append(f"{metric.name}: {e}")
+            continue
+        for labels, value in sorted(values.items()):
+            suffix = "{" + ",".join(map(str, labels)) + "}" if labels else ""
+            gauges.append(f"{metric.name}{suffix}: {value:g}")
+    sections.append(("Gauges", gauges))
+
+    errors = handler_errors.values()
+    if errors:
+        sections.append(("Handler errors", [f"{labels[0]}: {count:g}" for labels, count in sorted(errors.items())]))
+
+    text = []
+    for title, lines in sections:
+        if lines:
+            text.append(f"{title}\n" + "\n".join(f"  {line}" for line in lines))
+    return "\n\n".join(text) or "No data yet."
+
+
+# === HTTP Endpoint ===
+
+class MetricsServer:
+    """Serves GET /metrics; anything else gets a 404."""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT, registry: Registry = registry):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+
+    async def start(self):
+        if self.port <= 0 or not METRICS_ENABLED:
+            return
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Headers carry nothing we need
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", (await self.registry.expose()).encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+metrics_server = MetricsServer()
@@ -0,0 +1,407 @@
+"""Rate-limited delivery of everything the bot sends, edits, deletes or answers.
+
+Calls are queued per chat and released through token buckets (one per chat
+plus a global one) that follow Telegram's flood limits. RetryAfter answers
+delay the chat instead of losing the message, notifications to the same user
+within a short window are merged into one message, and chats that blocked
+the bot are skipped instead of retried.
+
+Every method returns a future that resolves to the Bot API result, or None
+when the call was dropped. Await it when the result matters; otherwise just
+let it run.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# === Outbox Configuration ===
+# Bot API calls per second across all chats
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+# Messages per second to one private chat, and how many may go out back to back
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+# Messages per minute to one group
+OUTBOX_GROUP_PER_MINUTE = float(os.getenv("OUTBOX_GROUP_PER_MINUTE", "20"))
+# Notifications to a user within this many seconds become one message
+OUTBOX_COALESCE_WINDOW = float(os.getenv("OUTBOX_COALESCE_WINDOW", "1.5"))
+# Attempts per call on network errors
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "3"))
+# Bot API requests in flight at once
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "16"))
+# Seconds a chat that blocked the bot is skipped, unless it writes to us first
+OUTBOX_BLOCKED_TTL = float(os.getenv("OUTBOX_BLOCKED_TTL", "86400"))
+# Seconds to keep delivering queued calls when shutting down
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "10"))
+
+MAX_MESSAGE_LENGTH = 4096
+# Per-chat buckets kept before idle (full) ones are forgotten
+OUTBOX_MAX_BUCKETS = 10000
+# Deletes and callback answers don't count against the per-chat message limits
+_DELETE = "delete_message"
+_ANSWER = "answer_callback_query"
+# Queue kind of each method; a chat's kinds are sent independently
+_KINDS = {_DELETE: "delete", _ANSWER: "answer"}
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Call:
+    __slots__ = ("chat_id", "method", "kwargs", "future", "coalesce", "not_before", "attempts")
+
+    def __init__(self, chat_id, method, kwargs, coalesce: bool, not_before: float):
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+        self.coalesce = coalesce
+        self.not_before = not_before
+        self.attempts = 0
+
+
+class Outbox:
+    """Queues Bot API calls per chat and sends them within Telegram's limits."""
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOX_GLOBAL_RATE,
+        chat_rate: float = OUTBOX_CHAT_RATE,
+        chat_burst: int = OUTBOX_CHAT_BURST,
+        group_per_minute: float = OUTBOX_GROUP_PER_MINUTE,
+        coalesce_window: float = OUTBOX_COALESCE_WINDOW,
+        concurrency: int = OUTBOX_CONCURRENCY,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.coalesce_window = coalesce_window
+        self.concurrency = concurrency
+        self.bot = None
+        self._task = None
+        self._stopping = False
+
+        # (chat_id, kind) -> deque of calls; kind splits deletes from messages
+        self._queues = {}
+        # (ready_at, seq, key) for keys with queued calls and none in flight
+        self._heap = []
+        self._scheduled = set()
+        self._busy = set()
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._global = TokenBucket(global_rate, global_rate)
+        # chat_id -> monotonic time until which it is skipped
+        self._blocked = {}
+        self._wakeup = None
+        self._slots = None
+        self._inflight = set()
+
+        # Metrics
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.retried = 0
+
+    # === Lifecycle ===
+
+    async def start(self, bot):
+        self.bot = bot
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = OUTBOX_DRAIN_TIMEOUT):
+        """Deliver what is queued (up to `timeout` seconds), then drop the rest."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox drain timed out with {self.depth()} call(s) queued")
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._inflight, return_exceptions=True)
+        for queue in self._queues.values():
+            for call in queue:
+                self._drop(call)
+        self._queues.clear()
+        self._heap.clear()
+        self._scheduled.clear()
+        self._task = None
+
+    # === Public API ===
+
+    def send(self, chat_id: int, text: str, **kwargs):
+        """Queue a send_message; the future resolves to the sent Message."""
+        return self._submit(chat_id, "send_message", dict(kwargs, text=text))
+
+    def notify(self, chat_id: int, text: str, **kwargs):
+        """Queue a message that may be merged with other notifications to the same chat."""
+        return self._submit(chat_id, "send_message", dict(kwargs, text=text), coalesce=True)
+
+    def edit(self, chat_id: int, message_id: int, text: str, **kwargs):
+        """Queue an edit_message_text."""
+        return self._submit(chat_id, "edit_message_text", dict(kwargs, message_id=message_id, text=text))
+
+    def delete(self, chat_id: int, message_id: int):
+        """Queue a delete_message."""
+        return self._submit(chat_id, _DELETE, {"message_id": message_id})
+
+    def answer(self, chat_id: int, callback_query_id: str, **kwargs):
+        """Queue an answer_callback_query for a button pressed in `chat_id`."""
+        return self._submit(chat_id, _ANSWER, dict(kwargs, callback_query_id=callback_query_id))
+
+    def is_blocked(self, chat_id: int) -> bool:
+        until = self._blocked.get(chat_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._blocked[chat_id]
+            return False
+        return True
+
+    def unblock(self, chat_id: int):
+        """Forget that a chat blocked the bot, e.g. because it just wrote to us."""
+        self._blocked.pop(chat_id, None)
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        """Return queued, sent, coalesced and dropped counts."""
+        return {
+            "queued": self.depth(),
+            "in_flight": len(self._inflight),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "blocked_chats": len(self._blocked),
+        }
+
+    # === Scheduling ===
+
+    def _submit(self, chat_id, method, kwargs, coalesce=False):
+        self.submitted += 1
+        if self.is_blocked(chat_id):
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            self.dropped += 1
+            return future
+
+        key = (chat_id, _KINDS.get(method, "message"))
+        queue = self._queues.setdefault(key, deque())
+        if coalesce and queue and self._merge(queue[-1], kwargs):
+            self.coalesced += 1
+            return queue[-1].future
+
+        now = time.monotonic()
+        call = _Call(chat_id, method, kwargs, coalesce, now + self.coalesce_window if coalesce else now)
+        queue.append(call)
+        if len(queue) == 1:
+            self._schedule(key, call.not_before)
+        return call.future
+
+    def _merge(self, call, kwargs):
+        if not call.coalesce:
+            return False
+        text = call.kwargs["text"] + "\n\n" + kwargs["text"]
+        if len(text) > MAX_MESSAGE_LENGTH:
+            return False
+        if {k: v for k, v in call.kwargs.items() if k != "text"} != {k: v for k, v in kwargs.items() if k != "text"}:
+            return False
+        call.kwargs["text"] = text
+        return True
+
+    def _schedule(self, key, ready_at: float):
+        if key in self._scheduled or key in self._busy:
+            return
+        self._scheduled.add(key)
+        heapq.heappush(self._heap, (ready_at, next(self._seq), key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _bucket(self, key):
+        chat_id, kind = key
+        if kind != "message":
+            return None
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > OUTBOX_MAX_BUCKETS:
+                now = time.monotonic()
+                for stale in [c for c, b in self._buckets.items() if b.full(now)]:
+                    del self._buckets[stale]
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                if self._stopping and not self._inflight:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            ready_at, _, key = self._heap[0]
+            if ready_at > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), ready_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._scheduled.discard(key)
+            queue = self._queues.get(key)
+            if not queue:
+                # Emptied by _block while it was waiting
+                self._queues.pop(key, None)
+                continue
+            call = queue[0]
+            # A coalescing notification waits out its window unless we're shutting down
+            delay = 0.0 if self._stopping else call.not_before - now
+            bucket = self._bucket(key)
+            if bucket is not None:
+                delay = max(delay, bucket.delay(now))
+            delay = max(delay, self._global.delay(now))
+            if delay > 0:
+                self._schedule(key, now + delay)
+                continue
+
+            if bucket is not None:
+                bucket.take()
+            self._global.take()
+            queue.popleft()
+            self._busy.add(key)
+            await self._slots.acquire()
+            task = asyncio.create_task(self._deliver(key, call))
+            self._inflight.add(task)
+            task.add_done_callback(self._finished)
+
+    async def _deliver(self, key, call):
+        retry_at = None
+        try:
+            call.attempts += 1
+            # A callback answer names its query, not a chat
+            kwargs = call.kwargs if call.method == _ANSWER else dict(call.kwargs, chat_id=call.chat_id)
+            result = await getattr(self.bot, call.method)(**kwargs)
+            self.sent += 1
+            if not call.future.done():
+                call.future.set_result(result)
+        except RetryAfter as e:
+            # Flood control: hold this chat back, keep the call at the front
+            self.retried += 1
+            retry_at = time.monotonic() + _seconds(e.retry_after)
+            self._queues[key].appendleft(call)
+        except Forbidden as e:
+            if call.method == _DELETE:
+                # Missing admin rights, not a blocked chat
+                logger.warning(f"Couldn’t delete message in {call.chat_id}: {e}")
+                self._drop(call)
+            else:
+                logger.info(f"Chat {call.chat_id} blocked the bot; skipping it for now")
+                self._block(call)
+        except BadRequest as e:
+            if "chat not found" in str(e).lower():
+                self._block(call)
+            else:
+                logger.warning(f"{call.method} to {call.chat_id} failed: {e}")
+                self._drop(call)
+        except NetworkError as e:
+            if call.attempts < OUTBOX_MAX_ATTEMPTS:
+                self.retried += 1
+                retry_at = time.monotonic() + 2 ** call.attempts
+                self._queues[key].appendleft(call)
+            else:
+                logger.warning(f"{call.method} to {call.chat_id} failed after {call.attempts} attempts: {e}")
+                self._drop(call)
+        except Exception:
+            logger.exception(f"{call.method} to {call.chat_id} failed")
+            self._drop(call)
+        finally:
+            self._slots.release()
+            self._busy.discard(key)
+            queue = self._queues.get(key)
+            if queue:
+                self._schedule(key, retry_at or queue[0].not_before)
+            else:
+                self._queues.pop(key, None)
+                self._prune_bucket(key[0])
+
+    def _finished(self, task):
+        self._inflight.discard(task)
+        # stop() waits for the last delivery to finish
+        self._wakeup.set()
+
+    def _block(self, call):
+        self._blocked[call.chat_id] = time.monotonic() + OUTBOX_BLOCKED_TTL
+        self._drop(call)
+        # Whatever else is queued for this chat would fail the same way
+        for kind in ("message", *_KINDS.values()):
+            queue = self._queues.get((call.chat_id, kind))
+            while queue:
+                self._drop(queue.popleft())
+
+    def _drop(self, call):
+        self.dropped += 1
+        if not call.future.done():
+            call.future.set_result(None)
+
+    def _prune_bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is not None and bucket.full(time.monotonic()):
+            del self._buckets[chat_id]
+
+
+def _seconds(value) -> float:
+    # RetryAfter.retry_after is an int or a timedelta depending on the PTB version
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+outbox = Outbox()
+registry.gauge("outbox_depth", "Bot API calls waiting to be sent.", outbox.depth)
+registry.gauge("outbox_in_flight", "Bot API calls being sent.", lambda: outbox.stats()["in_flight"])
@@ -0,0 +1,111 @@
+"""Cached HTML for the /queue and /leaderboard replies.
+
+Each link's fragment is built once, when the link is saved, and a user's queue
+is joined from those fragments. Leaderboard texts are reused until the
+leaderboard version changes.
+"""
+import html
+import os
+import threading
+
+import cache
+
+# === Render Cache Configuration ===
+LINK_FRAGMENT_CACHE_SIZE = int(os.getenv("LINK_FRAGMENT_CACHE_SIZE", "5000"))
+
+QUEUE_HEADER = (
+    "📋 <b>Recent Instagram Links</b>\n"
+    "You need to /done as soon as possible after engaging (within 5 min). "
+    "Only love react will count as engage.\n\n"
+)
+QUEUE_EMPTY = "📭 <b>No unliked Instagram links available.</b>"
+LEADERBOARD_EMPTY = "❌ No users found in the leaderboard."
+
+
+class VersionedTexts:
+    """Rendered texts that stay valid while their source version is unchanged."""
+
+    def __init__(self):
+        self._texts = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.renders = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._texts.get(key)
+            if entry is not None and entry[0] == version:
+                self.reused += 1
+                return entry[1]
+            return None
+
+    def set(self, key, version, text: str):
+        with self._lock:
+            self.renders += 1
+            self._texts[key] = (version, text)
+
+    def clear(self):
+        with self._lock:
+            self._texts.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._texts), "renders": self.renders, "reused": self.reused}
+
+
+# link_id -> HTML fragment of that link in /queue
+link_fragments = cache.LRUCache(LINK_FRAGMENT_CACHE_SIZE)
+leaderboards = VersionedTexts()
+
+
+def _build_fragment(link_id: int, link: str):
+    link = html.escape(link)
+    return (
+        f"🔗 <b>ID:</b> <code>{link_id}</code>\n"
+        f"📎 <a href=\"{link}\">{link}</a>\n\n"
+    )
+
+
+def remember_link(link_id: int, link: str):
+    """Precompute the fragment of a freshly saved link."""
+    link_fragments.set(link_id, _build_fragment(link_id, link))
+
+
+def link_fragment(link_id: int, link: str):
+    fragment = link_fragments.get(link_id)
+    if fragment is cache.MISSING:
+        fragment = _build_fragment(link_id, link)
+        link_fragments.set(link_id, fragment)
+    return fragment
+
+
+def queue_text(links):
+    """Render a /queue page from [{"id", "link"}] rows."""
+    if not links:
+        return QUEUE_EMPTY
+    return QUEUE_HEADER + "".join(link_fragment(item["id"], item["link"]) for item in links)
+
+
+def leaderboard_text(title: str, rows):
+    """Render [(username, points)] rows under `title`."""
+    if not rows:
+        return LEADERBOARD_EMPTY
+    lines = [
+        f"{idx}. <b>{html.escape(str(username))}</b> - <b>{points}</b> points\n"
+        for idx, (username, points) in enumerate(rows, start=1)
+    ]
+    return title + "".join(lines)
+
+
+def clear():
+    link_fragments.clear()
+    leaderboards.clear()
+
+
+def stats():
+    """Return how many renders were served from cache."""
+    fragments = link_fragments.stats()
+    return {
+        "link_fragments": {k: fragments[k] for k in ("entries", "hits", "misses", "hit_ratio")},
+        "leaderboards": leaderboards.stats(),
+    }
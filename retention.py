@@ -0,0 +1,228 @@
+"""Link expiry and history compaction.
+
+Each pass:
+1. marks links older than RETENTION_MAX_AGE_DAYS, or with RETENTION_MAX_LIKES
+   likes, inactive so /queue stops looking at them;
+2. moves inactive links older than RETENTION_ARCHIVE_DAYS, with their likes,
+   to the archive tables, or to gzipped JSONL files when
+   RETENTION_ARCHIVE_MODE=jsonl, and drops their /done jobs and results;
+3. drops score events the leaderboards no longer need, and verification
+   results older than RETENTION_RESULT_DAYS;
+4. hands free pages back to the filesystem with incremental vacuum.
+
+All work happens in batches of RETENTION_BATCH_SIZE rows with a pause
+between them, so the bot's own writes never wait long for the lock. Run it
+once by hand with `python retention.py`.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import leaderboard
+from async_database import (
+    archivable_links,
+    archive_links,
+    deactivate_links,
+    delete_link_jobs,
+    incremental_vacuum,
+    load_links,
+    prune_score_events,
+    prune_verification_results,
+    sample_user_ids,
+    storage_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+# === Retention Configuration ===
+# Seconds between passes; 0 disables the background job
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", str(6 * 3600)))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "14"))
+RETENTION_MAX_LIKES = int(os.getenv("RETENTION_MAX_LIKES", "100"))
+# Inactive links are archived once they are this old
+RETENTION_ARCHIVE_DAYS = float(os.getenv("RETENTION_ARCHIVE_DAYS", "60"))
+# "table" (instagram_links_archive / user_likes_archive) or "jsonl"
+RETENTION_ARCHIVE_MODE = os.getenv("RETENTION_ARCHIVE_MODE", "table")
+RETENTION_EXPORT_DIR = Path(os.getenv("RETENTION_EXPORT_DIR", "archive"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+# Seconds between batches, leaving the write lock to the bot
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+# Score events kept, in days; never less than the leaderboard window
+RETENTION_EVENT_DAYS = float(os.getenv("RETENTION_EVENT_DAYS", "30"))
+# Verification results kept, in days; keep longer than VERIFY_BACKOFF_WINDOW
+RETENTION_RESULT_DAYS = float(os.getenv("RETENTION_RESULT_DAYS", "30"))
+# Free pages returned per incremental vacuum step
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))
+# Users whose /queue query is timed before and after a pass
+RETENTION_SAMPLE_USERS = int(os.getenv("RETENTION_SAMPLE_USERS", "20"))
+
+QUEUE_PAGE = 7
+
+
+class Retention:
+    """Runs retention passes in the background and keeps the last report."""
+
+    def __init__(self, interval: float = RETENTION_INTERVAL, mode: str = RETENTION_ARCHIVE_MODE):
+        if mode not in ("table", "jsonl"):
+            raise ValueError(f"Unknown RETENTION_ARCHIVE_MODE: {mode}")
+        self.interval = interval
+        self.mode = mode
+        self._task = None
+        self.last_report = None
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Retention pass failed")
+
+    async def run_once(self):
+        """Run one full pass and return a report of what it did."""
+        started = time.perf_counter()
+        users = await sample_user_ids(RETENTION_SAMPLE_USERS)
+        storage_before = await storage_stats()
+        queue_before = await _time_queue(users)
+
+        now = datetime.now()
+        deactivated = await self._deactivate((now - timedelta(days=RETENTION_MAX_AGE_DAYS)).isoformat())
+        links, likes = await self._archive((now - timedelta(days=RETENTION_ARCHIVE_DAYS)).isoformat())
+        event_days = max(RETENTION_EVENT_DAYS, leaderboard.board.window_days + 1)
+        events = await self._prune(prune_score_events, time.time() - event_days * leaderboard.DAY)
+        results = await self._prune(prune_verification_results, time.time() - RETENTION_RESULT_DAYS * leaderboard.DAY)
+        pages = await self._vacuum(storage_before)
+
+        storage_after = await storage_stats()
+        queue_after = await _time_queue(users)
+        self.last_report = {
+            "deactivated": deactivated,
+            "archived_links": links,
+            "archived_likes": likes,
+            "archive_mode": self.mode,
+            "pruned_events": events,
+            "pruned_results": results,
+            "vacuumed_pages": pages,
+            "bytes_before": storage_before["bytes"],
+            "bytes_after": storage_after["bytes"],
+            "bytes_reclaimed": storage_before["bytes"] - storage_after["bytes"],
+            "free_bytes_after": storage_after["free_bytes"],
+            "queue_ms_before": queue_before,
+            "queue_ms_after": queue_after,
+            "duration": time.perf_counter() - started,
+        }
+        logger.info(f"Retention pass: {self.last_report}")
+        return self.last_report
+
+    async def _deactivate(self, cutoff: str):
+        total = 0
+        after_id = 0
+        while after_id is not None:
+            count, after_id = await deactivate_links(cutoff, RETENTION_MAX_LIKES, after_id, RETENTION_BATCH_SIZE)
+            total += count
+            await asyncio.sleep(RETENTION_BATCH_PAUSE)
+        return total
+
+    async def _archive(self, cutoff: str):
+        links = likes = 0
+        while True:
+            rows = await archivable_links(cutoff, RETENTION_BATCH_SIZE)
+            if not rows:
+                return links, likes
+            if self.mode == "jsonl":
+                # Exported before deleting: a crash in between only repeats lines
+                await asyncio.to_thread(_export, rows)
+            removed, removed_likes = await archive_links([row["link_id"] for row in rows], copy=self.mode == "table")
+            # A no-op for the SQLite queue, which lost them with the links
+            await delete_link_jobs(removed)
+            links += len(removed)
+            likes += removed_likes
+            await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+    async def _prune(self, prune, before: float):
+        total = 0
+        while True:
+            count = await prune(before, RETENTION_BATCH_SIZE * 10)
+            total += count
+            if count < RETENTION_BATCH_SIZE * 10:
+                return total
+            await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+    async def _vacuum(self, storage):
+        if storage["auto_vacuum"] != 2:
+            if storage["free_bytes"]:
+                logger.info("auto_vacuum is off; run `python retention.py --enable-vacuum` once to reclaim space")
+            return 0
+        total = 0
+        while True:
+            pages = await incremental_vacuum(RETENTION_VACUUM_PAGES)
+            total += pages
+            if pages < RETENTION_VACUUM_PAGES:
+                return total
+            await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+    def stats(self):
+        return {"interval": self.interval, "mode": self.mode, "last_report": self.last_report}
+
+
+def _export(rows):
+    RETENTION_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = RETENTION_EXPORT_DIR / f"links-{datetime.now():%Y%m%d}.jsonl.gz"
+    # Appending adds a gzip member; readers see one continuous stream
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+async def _time_queue(user_ids):
+    """Median milliseconds of the /queue SQL (cache bypassed) over `user_ids`."""
+    if not user_ids:
+        return 0.0
+    durations = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        # An explicit cursor skips the recent-links buffer
+        await load_links(user_id, sys.maxsize, QUEUE_PAGE)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return durations[len(durations) // 2]
+
+
+retention = Retention()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import database
+    from async_database import db_executor
+
+    parser = argparse.ArgumentParser(description="Run one retention pass and print its report.")
+    parser.add_argument("--enable-vacuum", action="store_true",
+                        help="switch the database to incremental auto-vacuum first (rewrites the file)")
+    parser.add_argument("--mode", choices=["table", "jsonl"], default=RETENTION_ARCHIVE_MODE)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    database.init_db()
+    if args.enable_vacuum and database.enable_incremental_vacuum():
+        print("auto_vacuum switched to INCREMENTAL")
+    report = asyncio.run(Retention(mode=args.mode).run_once())
+    print(json.dumps(report, indent=2))
+    db_executor.shutdown()
@@ -1,45 +1,366 @@
-import json
-from playwright.async_api import async_playwright
+import os
+import re
+import time
+import weakref
+from urllib.parse import urlsplit
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+from browser_pool import BrowserPool
+from metrics import registry, scraper_phase_seconds
+from sessions import sessions
 
-COOKIES_FILE = "cookies.json"
+# === Likers Extraction Configuration ===
+# "dom" renders the liked_by page; "network" reads the likers JSON API first
+LIKERS_ENGINE = os.getenv("LIKERS_ENGINE", "dom")
+LIKERS_SELECTOR = os.getenv("LIKERS_SELECTOR", "a")
+# Hard cap on a single verification, navigation included
+LIKERS_DEADLINE_MS = int(os.getenv("LIKERS_DEADLINE_MS", "20000"))
+# How long to wait for new likers to render before scrolling again
+LIKERS_IDLE_MS = int(os.getenv("LIKERS_IDLE_MS", "2500"))
+# Resource types the scraper never needs
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
 
-async def check_if_liked(username: str, post_url: str) -> bool:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
+# Scrape this origin instead of https://www.instagram.com (e.g. a local stand-in for load tests)
+INSTAGRAM_BASE_URL = os.getenv("INSTAGRAM_BASE_URL", "").rstrip("/")
+_INSTAGRAM_ORIGIN = "https://www.instagram.com"
 
-        # Load cookies from file
-        with open(COOKIES_FILE, "r") as f:
-            cookies = json.load(f)
+# Public web app id Instagram's own frontend sends with API requests
+IG_APP_ID = os.getenv("IG_APP_ID", "936619743392459")
+SHORTCODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+SHORTCODE_PATTERN = re.compile(r'/(?:p|reel|tv)/([A-Za-z0-9_\-]+)')
 
-        # Fix 'sameSite' attribute if necessary
-        for cookie in cookies:
-            if 'sameSite' not in cookie or cookie['sameSite'] not in ['Strict', 'Lax', 'None']:
-                cookie['sameSite'] = 'Lax'
+# Resolves once every target is rendered or the likers list changed since the last look
+_LIKERS_CHANGED_JS = """
+([selector, targets, count, last]) => {
+    const names = Array.from(document.querySelectorAll(selector),
+                             a => (a.textContent || '').trim().toLowerCase()).filter(Boolean);
+    return (targets.length > 0 && targets.every(t => names.includes(t)))
+        || names.length !== count || (names[names.length - 1] || null) !== last;
+}
+"""
 
-        # Add cookies to the context
-        await context.add_cookies(cookies)
+_LINK_TEXTS_JS = "els => els.map(a => (a.textContent || '').trim()).filter(Boolean)"
 
-        # Open a new page and go to the post URL
-        page = await context.new_page()
-        await page.goto(f"{post_url}liked_by/")
-        await page.wait_for_load_state("domcontentloaded")
-        await page.wait_for_timeout(10000)
+# Scroll the last rendered liker into view so the list loads its next page
+_SCROLL_JS = """
+(selector) => {
+    const els = document.querySelectorAll(selector);
+    if (els.length) els[els.length - 1].scrollIntoView({block: 'end'});
+    window.scrollBy(0, window.innerHeight);
+}
+"""
 
-        # Extract the list of usernames who liked the post
-        links = await page.query_selector_all("a")
-        link_texts = [await link.text_content() for link in links]
-        link_texts = [text.strip() for text in link_texts if text and text.strip()]
 
-        # Save updated cookies back to the file
-        cookies = await context.cookies()
-        with open(COOKIES_FILE, "w") as f:
-            json.dump(cookies, f)
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-        # Close the browser
-        await browser.close()
 
-        # Return whether the username is in the list of users who liked the post
-        return username.lower() in (name.lower() for name in link_texts)
+# Browser context -> the session account it is logged in with
+_context_accounts = weakref.WeakKeyDictionary()
+# Browser context -> (account, login cookie) it was given
+_context_logins = weakref.WeakKeyDictionary()
 
 
+async def _login(context, index: int):
+    """Give the context the cookies of the account its pool slot is assigned.
+
+    A context already logged in to that session keeps its own cookies: they
+    differ from the store's only by what Instagram refreshed since.
+    """
+    account = sessions.account_for(index)
+    if account is None:
+        return
+    login = (account, sessions.login_of(account))
+    current = _context_logins.get(context)
+    if current == login:
+        return
+    if current is not None:
+        await context.clear_cookies()
+    await context.add_cookies(sessions.cookies(account))
+    _context_accounts[context] = account
+    _context_logins[context] = login
+
+
+async def _setup_context(context, index: int):
+    await context.route("**/*", _block_heavy_resources)
+    await _login(context, index)
+
+
+def reload_sessions():
+    """Hot-swap changed sessions into every live browser context, each before its next check."""
+    browser_pool.apply_to_contexts(_login)
+
+
+# Shared by every verification; started and stopped with the bot application
+browser_pool = BrowserPool(on_new_context=_setup_context)
+
+registry.gauge("browser_pool_size", "Browsers in the pool.", lambda: browser_pool.size)
+registry.gauge("browser_pool_idle", "Browsers waiting for a verification.", lambda: browser_pool.stats()["idle"])
+registry.gauge("browser_pool_recycles", "Browsers relaunched since start.", lambda: browser_pool.recycles)
+
+
+def _remaining_ms(deadline: float) -> float:
+    return (deadline - time.monotonic()) * 1000
+
+
+# === Network Engine ===
+
+def shortcode_to_media_id(shortcode: str) -> int:
+    """Decode a post shortcode into Instagram's numeric media id."""
+    media_id = 0
+    # Private posts append extra characters after the 11-character code
+    for char in shortcode[:11]:
+        media_id = media_id * 64 + SHORTCODE_ALPHABET.index(char)
+    return media_id
+
+
+def likers_api_url(post_url: str):
+    """Return the likers JSON endpoint for a post URL, or None if it has no shortcode."""
+    match = SHORTCODE_PATTERN.search(post_url)
+    if not match:
+        return None
+    parts = urlsplit(post_url)
+    host = "www.instagram.com" if parts.netloc.endswith("instagr.am") else parts.netloc
+    media_id = shortcode_to_media_id(match.group(1))
+    return f"{parts.scheme}://{host}/api/v1/media/{media_id}/likers/"
+
+
+def parse_likers_payload(payload, shortcode: str = None):
+    """Extract liker usernames from a likers API or GraphQL response.
+
+    Returns (usernames, complete) where `complete` tells whether the payload holds
+    every liker, or None when the payload isn't a likers list at all. With a
+    `shortcode`, a GraphQL list of another post doesn't count either.
+    """
+    if not isinstance(payload, dict):
+        return None
+
+    users = payload.get("users")
+    if isinstance(users, list):
+        names = {u["username"].lower() for u in users if isinstance(u, dict) and u.get("username")}
+        total = payload.get("user_count")
+        complete = not payload.get("next_max_id") and (total is None or total <= len(users))
+        return names, complete
+
+    return _parse_graphql_likers(payload, shortcode)
+
+
+def _parse_graphql_likers(payload, shortcode: str = None):
+    """The edge_liked_by list of a GraphQL response, or None for any other query."""
+    if not isinstance(payload, dict):
+        return None
+    media = (payload.get("data") or {}).get("shortcode_media") or {}
+    if not isinstance(media, dict):
+        return None
+    if shortcode and media.get("shortcode") not in (None, shortcode):
+        return None
+    edge = media.get("edge_liked_by")
+    if isinstance(edge, dict) and isinstance(edge.get("edges"), list):
+        names = {
+            e["node"]["username"].lower()
+            for e in edge["edges"]
+            if isinstance(e, dict) and (e.get("node") or {}).get("username")
+        }
+        complete = not (edge.get("page_info") or {}).get("has_next_page")
+        return names, complete
+
+    return None
+
+
+def parse_likers_response(url: str, payload, post_url: str):
+    """Likers from a response the likers page received, or None if it isn't this post's likers list.
+
+    Only the post's likers endpoint and GraphQL answers shaped like its
+    edge_liked_by list count; feeds, comments or suggested users don't.
+    """
+    match = SHORTCODE_PATTERN.search(post_url)
+    if not match:
+        return None
+    path = urlsplit(url).path
+    if path == urlsplit(likers_api_url(post_url)).path:
+        return parse_likers_payload(payload, match.group(1))
+    if "/graphql/" in path:
+        return _parse_graphql_likers(payload, match.group(1))
+    return None
+
+
+async def fetch_likers_network(page, post_url: str, deadline_ms: int = LIKERS_DEADLINE_MS, all_pages: bool = False):
+    """Ask the likers API directly with the context's cookie jar.
+
+    Returns (usernames, complete), or None when the response is unusable and
+    the caller should fall back to rendering the page. With `all_pages` the
+    API's next_max_id cursor is followed until the list ends or the deadline
+    passes; a page failing after the first leaves the list incomplete.
+    """
+    url = likers_api_url(post_url)
+    if not url:
+        return None
+    deadline = time.monotonic() + deadline_ms / 1000
+    likers, complete, max_id = None, False, None
+    while True:
+        try:
+            with scraper_phase_seconds.time("api"):
+                response = await page.context.request.get(
+                    url, headers={"X-IG-App-ID": IG_APP_ID}, params={"max_id": max_id} if max_id else None,
+                    timeout=max(1, _remaining_ms(deadline)),
+                )
+                if not response.ok:
+                    break
+                payload = await response.json()
+        except (PlaywrightError, ValueError):
+            break
+        parsed = parse_likers_payload(payload)
+        if parsed is None:
+            break
+        if likers is None:
+            likers, complete = parsed
+        else:
+            likers |= parsed[0]
+            total = payload.get("user_count")
+            complete = not payload.get("next_max_id") and (total is None or total <= len(likers))
+
+        next_max_id = payload.get("next_max_id")
+        if complete or not all_pages or not next_max_id or next_max_id == max_id or _remaining_ms(deadline) <= 0:
+            break
+        max_id = next_max_id
+    if likers is None:
+        return None
+    return likers, complete
+
+
+async def find_liker_network(page, username: str, post_url: str, deadline_ms: int = LIKERS_DEADLINE_MS):
+    """Return True/False when the likers API settles it, or None to fall back to the DOM engine."""
+    parsed = await fetch_likers_network(page, post_url, deadline_ms)
+    if parsed is None:
+        return None
+    names, complete = parsed
+    if username.lower() in names:
+        return True
+    return False if complete else None
+
+
+# === DOM Engine ===
+
+async def collect_likers(page, post_url: str, targets=None, deadline_ms: int = LIKERS_DEADLINE_MS):
+    """Read the post's likers page until every name in `targets` is found or the list is exhausted.
+
+    `targets` holds lowercase usernames and may grow while the scrape runs; without
+    targets the whole list is read. Returns (usernames, complete).
+    """
+    deadline = time.monotonic() + deadline_ms / 1000
+    targets = targets if targets is not None else set()
+    likers = set()
+
+    # The page fetches likers as JSON too; those answers can beat the rendering
+    async def on_response(response):
+        path = urlsplit(response.url).path
+        if "/likers/" not in path and "/graphql/" not in path:
+            return
+        try:
+            parsed = parse_likers_response(response.url, await response.json(), post_url)
+        except (PlaywrightError, ValueError):
+            return
+        if parsed:
+            likers.update(parsed[0])
+
+    page.on("response", on_response)
+    try:
+        with scraper_phase_seconds.time("goto"):
+            await page.goto(f"{post_url}liked_by/", wait_until="domcontentloaded", timeout=deadline_ms)
+
+        count, last = 0, None
+        stalled = False
+        while _remaining_ms(deadline) > 0:
+            try:
+                with scraper_phase_seconds.time("wait"):
+                    await page.wait_for_function(
+                        _LIKERS_CHANGED_JS,
+                        arg=[LIKERS_SELECTOR, list(targets), count, last],
+                        timeout=max(1, min(_remaining_ms(deadline), LIKERS_IDLE_MS)),
+                    )
+                changed = True
+            except PlaywrightTimeoutError:
+                changed = False
+
+            # One round-trip for every rendered name instead of one per anchor
+            with scraper_phase_seconds.time("extract"):
+                names = await page.eval_on_selector_all(LIKERS_SELECTOR, _LINK_TEXTS_JS)
+            likers.update(name.lower() for name in names)
+            if targets and targets <= likers:
+                return likers, False
+
+            if not changed:
+                # Nothing new after a scroll and a full idle window: the list is exhausted
+                if stalled:
+                    return likers, True
+                stalled = True
+            else:
+                stalled = False
+
+            count = len(names)
+            last = names[-1].lower() if names else None
+            with scraper_phase_seconds.time("scroll"):
+                await page.evaluate(_SCROLL_JS, LIKERS_SELECTOR)
+
+        return likers, False
+    finally:
+        page.remove_listener("response", on_response)
+
+
+async def find_liker(page, username: str, post_url: str, deadline_ms: int = LIKERS_DEADLINE_MS) -> bool:
+    """Open the post's likers page and return as soon as `username` is found or the list is exhausted."""
+    likers, _ = await collect_likers(page, post_url, {username.lower()}, deadline_ms)
+    return username.lower() in likers
+
+
+def _scrape_url(post_url: str):
+    if INSTAGRAM_BASE_URL and post_url.startswith(_INSTAGRAM_ORIGIN):
+        return INSTAGRAM_BASE_URL + post_url[len(_INSTAGRAM_ORIGIN):]
+    return post_url
+
+
+async def _save_cookies(page):
+    # Keep refreshed cookies; the store writes them out on its own schedule
+    account = _context_accounts.get(page.context)
+    if account is not None:
+        with scraper_phase_seconds.time("cookie_save"):
+            sessions.update(account, await page.context.cookies())
+
+
+async def scrape_likers(post_url: str, targets=None, engine: str = LIKERS_ENGINE):
+    """Scrape a post's likers with a pooled page. Returns (usernames, complete)."""
+    targets = targets if targets is not None else set()
+    post_url = _scrape_url(post_url)
+    async with browser_pool.page() as page:
+        likers, complete = set(), False
+        if engine == "network":
+            parsed = await fetch_likers_network(page, post_url)
+            if parsed:
+                likers, complete = parsed
+        if not complete and not (targets and targets <= likers):
+            dom_likers, complete = await collect_likers(page, post_url, targets)
+            likers |= dom_likers
+        await _save_cookies(page)
+
+    return likers, complete
+
+
+async def scrape_likers_json(post_url: str):
+    """A post's likers from the likers API alone. Returns (usernames, complete), or None.
+
+    Every page of the list is read, as far as LIKERS_DEADLINE_MS allows.
+    Rendered pages hold other profile links besides the likers, so anything
+    that credits likes without the user asking (see sweeper.py) reads this
+    instead of scrape_likers().
+    """
+    async with browser_pool.page() as page:
+        parsed = await fetch_likers_network(page, _scrape_url(post_url), all_pages=True)
+        await _save_cookies(page)
+    return parsed
+
+
+async def check_if_liked(username: str, post_url: str, engine: str = LIKERS_ENGINE) -> bool:
+    likers, _ = await scrape_likers(post_url, {username.lower()}, engine)
+    return username.lower() in likers
@@ -0,0 +1,285 @@
+"""Instagram login sessions shared by the browser pool.
+
+Cookies are read from disk once and kept in memory. Browser contexts take
+their cookies from here, checks report refreshed cookies back, and writes to
+disk are batched on a debounce and made atomic (temp file + rename), so
+concurrent checks never race on the file.
+
+Accounts:
+- cookies.json is the "default" account, as before;
+- every SESSION_DIR/<account>.json is one more account.
+
+Pool slots are assigned accounts round-robin to spread the scraping load.
+Uploading `cookies.json` or `cookies-<account>.json` to the bot replaces an
+account's cookies and hot-swaps them into live contexts, each before its next
+check. Contexts already logged in to the same session keep their cookies.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# === Session Configuration ===
+COOKIES_FILE = Path(os.getenv("COOKIES_FILE", "cookies.json"))
+SESSION_DIR = Path(os.getenv("SESSION_DIR", "sessions"))
+# Seconds to gather cookie updates before writing them to disk
+SESSION_FLUSH_DELAY = float(os.getenv("SESSION_FLUSH_DELAY", "10"))
+
+DEFAULT_ACCOUNT = "default"
+# Without this cookie Instagram serves the login wall instead of likers
+LOGIN_COOKIE = "sessionid"
+_SAME_SITE = ("Strict", "Lax", "None")
+_UPLOAD_NAME = re.compile(r"cookies(?:-([A-Za-z0-9_.-]+))?\.json")
+
+
+class SessionStore:
+    """In-memory cookies per account with debounced, atomic persistence."""
+
+    def __init__(self, cookies_file: Path = COOKIES_FILE, session_dir: Path = SESSION_DIR,
+                 flush_delay: float = SESSION_FLUSH_DELAY):
+        self.cookies_file = Path(cookies_file)
+        self.session_dir = Path(session_dir)
+        self.flush_delay = flush_delay
+        self._cookies = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._loaded = False
+        # (path, mtime) of the files as last read or written by this process
+        self._disk_seen = ()
+
+        # Metrics
+        self.updates = 0
+        self.unchanged = 0
+        self.writes = 0
+
+    # === Loading ===
+
+    def load(self):
+        """Read every account from disk; invalid files are logged and skipped."""
+        self._cookies = {}
+        self._disk_seen = self._disk_state()
+        paths = []
+        if self.cookies_file.exists():
+            paths.append((DEFAULT_ACCOUNT, self.cookies_file))
+        if self.session_dir.is_dir():
+            paths.extend((path.stem, path) for path in sorted(self.session_dir.glob("*.json")))
+        for account, path in paths:
+            try:
+                with open(path, "r") as f:
+                    self._cookies[account] = validate_cookies(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping session {account} ({path}): {e}")
+        self._loaded = True
+        if not self._cookies:
+            logger.warning(f"No Instagram session found; upload {self.cookies_file.name} to the bot")
+        logger.info(f"Loaded {len(self._cookies)} Instagram session(s)")
+
+    def reload_if_changed(self):
+        """Reload if another process, e.g. the bot taking an upload, changed the files.
+
+        Returns whether it did. Cookies this process hasn't flushed yet give
+        way to the files.
+        """
+        if not self._loaded or self._disk_state() == self._disk_seen:
+            return False
+        self._dirty.clear()
+        self.load()
+        return True
+
+    def _disk_state(self):
+        paths = [self.cookies_file]
+        if self.session_dir.is_dir():
+            paths.extend(sorted(self.session_dir.glob("*.json")))
+        state = []
+        for path in paths:
+            try:
+                state.append((str(path), path.stat().st_mtime_ns))
+            except OSError:
+                continue
+        return tuple(state)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    # === Access ===
+
+    @property
+    def accounts(self):
+        self._ensure_loaded()
+        return sorted(self._cookies)
+
+    def account_for(self, index: int):
+        """The account pool slot `index` logs in with, or None if there is none."""
+        accounts = self.accounts
+        return accounts[index % len(accounts)] if accounts else None
+
+    def login_of(self, account):
+        """The value of the account's login cookie, or None; it changes only with a new login."""
+        self._ensure_loaded()
+        for cookie in self._cookies.get(account, ()):
+            if cookie["name"] == LOGIN_COOKIE:
+                return cookie["value"]
+        return None
+
+    def cookies(self, account):
+        """A copy of the account's cookies, ready for `context.add_cookies`."""
+        self._ensure_loaded()
+        return [dict(cookie) for cookie in self._cookies.get(account, ())]
+
+    # === Updates ===
+
+    def update(self, account, cookies):
+        """Record cookies a browser context refreshed; written on the next flush."""
+        self._ensure_loaded()
+        if account not in self._cookies:
+            # Replaced or removed while the check ran
+            return
+        cookies = _fix_same_site(cookies)
+        if cookies == self._cookies[account]:
+            self.unchanged += 1
+            return
+        self._cookies[account] = cookies
+        self.updates += 1
+        self._mark_dirty(account)
+
+    def replace(self, account, cookies):
+        """Validate and install new cookies for `account`, adding it if it is new.
+
+        Raises ValueError if they aren't a usable Instagram session.
+        """
+        self._ensure_loaded()
+        self._cookies[account] = validate_cookies(cookies, require_login=True)
+        self._mark_dirty(account)
+
+    def replace_from_json(self, account, data):
+        """`replace` from the raw bytes of an uploaded cookies file."""
+        try:
+            cookies = json.loads(data)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"not a JSON file ({e})") from None
+        self.replace(account, cookies)
+
+    # === Persistence ===
+
+    def _mark_dirty(self, account):
+        self._dirty.add(account)
+        if self._flush_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the bot (scripts, benchmarks): write straight away
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_delay)
+            await asyncio.to_thread(self.flush)
+        finally:
+            self._flush_task = None
+
+    def flush(self):
+        """Write every changed account to disk now."""
+        while self._dirty:
+            account = self._dirty.pop()
+            cookies = self._cookies.get(account)
+            if cookies is None:
+                continue
+            try:
+                _write_atomic(self.path_of(account), cookies)
+                self.writes += 1
+            except OSError as e:
+                logger.warning(f"Saving session {account} failed: {e}")
+        self._disk_seen = self._disk_state()
+
+    async def close(self):
+        """Cancel the pending debounce and write what is left."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await asyncio.to_thread(self.flush)
+
+    def path_of(self, account):
+        if account == DEFAULT_ACCOUNT:
+            return self.cookies_file
+        return self.session_dir / f"{account}.json"
+
+    def stats(self):
+        return {
+            "accounts": len(self._cookies),
+            "dirty": len(self._dirty),
+            "updates": self.updates,
+            "unchanged": self.unchanged,
+            "writes": self.writes,
+        }
+
+
+def account_for_upload(file_name):
+    """The account an uploaded file replaces: cookies.json or cookies-<account>.json, else None."""
+    match = _UPLOAD_NAME.fullmatch(file_name or "")
+    if not match:
+        return None
+    return match.group(1) or DEFAULT_ACCOUNT
+
+
+def validate_cookies(cookies, require_login: bool = False):
+    """Return cookies fit for `context.add_cookies`, dropping expired ones.
+
+    Raises ValueError if the data isn't a list of cookies, or, with
+    `require_login`, if it holds no Instagram login.
+    """
+    if not isinstance(cookies, list):
+        raise ValueError("expected a JSON list of cookies")
+    now = time.time()
+    valid = []
+    for cookie in cookies:
+        if not isinstance(cookie, dict) or not isinstance(cookie.get("name"), str) \
+                or not isinstance(cookie.get("value"), str):
+            raise ValueError("every cookie needs a name and a value")
+        if not cookie.get("domain") and not cookie.get("url"):
+            raise ValueError(f"cookie {cookie['name']} has neither domain nor url")
+        expires = cookie.get("expires", -1)
+        if isinstance(expires, (int, float)) and 0 < expires < now:
+            continue
+        valid.append(cookie)
+    if require_login and not any(
+        cookie["name"] == LOGIN_COOKIE and "instagram.com" in (cookie.get("domain") or cookie.get("url"))
+        for cookie in valid
+    ):
+        raise ValueError(f"no unexpired instagram.com {LOGIN_COOKIE} cookie; log in and export again")
+    return _fix_same_site(valid)
+
+
+def _fix_same_site(cookies):
+    fixed = []
+    for cookie in cookies:
+        if cookie.get("sameSite") not in _SAME_SITE:
+            cookie = {**cookie, "sameSite": "Lax"}
+        fixed.append(cookie)
+    return fixed
+
+
+def _write_atomic(path: Path, cookies):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cookies, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+sessions = SessionStore()
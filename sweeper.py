@@ -0,0 +1,216 @@
+"""Background liker sweeps.
+
+Instead of waiting for a /done per user, every SWEEP_INTERVAL seconds the
+sweeper looks at the newest active links (the working set /queue serves),
+reads each due post's likers list once from the likers API, following its
+pages until LIKERS_DEADLINE_MS runs out, and credits every user whose
+username is on it and who hasn't been credited yet. One sweep stands in for
+a /done scrape per liker it finds; a list cut off by the deadline counts as
+"incomplete" and its remaining likers are left to /done. Only the API's list
+is trusted for this: a rendered page also links to other profiles, which a
+/done only ever checks for the user who asked. Links whose list the API
+won't give are skipped and left to /done.
+
+A link is due SWEEP_LINK_INTERVAL seconds after its last sweep, an interval
+that doubles for every SWEEP_DECAY_HOURS of the link's age: new posts collect
+most of their likes early. Links older than SWEEP_MAX_AGE_HOURS are left to
+/done. At most SWEEP_CONCURRENCY sweeps hold a browser page at once, so the
+rest of the pool stays free for /done.
+
+Swept lists go into liker_cache, so /done checks within LIKER_CACHE_TTL are
+answered from them. Sweeps run in the bot with VERIFY_MODE=local, which
+owns the browsers. Run one pass by hand with `python sweeper.py`.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from async_database import credit_likers, sweep_candidates
+from cache import RECENT_LINKS_SIZE
+from liker_cache import liker_cache
+from metrics import registry
+from scrapper import scrape_likers_json
+
+logger = logging.getLogger(__name__)
+
+# === Sweep Configuration ===
+# Seconds between passes; 0 disables the background job
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", "300"))
+# Newest active links looked at per pass
+SWEEP_LINKS = int(os.getenv("SWEEP_LINKS", str(RECENT_LINKS_SIZE)))
+# Seconds between sweeps of a brand-new link
+SWEEP_LINK_INTERVAL = float(os.getenv("SWEEP_LINK_INTERVAL", "900"))
+# The per-link interval doubles every this many hours of link age; 0 keeps it flat
+SWEEP_DECAY_HOURS = float(os.getenv("SWEEP_DECAY_HOURS", "6"))
+SWEEP_MAX_AGE_HOURS = float(os.getenv("SWEEP_MAX_AGE_HOURS", "48"))
+# Browser pages sweeps may hold at once
+SWEEP_CONCURRENCY = int(os.getenv("SWEEP_CONCURRENCY", "1"))
+
+
+def link_interval(age_hours: float, base: float = SWEEP_LINK_INTERVAL, decay_hours: float = SWEEP_DECAY_HOURS):
+    """Seconds between sweeps of a link `age_hours` old."""
+    if decay_hours <= 0:
+        return base
+    return base * 2 ** (max(age_hours, 0) / decay_hours)
+
+
+class LikerSweeper:
+    """Runs liker sweeps in the background and keeps the last report."""
+
+    def __init__(self, interval: float = SWEEP_INTERVAL, concurrency: int = SWEEP_CONCURRENCY,
+                 links: int = SWEEP_LINKS, max_age_hours: float = SWEEP_MAX_AGE_HOURS,
+                 scrape=scrape_likers_json, cache=liker_cache):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.links = links
+        self.max_age_hours = max_age_hours
+        self.scrape = scrape
+        self.cache = cache
+        self._task = None
+        # link_id -> time.monotonic() of its last sweep, for the links in the working set
+        self._swept = {}
+        self.last_report = None
+
+        # Metrics
+        self.passes = 0
+        self.swept = 0
+        self.credited = 0
+        self.failed = 0
+        self.skipped = 0
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Liker sweep failed")
+
+    async def run_once(self):
+        """Sweep every due link once and return a report of what it did."""
+        started = time.perf_counter()
+        now = datetime.now()
+        rows = await sweep_candidates((now - timedelta(hours=self.max_age_hours)).isoformat(), self.links)
+        # Links that left the working set start over if they come back
+        live = {row[0] for row in rows}
+        self._swept = {link_id: at for link_id, at in self._swept.items() if link_id in live}
+
+        clock = time.monotonic()
+        due = [(link_id, link) for link_id, link, timestamp in rows
+               if self._due(link_id, (now - datetime.fromisoformat(timestamp)).total_seconds() / 3600, clock)]
+        slots = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._sweep(link_id, link, slots) for link_id, link in due))
+        done = [result for result in results if result is not None]
+        listed = [result for result in done if result[0] is not None]
+
+        credited = sum(result[1] for result in listed)
+        self.passes += 1
+        self.swept += len(done)
+        self.credited += credited
+        self.skipped += len(done) - len(listed)
+        self.last_report = {
+            "candidates": len(rows),
+            "due": len(due),
+            "swept": len(done),
+            "failed": len(due) - len(done),
+            # No list from the likers API; left to /done
+            "skipped": len(done) - len(listed),
+            "incomplete": sum(not result[2] for result in listed),
+            "likers_seen": sum(result[0] for result in listed),
+            "credited": credited,
+            # On demand, every like credited here would have cost a /done scrape
+            "scrapes_saved": credited - len(done),
+            "duration": time.perf_counter() - started,
+        }
+        if due:
+            logger.info(f"Liker sweep: {self.last_report}")
+        return self.last_report
+
+    def _due(self, link_id: int, age_hours: float, clock: float):
+        swept_at = self._swept.get(link_id)
+        return swept_at is None or clock - swept_at >= link_interval(age_hours)
+
+    async def _sweep(self, link_id: int, link: str, slots):
+        """Return (likers, credited, complete) for one link, or None when the scrape failed.
+
+        `likers` is None when the API gave no list to credit from.
+        """
+        async with slots:
+            try:
+                parsed = await self.scrape(link)
+                if parsed is not None:
+                    likers, complete = parsed
+                    credited = await credit_likers(link_id, likers)
+                    self.cache.remember(link, likers, complete)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Sweeping link {link_id} failed: {e}")
+                return None
+        # A failed link is retried on the next pass
+        self._swept[link_id] = time.monotonic()
+        if parsed is None:
+            return None, 0, False
+        return len(likers), len(credited), complete
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "concurrency": self.concurrency,
+            "passes": self.passes,
+            "swept": self.swept,
+            "credited": self.credited,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "scrapes_saved": self.credited - self.swept,
+            "tracked_links": len(self._swept),
+            "last_report": self.last_report,
+        }
+
+
+sweeper = LikerSweeper()
+registry.gauge("liker_sweeps", "Links swept for likers since start.", lambda: sweeper.swept)
+registry.gauge("liker_sweep_credits", "Likes credited by sweeps since start.", lambda: sweeper.credited)
+registry.gauge("liker_sweep_scrapes_saved", "Likes credited by sweeps minus the scrapes they took.",
+               lambda: sweeper.credited - sweeper.swept)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    import database
+    from async_database import db_executor
+    from scrapper import browser_pool
+    from sessions import sessions
+
+    parser = argparse.ArgumentParser(description="Run one liker sweep pass and print its report.")
+    parser.add_argument("--concurrency", type=int, default=SWEEP_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    database.init_db()
+
+    async def main():
+        sessions.load()
+        await browser_pool.start()
+        try:
+            # Every link in the working set is due on a fresh sweeper
+            return await LikerSweeper(concurrency=args.concurrency).run_once()
+        finally:
+            await browser_pool.stop()
+            await sessions.close()
+
+    print(json.dumps(asyncio.run(main()), indent=2))
+    db_executor.shutdown()
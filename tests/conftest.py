@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh database file, with the module's connections pointed at it."""
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "engagement.db")
+    database.init_db()
+    yield database
+    database.close_connections()
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import browser_pool
+from browser_pool import BrowserPool
+
+
+class _FakeBrowser:
+    def __init__(self):
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakePool(BrowserPool):
+    """A pool whose browsers are stand-ins; `failures` launches raise first."""
+
+    def __init__(self, failures=(), **kwargs):
+        super().__init__(health_check_interval=0, **kwargs)
+        self.failures = list(failures)
+        self.launched = []
+
+    async def _launch(self, slot):
+        if self.failures:
+            raise self.failures.pop(0)
+        slot.browser = _FakeBrowser()
+        slot.context = slot.page = object()
+        slot.uses = 0
+        slot.broken = False
+        self.launched.append(slot.browser)
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.stopped = False
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    fake = _FakeDriver()
+    monkeypatch.setattr(browser_pool, "async_playwright", lambda: fake)
+    return fake
+
+
+def test_slot_comes_back_after_a_non_playwright_relaunch_error(driver, monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+
+    async def run():
+        pool = _FakePool(size=1, max_uses=1)
+        await pool.start()
+        pool.failures = [OSError("cookies unreadable"), asyncio.TimeoutError()]
+        async with pool.page():
+            pass
+        # The relaunch fails twice, then succeeds and hands the slot back
+        async with pool.page():
+            pass
+        assert pool.recycles >= 1
+        await pool.stop()
+        return pool
+
+    # A lost slot would leave the second checkout waiting forever
+    pool = asyncio.run(asyncio.wait_for(run(), 5))
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_failed_start_stops_what_it_launched(driver):
+    async def run():
+        pool = _FakePool(size=2, failures=[])
+        original = pool._launch
+        calls = []
+
+        async def launch(slot):
+            calls.append(slot.index)
+            if slot.index == 1:
+                raise OSError("no chromium")
+            await original(slot)
+
+        pool._launch = launch
+        with pytest.raises(OSError):
+            await pool.start()
+        return pool
+
+    pool = asyncio.run(run())
+    assert driver.stopped
+    assert all(browser.closed for browser in pool.launched)
+    assert pool._playwright is None
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _no_sleep(delay, *args):
+    await _real_sleep(0)
+
+
+def test_contexts_are_updated_only_between_checkouts(driver):
+    async def run():
+        pool = _FakePool(size=1)
+        await pool.start()
+        updated = []
+
+        async def update(context, index):
+            updated.append(index)
+
+        async with pool.page():
+            pool.apply_to_contexts(update)
+            # The check in progress keeps its context as it was
+            await asyncio.sleep(0)
+            assert updated == []
+        assert updated == []
+        async with pool.page():
+            assert updated == [0]
+        async with pool.page():
+            pass
+        await pool.stop()
+        return updated
+
+    assert asyncio.run(asyncio.wait_for(run(), 5)) == [0]
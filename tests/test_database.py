@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+
+def test_new_database_uses_incremental_auto_vacuum(db):
+    assert db.storage_stats()["auto_vacuum"] == 2
+    conn = sqlite3.connect(db.DB_PATH)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == "wal"
+    conn.close()
+
+
+def _archivable(db, user_id=1):
+    db.set_username(user_id, "owner")
+    db.set_username(2, "liker")
+    link_id = db.save_link(user_id, "https://www.instagram.com/p/ArchiveMe1/")
+    db.record_like(2, link_id, "liker")
+    db.enqueue_verification(2, link_id, 2, None, "liker", "https://www.instagram.com/p/ArchiveMe1/")
+    db.record_verification(2, link_id, "liked")
+    with db._write() as c:
+        c.execute("UPDATE instagram_links SET active = 0, timestamp = '2000-01-01' WHERE link_id = ?", (link_id,))
+    return link_id
+
+
+def _count(db, table, link_id):
+    with db._read() as c:
+        c.execute(f'SELECT COUNT(*) FROM {table} WHERE link_id = ?', (link_id,))
+        return c.fetchone()[0]
+
+
+def test_archive_moves_link_with_likes_jobs_and_results(db):
+    link_id = _archivable(db)
+    assert [row["link_id"] for row in db.archivable_links("2001-01-01")] == [link_id]
+
+    assert db.archive_links([link_id]) == ([link_id], 1)
+    for table in ("instagram_links", "user_likes", "verification_jobs", "verification_results"):
+        assert _count(db, table, link_id) == 0
+    assert _count(db, "instagram_links_archive", link_id) == 1
+    assert _count(db, "user_likes_archive", link_id) == 1
+
+
+def test_archive_leaves_reactivated_link_alone(db):
+    link_id = _archivable(db)
+    db.archivable_links("2001-01-01")
+    with db._write() as c:
+        c.execute('UPDATE instagram_links SET active = 1 WHERE link_id = ?', (link_id,))
+
+    assert db.archive_links([link_id]) == ([], 0)
+    for table in ("instagram_links", "user_likes", "verification_jobs", "verification_results"):
+        assert _count(db, table, link_id) == 1
+    assert _count(db, "instagram_links_archive", link_id) == 0
+
+
+def _legacy_duplicate(db):
+    """A link saved before shortcodes existed, duplicating a newer one, with a queued job."""
+    db.set_username(1, "first")
+    db.set_username(2, "second")
+    with db._write() as c:
+        c.execute('''
+            INSERT INTO instagram_links (user_id, link, timestamp) VALUES (2, 'https://instagram.com/p/DupPost01', '2024-01-01')
+        ''')
+        old_id = c.lastrowid
+    keeper_id = db.save_link(1, "https://www.instagram.com/p/DupPost01/")
+    db.enqueue_verification(1, old_id, 1, None, "first", "https://instagram.com/p/DupPost01")
+    return old_id, keeper_id
+
+
+def test_backfill_moves_sqlite_jobs_with_the_merge(db):
+    old_id, keeper_id = _legacy_duplicate(db)
+
+    assert db.backfill_shortcodes(move_jobs=db.relink_jobs) == (0, 1)
+    assert _count(db, "verification_jobs", old_id) == 0
+    assert _count(db, "verification_jobs", keeper_id) == 1
+
+
+def test_backfill_moves_jobs_in_another_store(db):
+    old_id, keeper_id = _legacy_duplicate(db)
+    moved = []
+
+    assert db.backfill_shortcodes(move_jobs=lambda old, new: moved.append((old, new))) == (0, 1)
+    assert moved == [(old_id, keeper_id)]
+
+
+def test_duplicate_of_an_expired_link_says_so(db):
+    link_id = _archivable(db)
+    with pytest.raises(db.DuplicateLink) as raised:
+        db.spend_point_and_save_link(2, "https://instagram.com/p/ArchiveMe1?igsh=x")
+    assert (raised.value.link_id, raised.value.active) == (link_id, False)
+
+    with db._write() as c:
+        c.execute('UPDATE instagram_links SET active = 1 WHERE link_id = ?', (link_id,))
+    with pytest.raises(db.DuplicateLink) as raised:
+        db.save_link(2, "https://www.instagram.com/p/ArchiveMe1/")
+    assert raised.value.active
+
+
+def test_incremental_vacuum_frees_pages_under_the_write_lock(db):
+    with db._write() as c:
+        c.execute('CREATE TABLE filler (data TEXT)')
+        c.executemany('INSERT INTO filler VALUES (?)', [("x" * 1000,)] * 500)
+    with db._write() as c:
+        c.execute('DROP TABLE filler')
+    free = db.storage_stats()["freelist_count"]
+    assert free > 20
+
+    statements = []
+    db._connections()._writer.set_trace_callback(statements.append)
+    assert db.incremental_vacuum(20) == 20
+    # Nothing commits between taking the lock and the last page freed
+    assert statements[0] == "BEGIN IMMEDIATE"
+    assert [sql for sql in statements if sql.upper().startswith("COMMIT")] == [statements[-1]]
+    assert db.storage_stats()["freelist_count"] == free - 20
+    assert db.incremental_vacuum(10 * free) == free - 20
@@ -0,0 +1,53 @@
+import pytest
+
+import database
+import dbtool
+
+
+def _fill(db):
+    for user_id in range(1, 11):
+        db.set_username(user_id, f"user{user_id}")
+    for user_id in range(1, 6):
+        link_id = db.save_link(user_id, f"https://www.instagram.com/p/Post{user_id:04d}/")
+        for liker in range(6, 11):
+            db.record_like(liker, link_id, f"user{liker}")
+
+
+def _dump(db):
+    with db.snapshot() as c:
+        return {name: list(db.iter_rows(c, name)) for name in db.BULK_TABLES}
+
+
+def test_import_resumes_after_a_partial_batch(db, tmp_path, monkeypatch):
+    _fill(db)
+    expected = _dump(db)
+    assert len(expected["likes"]) == 25 and expected["events"]
+    manifest = dbtool.export(tmp_path / "export", "csv")
+
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "target.db")
+    database.init_db()
+    real_insert = database.bulk_insert
+    calls = []
+
+    def crash_in_the_likes(source, name, rows, imported):
+        calls.append(name)
+        if name == "likes" and calls.count("likes") == 3:
+            # Half the chunk is written before the process dies
+            def rows_then_crash():
+                yield from rows[:len(rows) // 2]
+                raise KeyboardInterrupt
+
+            return real_insert(source, name, rows_then_crash(), imported)
+        return real_insert(source, name, rows, imported)
+
+    monkeypatch.setattr(database, "bulk_insert", crash_in_the_likes)
+    with pytest.raises(KeyboardInterrupt):
+        dbtool.import_(tmp_path / "export", batch=4)
+    assert database.import_progress(manifest["export_id"])["likes"] == 8
+    assert database.count_rows("likes") == 8
+
+    monkeypatch.setattr(database, "bulk_insert", real_insert)
+    report = dbtool.import_(tmp_path / "export", batch=4)
+    assert report["users"]["imported"] == 0
+    assert report["likes"] == {"rows": 25, "imported": 17}
+    assert _dump(database) == expected
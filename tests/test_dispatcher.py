@@ -0,0 +1,72 @@
+import asyncio
+import random
+
+from telegram import Update
+
+from bench_webhook import synthetic_update
+from dispatcher import OrderedUpdateProcessor
+
+USERS = 5
+UPDATES = 200
+
+
+def _update(update_id, user_id, chat_type="private"):
+    data = synthetic_update(update_id, user_id, "/status")
+    data["message"]["chat"] = {"id": -100 if chat_type != "private" else user_id, "type": chat_type}
+    return Update.de_json(data, None)
+
+
+def test_each_users_updates_run_one_at_a_time_in_order():
+    rng = random.Random(5)
+    started = {user: [] for user in range(1, USERS + 1)}
+    finished = {user: [] for user in range(1, USERS + 1)}
+    running = {user: 0 for user in range(1, USERS + 1)}
+    overlap = []
+
+    async def handle(update_id, user_id, delay):
+        started[user_id].append(update_id)
+        running[user_id] += 1
+        overlap.append(sum(running.values()))
+        assert running[user_id] == 1
+        await asyncio.sleep(delay)
+        running[user_id] -= 1
+        finished[user_id].append(update_id)
+
+    async def main():
+        processor = OrderedUpdateProcessor(concurrency=4)
+        await processor.initialize()
+        tasks = []
+        for update_id in range(1, UPDATES + 1):
+            user_id = rng.randint(1, USERS)
+            # Later updates are often quicker, which would reorder them without the chains
+            coroutine = handle(update_id, user_id, rng.choice([0, 0.001, 0.005]))
+            tasks.append(asyncio.create_task(processor.process_update(_update(update_id, user_id), coroutine)))
+            if rng.random() < 0.3:
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return processor
+
+    processor = asyncio.run(asyncio.wait_for(main(), 10))
+    for user_id in started:
+        assert started[user_id] == sorted(started[user_id])
+        assert finished[user_id] == started[user_id]
+    assert sum(len(ids) for ids in finished.values()) == UPDATES
+    # Different users still ran side by side, within the lane's limit
+    assert 1 < max(overlap) <= 4
+    assert processor.pending == 0
+    assert processor.stats()["default"]["active"] == 0
+
+
+def test_group_updates_have_their_own_lane():
+    async def main():
+        processor = OrderedUpdateProcessor(concurrency=1, group_concurrency=1)
+        await processor.initialize()
+        release = asyncio.Event()
+        busy = asyncio.create_task(processor.process_update(_update(1, 1), release.wait()))
+        await asyncio.sleep(0)
+        # The private lane is full; a group update from the same user still runs
+        await asyncio.wait_for(processor.process_update(_update(2, 1, "supergroup"), asyncio.sleep(0)), 1)
+        release.set()
+        await busy
+
+    asyncio.run(asyncio.wait_for(main(), 5))
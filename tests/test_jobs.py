@@ -0,0 +1,91 @@
+import multiprocessing
+from types import SimpleNamespace
+
+import pytest
+
+import database
+
+JOBS = 2000
+WORKERS = 2
+
+
+def _claim_all(path, start, claimed):
+    """Worker process: claim jobs until the queue is empty."""
+    database.DB_PATH = path
+    start.wait()
+    jobs = []
+    while (job := database.claim_verification_job(lease=60)) is not None:
+        jobs.append(job["job_id"])
+    database.close_connections()
+    claimed.put(jobs)
+
+
+def test_workers_never_claim_a_job_twice(db):
+    queued = {db.enqueue_verification(user_id=i, link_id=i, chat_id=1, username=f"user{i}",
+                                      link=f"https://www.instagram.com/p/code{i}/") for i in range(JOBS)}
+    db.close_connections()
+
+    context = multiprocessing.get_context("spawn")
+    start = context.Barrier(WORKERS)
+    claimed = context.Queue()
+    workers = [context.Process(target=_claim_all, args=(db.DB_PATH, start, claimed)) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    results = [claimed.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=10)
+        assert worker.exitcode == 0
+
+    jobs = [job_id for result in results for job_id in result]
+    assert len(jobs) == len(set(jobs))
+    assert set(jobs) == queued
+    assert db.claim_verification_job() is None
+
+
+@pytest.fixture
+def clock(db, monkeypatch):
+    """The job store's time.time(), moved by hand."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(db, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def _enqueue(db, user_id=1):
+    return db.enqueue_verification(user_id, user_id, chat_id=1, username=f"user{user_id}",
+                                   link=f"https://www.instagram.com/p/code{user_id}/")
+
+
+def test_retried_job_waits_for_its_delay(db, clock):
+    job_id = _enqueue(db)
+    assert db.claim_verification_job()["attempts"] == 1
+    db.retry_verification_job(job_id, 30, "timeout")
+
+    clock.value += 29
+    assert db.claim_verification_job() is None
+    clock.value += 1
+    job = db.claim_verification_job()
+    assert (job["job_id"], job["attempts"], job["error"]) == (job_id, 2, "timeout")
+
+
+def test_expired_lease_returns_the_job_to_the_queue(db, clock):
+    job_id = _enqueue(db)
+    db.claim_verification_job(lease=60)
+    assert db.claim_verification_job(lease=60) is None
+
+    clock.value += 59
+    assert db.requeue_expired_jobs() == 0
+    clock.value += 2
+    assert db.requeue_expired_jobs() == 1
+    job = db.claim_verification_job(lease=60)
+    assert (job["job_id"], job["attempts"]) == (job_id, 2)
+    assert db.count_pending_verifications() == 1
+
+
+def test_restart_resumes_running_jobs(db, clock):
+    first, second = _enqueue(db, 1), _enqueue(db, 2)
+    db.claim_verification_job()
+    db.complete_verification_job(db.claim_verification_job()["job_id"], "liked")
+
+    assert db.requeue_running_jobs() == 1
+    assert db.claim_verification_job()["job_id"] == first
+    assert [job["job_id"] for job in db.take_checked_jobs()] == [second]
@@ -0,0 +1,50 @@
+import asyncio
+
+from liker_cache import LikerCoalescer
+
+
+def _scraper(results):
+    """A scrape that waits for `release`, then returns the next of `results`."""
+    calls = []
+    release = asyncio.Event()
+
+    async def scrape(post_url, targets):
+        calls.append(set(targets))
+        await release.wait()
+        return results[len(calls) - 1]
+
+    return scrape, calls, release
+
+
+def _check_all(coalescer, release, usernames, post_url="https://www.instagram.com/p/X/"):
+    async def main():
+        checks = [asyncio.create_task(coalescer.check_if_liked(name, post_url)) for name in usernames]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*checks)
+
+    return asyncio.run(asyncio.wait_for(main(), 5))
+
+
+def test_waiters_share_one_scrape():
+    scrape, calls, release = _scraper([({"a", "b"}, True)])
+    coalescer = LikerCoalescer(scrape, ttl=60)
+    assert _check_all(coalescer, release, ["A", "b", "c"]) == [True, True, False]
+    assert len(calls) == 1
+    assert (coalescer.hits, coalescer.misses, coalescer.coalesced) == (0, 1, 2)
+
+
+def test_partial_scrape_answers_the_waiters_it_found():
+    scrape, calls, release = _scraper([({"a", "b"}, False)])
+    coalescer = LikerCoalescer(scrape, ttl=60)
+    assert _check_all(coalescer, release, ["a", "b"]) == [True, True]
+    assert len(calls) == 1
+    assert (coalescer.misses, coalescer.coalesced) == (1, 1)
+
+
+def test_waiter_left_unsettled_counts_once_and_scrapes_again():
+    scrape, calls, release = _scraper([({"a"}, False), ({"c"}, True)])
+    coalescer = LikerCoalescer(scrape, ttl=60)
+    assert _check_all(coalescer, release, ["a", "c"]) == [True, True]
+    assert len(calls) == 2
+    assert (coalescer.hits, coalescer.misses, coalescer.coalesced) == (0, 2, 0)
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+import links
+from bench_links import WORDS, mangle, shortcode
+
+CODE = "C0deXyz_-1"
+CANONICAL = f"https://www.instagram.com/p/{CODE}/"
+
+
+def test_mangled_links_normalize_to_one_canonical_form():
+    rng = random.Random(11)
+    for _ in range(5000):
+        kind = rng.choice(["p", "reel", "tv"])
+        code = shortcode(rng)
+        canonical = f"https://www.instagram.com/{kind}/{code}/"
+        url = mangle(rng, kind, code)
+        assert links.normalize_link(url) == canonical, url
+        assert links.shortcode_of(url) == code, url
+
+        text = f"{rng.choice(WORDS)} {url} {rng.choice(WORDS)}\n{mangle(rng, kind, code)}"
+        assert [link.url for link in links.extract_links(text)] == [canonical], text
+
+
+@pytest.mark.parametrize("url", [
+    f"https://notinstagram.com/p/{CODE}/",
+    f"https://instagram.com.evil.io/p/{CODE}/",
+    f"https://www.instagram.com/{CODE}/",
+    f"https://www.instagram.com/stories/{CODE}/",
+    f"https://evil.com/instagram.com/p/{CODE}/",
+    f"evil.com/instagram.com/p/{CODE}",
+    f"https://evil.com/?next=instagram.com/p/{CODE}/",
+    f"https://user@instagram.com/p/{CODE}/",
+])
+def test_look_alikes_are_not_links(url):
+    assert links.normalize_link(url) is None
+    assert links.extract_links(url) == []
+    assert links.extract_links(f"done {url} pls") == []
+
+
+@pytest.mark.parametrize("text", [
+    f"({CANONICAL})",
+    f"link:{CANONICAL}",
+    f"\"instagram.com/p/{CODE}\",",
+    f"done\ninstagr.am/p/{CODE}?igsh=x",
+])
+def test_links_next_to_punctuation_are_found(text):
+    assert [link.url for link in links.extract_links(text)] == [CANONICAL]
@@ -0,0 +1,61 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+from outbox import Outbox
+
+
+class _Bot:
+    """Records Bot API calls; `flood` calls raise RetryAfter first."""
+
+    def __init__(self, flood=0):
+        self.flood = flood
+        self.calls = []
+
+    async def _call(self, method, kwargs):
+        if self.flood:
+            self.flood -= 1
+            raise RetryAfter(0)
+        self.calls.append((method, kwargs))
+        return len(self.calls)
+
+    def __getattr__(self, method):
+        return lambda **kwargs: self._call(method, kwargs)
+
+
+def _run(bot, body, **kwargs):
+    async def main():
+        outbox = Outbox(coalesce_window=0, **kwargs)
+        await outbox.start(bot)
+        try:
+            return await body(outbox)
+        finally:
+            await outbox.stop(timeout=0.5)
+
+    return asyncio.run(asyncio.wait_for(main(), 5))
+
+
+def test_callback_answers_go_through_the_outbox():
+    bot = _Bot(flood=1)
+
+    async def body(outbox):
+        result = await outbox.answer(42, "query-1")
+        return result, outbox.stats()
+
+    result, stats = _run(bot, body)
+    assert result == 1
+    assert bot.calls == [("answer_callback_query", {"callback_query_id": "query-1"})]
+    assert stats["retried"] == 1
+
+
+def test_answers_are_not_held_by_the_chats_message_limit():
+    bot = _Bot()
+
+    async def body(outbox):
+        sent = [outbox.send(42, f"message {i}") for i in range(3)]
+        await outbox.answer(42, "query-1")
+        return sum(future.done() for future in sent)
+
+    # One message a minute: the answer must not wait behind the queued messages
+    assert _run(bot, body, chat_rate=1 / 60, chat_burst=1) == 1
+    assert ("answer_callback_query", {"callback_query_id": "query-1"}) in bot.calls
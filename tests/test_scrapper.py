@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import pytest
+
+import scrapper
+from fixture_server import CASES, FIXTURES_DIR
+from scrapper import fetch_likers_network, likers_api_url, parse_likers_payload, parse_likers_response
+from sessions import SessionStore
+
+USERNAME = "target_user"
+POST = "https://www.instagram.com/p/first_page/"
+GRAPHQL = "https://www.instagram.com/graphql/query/?query_hash=0"
+# What each recorded API response alone tells about USERNAME (None = fall back to the DOM)
+EXPECTED_VERDICTS = {"first_page": True, "third_page": None, "absent": False}
+NOT_LIKERS = sorted((FIXTURES_DIR / "not_likers").glob("*.json"))
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_every_case_has_an_expected_verdict():
+    assert set(CASES) == set(EXPECTED_VERDICTS)
+
+
+@pytest.mark.parametrize("case", sorted(EXPECTED_VERDICTS))
+def test_recorded_likers_responses(case):
+    names, complete = parse_likers_payload(_load(FIXTURES_DIR / "likers_api" / f"{case}.json"))
+    verdict = True if USERNAME in names else (False if complete else None)
+    assert verdict == EXPECTED_VERDICTS[case]
+
+
+@pytest.mark.parametrize("case", sorted(EXPECTED_VERDICTS))
+def test_likers_endpoint_responses_are_read(case):
+    post = f"https://www.instagram.com/p/{case}/"
+    payload = _load(FIXTURES_DIR / "likers_api" / f"{case}.json")
+    assert parse_likers_response(likers_api_url(post) + "?count=50", payload, post) == parse_likers_payload(payload)
+
+
+@pytest.mark.parametrize("path", NOT_LIKERS, ids=[path.stem for path in NOT_LIKERS])
+def test_other_responses_are_not_likers(path):
+    assert parse_likers_response(GRAPHQL, _load(path), POST) is None
+
+
+def test_not_likers_fixtures_exist():
+    assert {path.stem for path in NOT_LIKERS} >= {"comments", "feed", "other_post", "suggested_users"}
+
+
+def test_likers_list_of_another_media_id_is_ignored():
+    other = likers_api_url("https://www.instagram.com/p/third_page/")
+    assert parse_likers_response(other, {"users": [{"username": USERNAME}]}, POST) is None
+
+
+def test_graphql_likers_query_is_read():
+    payload = {"data": {"shortcode_media": {
+        "shortcode": "first_page",
+        "edge_liked_by": {"page_info": {"has_next_page": True}, "edges": [{"node": {"username": "Target_User"}}]},
+    }}}
+    assert parse_likers_response(GRAPHQL, payload, POST) == ({USERNAME}, False)
+
+
+@pytest.mark.parametrize("payload", [None, [], "users", {"users": "x"}, {"data": None}, {"data": {"shortcode_media": []}}])
+def test_malformed_payloads(payload):
+    assert parse_likers_response(GRAPHQL, payload, POST) is None
+
+
+class _Response:
+
+    def __init__(self, payload, ok=True):
+        self.payload = payload
+        self.ok = ok
+
+    async def json(self):
+        return self.payload
+
+
+class _Page:
+    """A page whose likers API serves `pages`, keyed by the max_id cursor asking for them."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.asked = []
+        self.context = self
+        self.request = self
+
+    async def get(self, url, headers=None, params=None, timeout=None):
+        max_id = (params or {}).get("max_id")
+        self.asked.append(max_id)
+        return self.pages.get(max_id, _Response(None, ok=False))
+
+
+def _api_page(names, next_max_id=None, total=5):
+    payload = {"users": [{"username": name} for name in names], "user_count": total}
+    if next_max_id:
+        payload["next_max_id"] = next_max_id
+    return _Response(payload)
+
+
+def _fetch(page, **kwargs):
+    return asyncio.run(fetch_likers_network(page, POST, **kwargs))
+
+
+def test_all_pages_follow_the_cursor():
+    page = _Page({None: _api_page(["a", "b"], "m1"), "m1": _api_page(["c", "d"], "m2"), "m2": _api_page(["e"])})
+    assert _fetch(page, all_pages=True) == ({"a", "b", "c", "d", "e"}, True)
+    assert page.asked == [None, "m1", "m2"]
+
+
+def test_one_page_by_default():
+    page = _Page({None: _api_page(["a", "b"], "m1")})
+    assert _fetch(page) == ({"a", "b"}, False)
+    assert page.asked == [None]
+
+
+def test_failed_later_page_keeps_what_was_read():
+    page = _Page({None: _api_page(["a", "b"], "m1")})
+    assert _fetch(page, all_pages=True) == ({"a", "b"}, False)
+    assert _fetch(_Page({}), all_pages=True) is None
+
+
+def test_repeated_cursor_stops():
+    page = _Page({None: _api_page(["a"], "m1"), "m1": _api_page(["b"], "m1")})
+    assert _fetch(page, all_pages=True) == ({"a", "b"}, False)
+    assert page.asked == [None, "m1"]
+
+
+class _Context:
+    def __init__(self):
+        self.cookies = []
+        self.cleared = 0
+
+    async def clear_cookies(self):
+        self.cleared += 1
+        self.cookies = []
+
+    async def add_cookies(self, cookies):
+        self.cookies.extend(cookies)
+
+
+def _session(value, csrf="t"):
+    return [{"name": "sessionid", "value": value, "domain": ".instagram.com", "path": "/", "sameSite": "Lax"},
+            {"name": "csrftoken", "value": csrf, "domain": ".instagram.com", "path": "/", "sameSite": "Lax"}]
+
+
+def test_only_a_new_login_replaces_a_contexts_cookies(tmp_path, monkeypatch):
+    store = SessionStore(tmp_path / "cookies.json", tmp_path / "sessions")
+    (tmp_path / "cookies.json").write_text(json.dumps(_session("one")))
+    monkeypatch.setattr(scrapper, "sessions", store)
+    context = _Context()
+    asyncio.run(scrapper._login(context, 0))
+    assert context.cookies == _session("one")
+
+    # Another worker writing back refreshed cookies of the same login
+    store.update("default", _session("one", csrf="refreshed"))
+    store.flush()
+    asyncio.run(scrapper._login(context, 0))
+    assert context.cleared == 0
+
+    store.replace("default", _session("two"))
+    asyncio.run(scrapper._login(context, 0))
+    assert context.cleared == 1
+    assert context.cookies == _session("two")
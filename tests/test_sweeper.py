@@ -0,0 +1,43 @@
+import asyncio
+
+from liker_cache import LikerCoalescer
+from sweeper import LikerSweeper
+
+LINK = "https://www.instagram.com/p/SweepPost01/"
+
+
+def _setup(db):
+    db.set_username(1, "Owner")
+    db.set_username(2, "Liker")
+    db.set_username(3, "help")
+    return db.save_link(1, LINK)
+
+
+def _sweep(scrape):
+    sweeper = LikerSweeper(interval=0, scrape=scrape, cache=LikerCoalescer())
+    return asyncio.run(sweeper.run_once())
+
+
+def test_sweep_credits_likers_from_the_api_list(db):
+    link_id = _setup(db)
+
+    async def scrape(post_url):
+        return {"liker", "owner", "stranger"}, True
+
+    report = _sweep(scrape)
+    assert report["credited"] == 1 and report["skipped"] == 0
+    assert db.has_liked(2, link_id)
+    # The owner can't earn a point on their own link
+    assert not db.has_liked(1, link_id)
+    assert db.get_total_score(2) == 6
+
+
+def test_sweep_skips_links_without_an_api_list(db):
+    link_id = _setup(db)
+
+    async def scrape(post_url):
+        return None
+
+    report = _sweep(scrape)
+    assert report["credited"] == 0 and report["skipped"] == 1
+    assert not db.has_liked(3, link_id)
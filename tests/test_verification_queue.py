@@ -0,0 +1,68 @@
+import asyncio
+import sqlite3
+
+import verification_queue
+from verification_queue import VerificationWorker
+
+
+async def _liked(username, link):
+    return True
+
+
+def _enqueue(db, user_id=1):
+    return db.enqueue_verification(user_id, user_id, chat_id=1, username=f"user{user_id}",
+                                   link=f"https://www.instagram.com/p/code{user_id}/")
+
+
+def test_worker_survives_job_store_errors(db, monkeypatch):
+    claim = verification_queue.claim_verification_job
+    failures = []
+
+    async def locked_once(lease):
+        if not failures:
+            failures.append(lease)
+            raise sqlite3.OperationalError("database is locked")
+        return await claim(lease)
+
+    monkeypatch.setattr(verification_queue, "claim_verification_job", locked_once)
+    job_id = _enqueue(db)
+
+    async def main():
+        worker = VerificationWorker(check=_liked, concurrency=1, poll_interval=0.01)
+        await worker.start()
+        try:
+            while not worker.checked:
+                assert not worker._tasks[0].done()
+                await asyncio.sleep(0.01)
+        finally:
+            await worker.stop()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert failures
+    assert [job["job_id"] for job in db.take_checked_jobs()] == [job_id]
+
+
+def test_failing_check_is_retried_then_reported(db, monkeypatch):
+    monkeypatch.setattr(verification_queue, "VERIFY_RETRY_BASE", 0)
+    job_id = _enqueue(db)
+    attempts = []
+
+    async def broken(username, link):
+        attempts.append(username)
+        raise TimeoutError("likers page never loaded")
+
+    async def main():
+        worker = VerificationWorker(check=broken, concurrency=1, poll_interval=0.01)
+        await worker.start()
+        try:
+            while not worker.gave_up:
+                await asyncio.sleep(0.01)
+        finally:
+            await worker.stop()
+        return worker
+
+    worker = asyncio.run(asyncio.wait_for(main(), 5))
+    assert len(attempts) == verification_queue.VERIFY_MAX_ATTEMPTS
+    assert worker.retried == verification_queue.VERIFY_MAX_ATTEMPTS - 1
+    [job] = db.take_checked_jobs()
+    assert (job["job_id"], job["result"], job["error"]) == (job_id, "error", "likers page never loaded")
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import webhook
+from bench_webhook import synthetic_update
+from dispatcher import OrderedUpdateProcessor
+
+
+class _Application:
+    """The parts of an Application WebhookServer uses, with handlers that wait for `release`."""
+
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+        self.update_processor = OrderedUpdateProcessor(concurrency=2)
+        self.release = asyncio.Event()
+        self.tasks = set()
+
+    async def fetch(self):
+        # Like Application: take each update off the queue at once and process it concurrently
+        while True:
+            update = await self.update_queue.get()
+            task = asyncio.create_task(self.update_processor.process_update(update, self.release.wait()))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+
+async def _settle():
+    # Let the fetcher and the processing tasks it starts run
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_updates_held_by_the_processor_count_as_pending():
+    async def main():
+        application = _Application()
+        await application.update_processor.initialize()
+        fetcher = asyncio.create_task(application.fetch())
+        server = webhook.WebhookServer(application, secret_token="s", max_pending=5)
+        headers = {"x-telegram-bot-api-secret-token": "s"}
+
+        def post(update_id):
+            body = json.dumps(synthetic_update(update_id, update_id, "/status")).encode()
+            return server._accept("POST", server.path, headers, body)
+
+        statuses = []
+        for update_id in range(1, 8):
+            statuses.append(post(update_id))
+            await _settle()
+        assert application.update_queue.qsize() == 0
+        assert statuses == [200] * 5 + [503] * 2
+        assert server.stats()["pending"] == 5
+
+        application.release.set()
+        await _settle()
+        assert not application.tasks
+        assert post(8) == 200
+        await _settle()
+        fetcher.cancel()
+        await asyncio.gather(fetcher, *application.tasks, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(main(), 5))
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import math
+import os
+import time
+
+from async_database import (
+    claim_verification_job,
+    complete_verification_job,
+    count_pending_verifications,
+    count_recent_verifications,
+    enqueue_verification,
+    finish_verification_job,
+    get_done_context,
+    get_negative_checks,
+    record_like,
+    record_verification,
+    requeue_running_jobs,
+    retry_verification_job,
+    take_checked_jobs,
+    verification_analytics,
+)
+from liker_cache import liker_cache
+from metrics import registry, verification_seconds, verifications
+from outbox import outbox
+from scrapper import LIKERS_ENGINE
+
+logger = logging.getLogger(__name__)
+
+# === Queue Configuration ===
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "2"))
+# "local": the bot runs VERIFY_WORKERS verification workers itself. "remote":
+# worker.py processes run them and the bot only queues jobs and applies results.
+VERIFY_MODE = os.getenv("VERIFY_MODE", "local")
+VERIFY_MAX_ATTEMPTS = int(os.getenv("VERIFY_MAX_ATTEMPTS", "3"))
+# First retry delay in seconds, doubled on every further attempt
+VERIFY_RETRY_BASE = float(os.getenv("VERIFY_RETRY_BASE", "5"))
+# At most VERIFY_RATE_LIMIT /done checks per user every VERIFY_RATE_WINDOW seconds
+VERIFY_RATE_LIMIT = int(os.getenv("VERIFY_RATE_LIMIT", "5"))
+VERIFY_RATE_WINDOW = float(os.getenv("VERIFY_RATE_WINDOW", "60"))
+# How often idle workers look for retries that became due
+VERIFY_POLL_INTERVAL = float(os.getenv("VERIFY_POLL_INTERVAL", "2"))
+# Seconds a worker may hold a job before it goes back to the queue
+VERIFY_LEASE = float(os.getenv("VERIFY_LEASE", "120"))
+# How often the bot looks for results of remote workers
+VERIFY_RESULT_POLL = float(os.getenv("VERIFY_RESULT_POLL", "0.25"))
+# After a "not liked" result the same post isn't re-checked for this user for
+# VERIFY_COOLDOWN_BASE seconds, doubled with every further negative result
+VERIFY_COOLDOWN_BASE = float(os.getenv("VERIFY_COOLDOWN_BASE", "30"))
+VERIFY_COOLDOWN_MAX = float(os.getenv("VERIFY_COOLDOWN_MAX", "1800"))
+# Negative results older than this no longer count towards the backoff
+VERIFY_BACKOFF_WINDOW = float(os.getenv("VERIFY_BACKOFF_WINDOW", str(24 * 3600)))
+
+# Checked jobs applied per round
+_RESULT_BATCH = 100
+
+
+class VerificationWorker:
+    """Claims verification jobs, runs the check and writes the result back to the job store.
+
+    Runs inside the bot (VERIFY_MODE=local) or in worker.py processes. It
+    never touches users, links or scores; the bot applies the results.
+    """
+
+    def __init__(self, check=liker_cache.check_if_liked, concurrency: int = VERIFY_WORKERS,
+                 engine: str = LIKERS_ENGINE, lease: float = VERIFY_LEASE,
+                 poll_interval: float = VERIFY_POLL_INTERVAL, on_result=None):
+        self.check = check
+        self.concurrency = concurrency
+        # Stored with every result, for the analytics
+        self.engine = engine
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+        # Metrics
+        self.checked = 0
+        self.retried = 0
+        self.gave_up = 0
+
+    async def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+        self._wakeup.set()
+
+    async def stop(self):
+        """Let running checks finish, then stop."""
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """A job was queued in this process."""
+        self._wakeup.set()
+
+    async def _loop(self):
+        while not self._stopping:
+            try:
+                job = await claim_verification_job(self.lease)
+                if job is not None:
+                    # Another job may be waiting; let an idle task pick it up
+                    self._wakeup.set()
+                    await self._run(job)
+                    continue
+            except Exception as e:
+                # e.g. "database is locked" with several worker.py processes on one file
+                logger.error(f"Verification worker failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job):
+        started = time.perf_counter()
+        try:
+            if not job["username"] or not job["link"]:
+                raise ValueError("job has no username or link to check")
+            liked = await self.check(job["username"], job["link"])
+        except Exception as e:
+            verifications.inc('error')
+            latency = time.perf_counter() - started
+            if job["attempts"] < VERIFY_MAX_ATTEMPTS:
+                delay = VERIFY_RETRY_BASE * 2 ** (job["attempts"] - 1)
+                await retry_verification_job(job["job_id"], delay, str(e))
+                self.retried += 1
+                logger.warning(f"Verification job {job['job_id']} failed, retrying in {delay:.0f}s: {e}")
+                return
+            await complete_verification_job(job["job_id"], 'error', latency, self.engine, str(e))
+            self.gave_up += 1
+            logger.error(f"Verification job {job['job_id']} gave up: {e}")
+        else:
+            latency = time.perf_counter() - started
+            result = 'liked' if liked else 'not_liked'
+            verifications.inc(result)
+            verification_seconds.observe(latency, self.engine)
+            await complete_verification_job(job["job_id"], result, latency, self.engine)
+            self.checked += 1
+        if self.on_result is not None:
+            self.on_result()
+
+    def stats(self):
+        return {"workers": len(self._tasks), "checked": self.checked, "retried": self.retried,
+                "gave_up": self.gave_up}
+
+
+class VerificationQueue:
+    """Queues /done verifications and applies their results: the like, the point and the reply.
+
+    With VERIFY_MODE=local it runs a VerificationWorker in this process and
+    hears about results straight away; with "remote" the workers run in
+    worker.py processes and the job store is polled for results.
+    """
+
+    def __init__(self, check=liker_cache.check_if_liked, workers: int = VERIFY_WORKERS,
+                 engine: str = LIKERS_ENGINE, mode: str = VERIFY_MODE):
+        if mode not in ("local", "remote"):
+            raise ValueError(f"Unknown VERIFY_MODE: {mode}")
+        self.mode = mode
+        self.worker = None
+        if mode == "local":
+            self.worker = VerificationWorker(check, workers, engine, on_result=self._result_ready)
+        self._results = asyncio.Event()
+        self._relay_task = None
+        self._replies = set()
+        self._stopping = False
+
+        # Metrics
+        self.processed = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # === Lifecycle ===
+
+    async def start(self):
+        """Resume jobs left over from a previous run and start applying results."""
+        self._stopping = False
+        if self.worker is not None:
+            # Every running job belonged to this process before it restarted
+            resumed = await requeue_running_jobs()
+            if resumed:
+                logger.info(f"Resumed {resumed} interrupted verification job(s)")
+            await self.worker.start()
+        self._relay_task = asyncio.create_task(self._relay())
+
+    async def stop(self):
+        """Let running verifications finish, apply their results, then stop."""
+        if self.worker is not None:
+            await self.worker.stop()
+        self._stopping = True
+        self._results.set()
+        if self._relay_task is not None:
+            await asyncio.gather(self._relay_task, return_exceptions=True)
+            self._relay_task = None
+        await asyncio.gather(*self._replies, return_exceptions=True)
+
+    # === Producer side ===
+
+    async def is_rate_limited(self, user_id: int):
+        since = time.time() - VERIFY_RATE_WINDOW
+        return await count_recent_verifications(user_id, since) >= VERIFY_RATE_LIMIT
+
+    async def cooldown(self, user_id: int, link_id: int):
+        """(seconds since the last "not liked" result, seconds until a re-check is allowed), or None."""
+        now = time.time()
+        negatives = await get_negative_checks(user_id, link_id, now - VERIFY_BACKOFF_WINDOW)
+        if not negatives:
+            return None
+        wait = min(VERIFY_COOLDOWN_BASE * 2 ** (len(negatives) - 1), VERIFY_COOLDOWN_MAX)
+        ago = now - negatives[0]
+        if ago >= wait:
+            return None
+        return int(ago), math.ceil(wait - ago)
+
+    async def enqueue(self, user_id: int, link_id: int, chat_id: int, message_id: int = None,
+                      username: str = None, link: str = None):
+        """Queue a check of `username` liking `link`; the result edits `message_id`."""
+        job_id = await enqueue_verification(user_id, link_id, chat_id, message_id, username, link)
+        if self.worker is not None:
+            self.worker.wake()
+        return job_id
+
+    async def stats(self):
+        """Return a snapshot of queue metrics."""
+        stats = {
+            "mode": self.mode,
+            "depth": await count_pending_verifications(),
+            "workers": 0,
+            "processed": self.processed,
+            "failed": self.failed,
+            "latency_avg": self.latency_total / self.processed if self.processed else 0.0,
+            "latency_max": self.latency_max,
+        }
+        if self.worker is not None:
+            stats.update(self.worker.stats())
+        return stats
+
+    # === Results ===
+
+    def _result_ready(self):
+        self._results.set()
+
+    async def _relay(self):
+        while True:
+            # Cleared first, so a result landing during the query still wakes us
+            self._results.clear()
+            try:
+                jobs = await take_checked_jobs(_RESULT_BATCH)
+                for job in jobs:
+                    await self._apply(job)
+            except Exception as e:
+                logger.error(f"Applying verification results failed: {e}")
+                jobs = []
+                await asyncio.sleep(VERIFY_RESULT_POLL)
+            if jobs:
+                continue
+            if self._stopping:
+                return
+            try:
+                await asyncio.wait_for(self._results.wait(), VERIFY_RESULT_POLL if self.worker is None
+                                       else VERIFY_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _apply(self, job):
+        text = await self._settle(job)
+        failed = job["result"] == 'error'
+        await finish_verification_job(job["job_id"], 'failed' if failed else 'done')
+        if failed:
+            self.failed += 1
+        else:
+            self.processed += 1
+            latency = time.time() - job["created_at"]
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        reply = asyncio.create_task(self._reply(job, text))
+        self._replies.add(reply)
+        reply.add_done_callback(self._replies.discard)
+
+    async def _settle(self, job):
+        """Record a checked job's result, credit a like, and return the reply text."""
+        user_id, link_id = job["user_id"], job["link_id"]
+        # The link may be gone, or liked meanwhile through another check
+        done_context = await get_done_context(user_id, link_id)
+        username = done_context["username"]
+        if not username or not done_context["link"]:
+            return "❌ Invalid link ID."
+        if done_context["liked"]:
+            return "✅ You've already marked this link as liked."
+
+        await record_verification(user_id, link_id, job["result"], job["latency"], job["engine"], job["error"])
+        if job["result"] == 'error':
+            return "⚠️ We couldn't check this post right now. Please try /done again later."
+        if job["result"] == 'liked':
+            # Like and point are credited together, and only once
+            if not await record_like(user_id, link_id, username):
+                return "✅ You've already marked this link as liked."
+            return "✅ You liked this post! Score +1."
+        cooldown = await self.cooldown(user_id, link_id)
+        if cooldown:
+            return f"❌ You have not liked this post. You can check again in {cooldown[1]} seconds."
+        return "❌ You have not liked this post."
+
+    async def _reply(self, job, text):
+        if job["message_id"] and await outbox.edit(job["chat_id"], job["message_id"], text):
+            return
+        # The "checking…" message is gone; fall back to a new one
+        outbox.notify(job["chat_id"], text)
+
+
+verification_queue = VerificationQueue()
+registry.gauge("verification_queue_depth", "/done checks queued, running or waiting to be applied.",
+               count_pending_verifications)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    import database
+    from async_database import db_executor
+
+    parser = argparse.ArgumentParser(description="Print scraper success rate and latency per engine.")
+    parser.add_argument("--hours", type=float, default=24, help="look back this many hours")
+    args = parser.parse_args()
+
+    database.init_db()
+    report = asyncio.run(verification_analytics(time.time() - args.hours * 3600))
+    print(json.dumps(report, indent=2))
+    db_executor.shutdown()
@@ -0,0 +1,246 @@
+"""Webhook runner: receives Telegram updates on a local HTTP endpoint.
+
+A small HTTP/1.1 server on asyncio streams, so no web framework is needed.
+Every POST to WEBHOOK_PATH must carry the secret token registered with
+set_webhook. Valid updates go on the Application's update_queue, which
+processes up to UPDATE_CONCURRENCY of them at once. Once WEBHOOK_MAX_PENDING
+updates are queued or being handled, new ones get a 503 and Telegram
+redelivers them later.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import signal
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# === Webhook Configuration ===
+# Public HTTPS URL Telegram posts to, e.g. https://bot.example.com/telegram
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Generated per start when unset; it's registered with set_webhook either way
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Parallel connections Telegram may open to us (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Updates queued or being handled before we answer 503 and let Telegram retry
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", str(1024 * 1024)))
+WEBHOOK_IDLE_TIMEOUT = float(os.getenv("WEBHOOK_IDLE_TIMEOUT", "75"))
+# Seconds to wait for in-flight requests when shutting down
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class WebhookServer:
+    """Accepts update POSTs and feeds them to an Application's update_queue."""
+
+    def __init__(
+        self,
+        application,
+        listen: str = WEBHOOK_LISTEN,
+        port: int = WEBHOOK_PORT,
+        path: str = WEBHOOK_PATH,
+        secret_token: str = None,
+        max_pending: int = WEBHOOK_MAX_PENDING,
+    ):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token or WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.max_pending = max_pending
+        self._server = None
+        self._writers = set()
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False
+        self.received = 0
+        self.responses = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Webhook server listening on %s:%s%s", self.listen, self.port, self.path)
+
+    async def stop(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Stop accepting requests and wait for the ones being read to finish."""
+        if self._server is None:
+            return
+        self._closing = True
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook drain timed out with %d requests in flight", self._in_flight)
+        for writer in list(self._writers):
+            writer.close()
+        self._server = None
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "in_flight": self._in_flight,
+            "queued": self.application.update_queue.qsize(),
+            "pending": self._pending(),
+            "responses": dict(self.responses),
+        }
+
+    async def _handle_connection(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            # Telegram keeps connections open, so serve requests until it hangs up
+            while not self._closing:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), WEBHOOK_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+
+                self._begin()
+                try:
+                    status, keep_alive = await self._handle_request(request_line, reader)
+                    await self._respond(writer, status, keep_alive and not self._closing)
+                finally:
+                    self._end()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes, reader):
+        """Read one request and return (status, keep_alive)."""
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            return 400, False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return 400, False
+        if length > WEBHOOK_MAX_BODY:
+            return 413, False
+        body = await reader.readexactly(length)
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        return self._accept(method, target.split("?", 1)[0], headers, body), keep_alive
+
+    def _accept(self, method: str, path: str, headers: dict, body: bytes):
+        if path != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        token = headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return 403
+        if self._pending() >= self.max_pending:
+            # Telegram redelivers on any non-2xx answer
+            return 503
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return 400
+        if update is None:
+            return 400
+        self.application.update_queue.put_nowait(update)
+        self.received += 1
+        return 200
+
+    def _pending(self):
+        """Updates accepted and not handled yet.
+
+        The Application moves updates off its update_queue as soon as they
+        arrive, so the queue alone stays near empty however far behind the
+        handlers are; the processor's count covers the rest.
+        """
+        processor = getattr(self.application, "update_processor", None)
+        return self.application.update_queue.qsize() + getattr(processor, "pending", 0)
+
+    async def _respond(self, writer, status: int, keep_alive: bool):
+        self.responses[status] = self.responses.get(status, 0) + 1
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            "Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+    def _begin(self):
+        self._in_flight += 1
+        self._idle.clear()
+
+    def _end(self):
+        self._in_flight -= 1
+        if not self._in_flight:
+            self._idle.set()
+
+
+async def _serve(application, url: str):
+    """Run `application` behind a WebhookServer until SIGINT or SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = WebhookServer(application)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        await server.start()
+        await application.bot.set_webhook(
+            url=url,
+            secret_token=server.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        await stop.wait()
+        logger.info("Shutting down webhook runner")
+    finally:
+        # Order matters: finish reading requests, then let the Application
+        # process what is queued, then post_shutdown drains verifications.
+        await server.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application, url: str = WEBHOOK_URL):
+    """Blocking counterpart of Application.run_polling for webhook mode."""
+    if not url:
+        raise RuntimeError("WEBHOOK_URL must be set to run in webhook mode")
+    asyncio.run(_serve(application, url))
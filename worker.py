@@ -0,0 +1,104 @@
+"""Verification worker process, for a bot running with VERIFY_MODE=remote.
+
+    python worker.py
+
+Claims /done jobs from the shared queue (see storage.py), checks them with
+its own browser pool and writes each result back; the bot applies it and
+answers the user. Start as many as the Chromium budget allows, on this
+machine (SQLite) or on others (STORAGE_BACKEND=postgres). Every worker
+needs the bot's STORAGE_BACKEND / STORAGE_URL and the session files
+(COOKIES_FILE, SESSION_DIR), which it re-reads when the bot saves an upload.
+
+A worker that dies mid-check loses nothing: its jobs go back to the queue
+once their VERIFY_LEASE runs out.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import signal
+
+from async_database import db_executor, requeue_expired_jobs
+from browser_pool import POOL_SIZE
+from liker_cache import liker_cache
+from metrics import MetricsServer
+from scrapper import browser_pool, reload_sessions
+from sessions import sessions
+from verification_queue import VerificationWorker
+
+logger = logging.getLogger(__name__)
+
+# === Worker Configuration ===
+# Checks this process runs at once; more than BROWSER_POOL_SIZE only queues for a page
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(POOL_SIZE)))
+# Seconds between queue polls while idle; the bot can't wake other processes
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+# Port of this worker's /metrics; 0 disables it (METRICS_PORT is the bot's)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# Seconds between sweeps for expired leases and changed session files
+WORKER_HOUSEKEEPING_INTERVAL = float(os.getenv("WORKER_HOUSEKEEPING_INTERVAL", "15"))
+# "module:attribute" of an async check(username, post_url) -> bool to run
+# instead of the scraper, e.g. benchmarks.simulated_scrape:check
+WORKER_CHECK = os.getenv("WORKER_CHECK", "")
+
+
+def load_check(spec: str):
+    module, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+async def housekeeping():
+    requeued = await requeue_expired_jobs()
+    if requeued:
+        logger.warning(f"Requeued {requeued} verification job(s) whose worker stopped answering")
+    if await asyncio.to_thread(sessions.reload_if_changed):
+        logger.info("Session files changed; browsers with a new login switch before their next check")
+        reload_sessions()
+
+
+async def main():
+    scraping = not WORKER_CHECK
+    check = liker_cache.check_if_liked if scraping else load_check(WORKER_CHECK)
+    worker = VerificationWorker(check, WORKER_CONCURRENCY, poll_interval=WORKER_POLL_INTERVAL)
+    metrics_server = MetricsServer(port=WORKER_METRICS_PORT)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    if scraping:
+        sessions.load()
+        await browser_pool.start()
+    await worker.start()
+    await metrics_server.start()
+    logger.info(f"Worker {os.getpid()} running {WORKER_CONCURRENCY} check(s) at a time")
+    try:
+        while not stopping.is_set():
+            try:
+                await housekeeping()
+            except Exception as e:
+                logger.error(f"Worker housekeeping failed: {e}")
+            try:
+                await asyncio.wait_for(stopping.wait(), WORKER_HOUSEKEEPING_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await metrics_server.stop()
+        # Running checks finish and write their results first
+        await worker.stop()
+        await browser_pool.stop()
+        await sessions.close()
+        db_executor.shutdown()
+
+
+if __name__ == "__main__":
+    import database
+    import storage
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+                        level=os.getenv("LOG_LEVEL", "INFO").upper())
+    if storage.STORAGE_BACKEND == "sqlite":
+        # Same file as the bot; creates the tables if the worker comes up first
+        database.init_db()
+    asyncio.run(main())